@@ -0,0 +1,134 @@
+"""
+比较 OB11Pretender.handle_event 的事件分派速度：
+重构前每个事件都沿 MRO 查找处理函数并立即生成 DEBUG/TRACE 日志内容，
+重构后按事件类型缓存查找结果、日志内容只在对应等级开启时才生成
+
+    python benchmarks/event_dispatch.py --events 20000
+"""
+import asyncio
+import argparse
+import tempfile
+from time import perf_counter
+from typing import Callable, Awaitable
+
+import nonebot
+
+# 与默认配置相同，DEBUG/TRACE 不输出
+nonebot.init(localstore_data_dir=tempfile.mkdtemp(), log_level="INFO")
+
+from nonebot.adapters.red import event as red_event  # noqa: E402
+from nonebot.adapters.red import Adapter as RedAdapter  # noqa: E402
+
+from nonebot_adapter_onebot_pretender.v11.pretender import (  # noqa: E402
+    OB11Pretender,
+    event_handler,
+)
+
+
+class _ActualAdapter:
+    @staticmethod
+    def get_name() -> str:
+        return RedAdapter.get_name()
+
+
+class _Adapter:
+    actual_adapter = _ActualAdapter()
+
+
+class BenchPretender(OB11Pretender):
+    @classmethod
+    def get_actual_adapter_type(cls):
+        return RedAdapter
+
+    @event_handler(red_event.MessageEvent)
+    async def handle_message_event(self, bot, event):
+        return event
+
+
+async def legacy_handle_event(self: BenchPretender, bot, event):
+    """重构前的 handle_event"""
+    self.log(
+        "DEBUG",
+        f"Receive {self.adapter.actual_adapter.get_name()}"
+        f" {type(event).__name__}: " + str(event),
+    )
+    self.log(
+        "TRACE",
+        f"{self.adapter.actual_adapter.get_name()}"
+        f" {type(event).__name__}: " + str(event.json()),
+    )
+
+    handler = None
+    for t_event in type(event).mro():
+        handler = self._event_handler_mapping.get(t_event)
+        if handler is not None:
+            break
+
+    if handler is None:
+        return None
+
+    return await handler(self, bot, event)
+
+
+def make_event(i: int) -> red_event.GroupMessageEvent:
+    # 只填写常用字段，其余字段为 None
+    fields = dict.fromkeys(red_event.GroupMessageEvent.__fields__)
+    fields.update(
+        msgId=str(7300000000000000000 + i),
+        msgSeq=str(i),
+        chatType=2,
+        msgType=2,
+        senderUin="1234567890",
+        peerUin="987654321",
+        msgTime=str(1700000000 + i),
+        sendMemberName="member",
+        sendNickName="nickname",
+        elements=[
+            {
+                "elementType": 1,
+                "elementId": str(7300000000000000000 + i * 8 + j),
+                "textElement": {"content": "hello world " * 4, "atType": 0},
+            }
+            for j in range(8)
+        ],
+        peerName="group",
+        to_me=False,
+    )
+    return red_event.GroupMessageEvent.construct(**fields)
+
+
+async def run(
+    func: Callable[..., Awaitable], pretender: BenchPretender, events: list
+) -> float:
+    start = perf_counter()
+    for event in events:
+        await func(pretender, None, event)
+    return len(events) / (perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pretender = BenchPretender(_Adapter())
+    events = [make_event(i) for i in range(args.events)]
+
+    legacy = max(
+        [await run(legacy_handle_event, pretender, events) for _ in range(args.repeat)]
+    )
+    current = max(
+        [
+            await run(BenchPretender.handle_event, pretender, events)
+            for _ in range(args.repeat)
+        ]
+    )
+    print(  # noqa: T201
+        f"before: {legacy:>10.0f} events/s\n"
+        f" after: {current:>10.0f} events/s ({current / legacy:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+比较 get_msg 读取一条消息的耗时：
+重构前 JSON 记录经 parse_raw 校验，返回前再经 .json() 序列化、json.loads 解析；
+重构后本插件写入的记录跳过校验、较小的记录不切换到线程池解码，
+返回的 dict 直接由字段构造
+
+    python benchmarks/get_msg.py --messages 2000
+"""
+import json
+import asyncio
+import argparse
+import tempfile
+from time import perf_counter
+from typing import Any, Dict, List, Callable, Awaitable
+
+import nonebot
+
+nonebot.init(localstore_data_dir=tempfile.mkdtemp(), log_level="INFO")
+
+from nonebot.utils import run_sync  # noqa: E402
+from nonebot.adapters.onebot.v11.event import Sender  # noqa: E402
+from nonebot.adapters.onebot.v11 import Message, MessageSegment  # noqa: E402
+
+from nonebot_adapter_onebot_pretender.data import msg_store  # noqa: E402
+from nonebot_adapter_onebot_pretender.data.backends import MsgRecord  # noqa: E402
+from nonebot_adapter_onebot_pretender.data.codec import (  # noqa: E402
+    decode_binary,
+    encode_binary,
+    is_binary_record,
+)
+from nonebot_adapter_onebot_pretender.data.ob11_msg import (  # noqa: E402
+    OB11MsgModel,
+    dump_ob11_msg,
+    load_ob11_msg,
+    get_ob11_msg_cache,
+)
+
+
+def legacy_decode(value: bytes) -> OB11MsgModel:
+    """重构前的 decode_ob11_msg"""
+    if is_binary_record(value):
+        return OB11MsgModel.construct(**decode_binary(value))
+    return OB11MsgModel.parse_raw(value, content_type="json")
+
+
+def legacy_dump(message: OB11MsgModel) -> Dict[str, Any]:
+    """重构前的 dump_ob11_msg"""
+    return json.loads(message.json(exclude_none=True, exclude={"peer_id"}))
+
+
+async def legacy_get_msg(message_id: str) -> Dict[str, Any]:
+    cache = get_ob11_msg_cache()
+    msg = cache.get(message_id)
+    if msg is None:
+        value = await msg_store.get(message_id)
+        msg = await run_sync(legacy_decode)(value)
+        cache.put(message_id, msg)
+    return legacy_dump(msg)
+
+
+async def current_get_msg(message_id: str) -> Dict[str, Any]:
+    msg = await load_ob11_msg(message_id)
+    assert msg is not None
+    return dump_ob11_msg(msg)
+
+
+def make_message(i: int) -> OB11MsgModel:
+    message = (
+        MessageSegment.reply(i - 1)
+        + MessageSegment.at(10000 + i)
+        + "hello world " * 4
+        + MessageSegment.face(1)
+        + MessageSegment.image(f"https://example.com/{i}.png")
+    )
+    return OB11MsgModel(
+        group=True,
+        group_id=987654321,
+        message_id=i,
+        real_id=i,
+        message_type="group",
+        sender=Sender(user_id=1234567890, nickname="nickname", role="member"),
+        time=1700000000 + i,
+        message=message,
+        raw_message=Message(message).extract_plain_text(),
+    )
+
+
+async def store(messages: List[OB11MsgModel], binary: bool):
+    await msg_store.put_many(
+        [
+            MsgRecord(
+                str(msg.message_id),
+                msg.time,
+                encode_binary(msg) if binary else msg.json().encode(),
+                msg.group_id,
+                None,
+            )
+            for msg in messages
+        ]
+    )
+
+
+async def run(
+    func: Callable[[str], Awaitable[Dict[str, Any]]],
+    message_ids: List[str],
+    cached: bool,
+) -> float:
+    cache = get_ob11_msg_cache()
+    if cached:
+        for message_id in message_ids:
+            await func(message_id)
+
+    start = perf_counter()
+    for message_id in message_ids:
+        if not cached:
+            cache.pop(message_id)
+        await func(message_id)
+    return (perf_counter() - start) / len(message_ids) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    json_msgs = [make_message(i) for i in range(1, args.messages + 1)]
+    binary_msgs = [make_message(i + args.messages) for i in range(1, args.messages + 1)]
+    await store(json_msgs, binary=False)
+    await store(binary_msgs, binary=True)
+
+    cases = [
+        ("cache hit", [str(m.message_id) for m in json_msgs], True),
+        ("json record", [str(m.message_id) for m in json_msgs], False),
+        ("binary record", [str(m.message_id) for m in binary_msgs], False),
+    ]
+    for name, message_ids, cached in cases:
+        assert await legacy_get_msg(message_ids[0]) == await current_get_msg(
+            message_ids[0]
+        )
+        legacy = min(
+            [await run(legacy_get_msg, message_ids, cached) for _ in range(args.repeat)]
+        )
+        current = min(
+            [
+                await run(current_get_msg, message_ids, cached)
+                for _ in range(args.repeat)
+            ]
+        )
+        print(  # noqa: T201
+            f"{name:>13}: before {legacy:>7.1f} us/call,"
+            f" after {current:>7.1f} us/call ({legacy / current:.1f}x)"
+        )
+
+    msg_store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+比较 JSON 与紧凑二进制两种消息存储编码的体积与编解码速度
+
+    python benchmarks/msg_codec.py --messages 20000
+"""
+import random
+import argparse
+import tempfile
+from time import perf_counter
+from typing import List, Callable
+
+import nonebot
+
+nonebot.init(localstore_data_dir=tempfile.mkdtemp())
+
+from nonebot.adapters.onebot.v11 import Message  # noqa: E402
+from nonebot.adapters.onebot.v11.event import Sender  # noqa: E402
+from nonebot.adapters.onebot.v11 import MessageSegment as MS  # noqa: E402
+
+from nonebot_adapter_onebot_pretender.data.ob11_msg import OB11MsgModel  # noqa: E402
+from nonebot_adapter_onebot_pretender.data.codec import (  # noqa: E402
+    decode_binary,
+    encode_binary,
+)
+
+WORDS = "的 了 是 我 你 他 在 有 这 个 好 吧 啊 哈哈 图片 今天 明天 hello 666".split()
+
+
+def media_url(rnd: random.Random) -> str:
+    return (
+        "http://localhost:8080/ob_pretender/red/media?"
+        f"botId=1234567890&msgId={rnd.randrange(10**18, 10**19)}&chatType=2"
+        f"&target={rnd.randrange(10**8, 10**9)}"
+        f"&elementId={rnd.randrange(10**18, 10**19)}"
+        "&thumbSize=0&downloadType=2"
+    )
+
+
+def random_message(rnd: random.Random) -> Message:
+    msg = Message()
+    kind = rnd.random()
+    if kind < 0.15:
+        msg.append(MS.reply(rnd.randrange(10**18, 10**19)))
+    if kind < 0.25:
+        msg.append(MS.at(rnd.randrange(10**8, 10**10)))
+    if 0.25 <= kind < 0.4:
+        msg.append(
+            MS(
+                "image",
+                {
+                    "file": f"file:///root/.chronocat/Pic/{rnd.getrandbits(128):032x}.jpg",
+                    "url": media_url(rnd),
+                },
+            )
+        )
+    if 0.4 <= kind < 0.45:
+        msg.append(MS.face(rnd.randrange(300)))
+    if kind >= 0.98:
+        # 偶尔出现的长文本
+        msg.append(MS.text("".join(rnd.choices(WORDS, k=600))))
+    else:
+        msg.append(MS.text("".join(rnd.choices(WORDS, k=rnd.randrange(1, 30)))))
+    return msg
+
+
+def corpus(n: int) -> List[OB11MsgModel]:
+    rnd = random.Random(42)
+    result = []
+    for _ in range(n):
+        message = random_message(rnd)
+        message_id = rnd.randrange(10**18, 10**19)
+        result.append(
+            OB11MsgModel(
+                group=True,
+                group_id=rnd.randrange(10**8, 10**9),
+                message_id=message_id,
+                real_id=message_id,
+                message_type="group",
+                sender=Sender(
+                    nickname="".join(rnd.choices(WORDS, k=3)),
+                    user_id=rnd.randrange(10**8, 10**10),
+                ),
+                time=1_700_000_000 + rnd.randrange(10**7),
+                message=message,
+                raw_message=message.extract_plain_text(),
+            )
+        )
+    return result
+
+
+def timeit(func: Callable, items: list) -> float:
+    start = perf_counter()
+    for item in items:
+        func(item)
+    return (perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--compress-threshold", type=int, default=1024)
+    args = parser.parse_args()
+
+    messages = corpus(args.messages)
+
+    json_records = [m.json().encode() for m in messages]
+    binary_records = [encode_binary(m, args.compress_threshold) for m in messages]
+
+    results = {
+        "json": (
+            sum(map(len, json_records)),
+            timeit(lambda m: m.json().encode(), messages),
+            timeit(
+                lambda v: OB11MsgModel.parse_raw(v, content_type="json"), json_records
+            ),
+        ),
+        "binary": (
+            sum(map(len, binary_records)),
+            timeit(lambda m: encode_binary(m, args.compress_threshold), messages),
+            timeit(
+                lambda v: OB11MsgModel.construct(**decode_binary(v)), binary_records
+            ),
+        ),
+    }
+
+    for name, (size, encode_us, decode_us) in results.items():
+        print(  # noqa: T201
+            f"{name:>6}: {size / len(messages):>7.1f} B/record, "
+            f"encode {encode_us:>6.1f} us, decode {decode_us:>6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+比较各消息存储后端的写入/读取吞吐量与 p99 延迟
+
+    python benchmarks/msg_store_backends.py --records 1000000
+"""
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import List
+from pathlib import Path
+from time import perf_counter
+
+import nonebot
+
+_tmp_dir = tempfile.TemporaryDirectory()
+nonebot.init(localstore_data_dir=_tmp_dir.name)
+
+from nonebot_adapter_onebot_pretender.data.backends import (  # noqa: E402
+    MsgRecord,
+    create_msg_store_backend,
+)
+
+VALUE = (
+    b'{"message_id": 0, "group": true, "group_id": 123456789, "real_id": 0, '
+    b'"message_type": "group", "sender": {"user_id": 987654321, "nickname": "nick"}, '
+    b'"time": 0, "message": [{"type": "text", "data": {"text": "hello world"}}], '
+    b'"raw_message": "hello world", "forward": null}'
+)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+
+async def bench(name: str, records: int, batch_size: int, reads: int):
+    data_dir = Path(tempfile.mkdtemp(dir=_tmp_dir.name))
+    backend = create_msg_store_backend(name, data_dir)
+
+    put_latencies = []
+    start = perf_counter()
+    for i in range(0, records, batch_size):
+        batch = [
+            MsgRecord(str(7_000_000_000_000_000_000 + j), 1_700_000_000 + j, VALUE)
+            for j in range(i, min(i + batch_size, records))
+        ]
+        t = perf_counter()
+        await backend.put_many(batch)
+        put_latencies.append(perf_counter() - t)
+    put_elapsed = perf_counter() - start
+
+    get_latencies = []
+    start = perf_counter()
+    for _ in range(reads):
+        message_id = str(7_000_000_000_000_000_000 + random.randrange(records))
+        t = perf_counter()
+        await backend.get(message_id)
+        get_latencies.append(perf_counter() - t)
+    get_elapsed = perf_counter() - start
+
+    backend.close()
+
+    print(  # noqa: T201
+        f"{name:>8}: "
+        f"put {records / put_elapsed:>10.0f} rec/s "
+        f"(p99 batch {percentile(put_latencies, 0.99) * 1000:.2f} ms), "
+        f"get {reads / get_elapsed:>8.0f} op/s "
+        f"(p99 {percentile(get_latencies, 0.99) * 1000:.2f} ms)"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--reads", type=int, default=100_000)
+    parser.add_argument(
+        "--backend", action="append", choices=["unqlite", "sqlite"], default=None
+    )
+    args = parser.parse_args()
+
+    for name in args.backend or ["unqlite", "sqlite"]:
+        await bench(name, args.records, args.batch_size, args.reads)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
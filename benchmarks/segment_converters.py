@@ -0,0 +1,220 @@
+"""
+比较消息段转换注册表与原先 if/elif 链的转换速度
+
+    python benchmarks/segment_converters.py --messages 2000 --segments 50
+"""
+import random
+import argparse
+import tempfile
+from time import perf_counter
+from typing import List, Callable
+
+import nonebot
+
+nonebot.init(localstore_data_dir=tempfile.mkdtemp())
+
+from nonebot.adapters.red import Message as RedMsg  # noqa: E402
+from nonebot.adapters.red import MessageSegment as RedMS  # noqa: E402
+from nonebot.adapters.onebot.v11 import Message as OB11Msg  # noqa: E402
+from nonebot.adapters.red.message import MediaMessageSegment  # noqa: E402
+from nonebot.adapters.onebot.v11 import MessageSegment as OB11MS  # noqa: E402
+
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender  # noqa: E402
+
+
+class _Driver:
+    class config:
+        port = 8080
+
+
+class _Adapter:
+    driver = _Driver()
+
+
+class _Bot:
+    self_id = "1234567890"
+
+
+def legacy_incoming(self: RedOB11Pretender, bot, incoming: RedMsg) -> OB11Msg:
+    """重构前 convert_incoming_msg 的 if/elif 链"""
+    msg = OB11Msg()
+    for m in incoming:
+        if m.type == "text":
+            msg.append(OB11MS.text(m.data["text"]))
+        elif m.type == "at":
+            msg.append(
+                OB11MS(
+                    "at",
+                    {"qq": str(m.data["user_id"]), "name": m.data.get("user_name")},
+                )
+            )
+        elif m.type == "at_all":
+            msg.append(OB11MS.at("all"))
+        elif m.type == "face":
+            msg.append(OB11MS("face", {"id": str(m.data["face_id"])}))
+        elif m.type == "image" and isinstance(m, MediaMessageSegment):
+            msg.append(
+                OB11MS(
+                    "image",
+                    {
+                        "file": "file://" + m.data["path"],
+                        "url": self.construct_media_url(bot.self_id, m),
+                    },
+                )
+            )
+        elif m.type == "video" and isinstance(m, MediaMessageSegment):
+            msg.append(
+                OB11MS(
+                    "video",
+                    {
+                        "file": "file://" + m.data["path"],
+                        "url": self.construct_media_url(bot.self_id, m),
+                        "cover": "file://" + m.data["thumb_path"],
+                    },
+                )
+            )
+        elif m.type == "voice" and isinstance(m, MediaMessageSegment):
+            msg.append(
+                OB11MS(
+                    "record",
+                    {
+                        "file": "file://" + m.data["path"],
+                        "url": self.construct_media_url(bot.self_id, m),
+                    },
+                )
+            )
+        elif m.type == "reply":
+            msg.append(OB11MS("reply", {"id": str(m.data["msg_id"])}))
+    return msg
+
+
+def legacy_outgoing(self: RedOB11Pretender, outgoing: OB11Msg) -> RedMsg:
+    """重构前 convert_outgoing_msg 的 if/elif 链（不含媒体）"""
+    msg = RedMsg()
+    for m in outgoing:
+        if m.type == "text":
+            msg.append(RedMS.text(m.data["text"]))
+        elif m.type == "at":
+            if m.data["qq"] == "all":
+                msg.append(RedMS.at_all())
+            else:
+                msg.append(RedMS.at(m.data["qq"]))
+        elif m.type == "face":
+            msg.append(RedMS.face(m.data["id"]))
+        elif m.type == "reply":
+            msg.append(
+                RedMS.reply(m.data.get("seq"), m.data.get("id"), m.data.get("qq"))
+            )
+    return msg
+
+
+def media(rnd: random.Random, seg_type: str) -> MediaMessageSegment:
+    return MediaMessageSegment(
+        seg_type,
+        {
+            "path": f"/root/.chronocat/Pic/{rnd.getrandbits(128):032x}.jpg",
+            "thumb_path": "/root/.chronocat/Thumb/0.jpg",
+            "id": str(rnd.randrange(10**18, 10**19)),
+            "_msg_id": str(rnd.randrange(10**18, 10**19)),
+            "_chat_type": 2,
+            "_peer_uin": str(rnd.randrange(10**8, 10**9)),
+        },
+    )
+
+
+def incoming_corpus(n: int, segments: int) -> List[RedMsg]:
+    rnd = random.Random(42)
+    kinds = ["text"] * 6 + ["at", "at_all", "face", "reply", "image", "voice"]
+    result = []
+    for _ in range(n):
+        msg = RedMsg()
+        for _ in range(segments):
+            kind = rnd.choice(kinds)
+            if kind == "text":
+                msg.append(RedMS.text("hello" * rnd.randrange(1, 5)))
+            elif kind == "at":
+                msg.append(RedMS.at(str(rnd.randrange(10**8, 10**10))))
+            elif kind == "at_all":
+                msg.append(RedMS.at_all())
+            elif kind == "face":
+                msg.append(RedMS.face(str(rnd.randrange(300))))
+            elif kind == "reply":
+                msg.append(RedMS.reply("1", str(rnd.randrange(10**18, 10**19))))
+            else:
+                msg.append(media(rnd, kind))
+        result.append(msg)
+    return result
+
+
+def outgoing_corpus(n: int, segments: int) -> List[OB11Msg]:
+    rnd = random.Random(42)
+    result = []
+    for _ in range(n):
+        msg = OB11Msg()
+        for _ in range(segments):
+            kind = rnd.random()
+            if kind < 0.6:
+                msg.append(OB11MS.text("hello" * rnd.randrange(1, 5)))
+            elif kind < 0.75:
+                msg.append(OB11MS.at(rnd.randrange(10**8, 10**10)))
+            elif kind < 0.9:
+                msg.append(OB11MS.face(rnd.randrange(300)))
+            else:
+                msg.append(OB11MS.reply(rnd.randrange(10**18, 10**19)))
+        result.append(msg)
+    return result
+
+
+def timeit(func: Callable, items: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--segments", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+    pretender.adapter = _Adapter()
+    bot = _Bot()
+
+    incoming = incoming_corpus(args.messages, args.segments)
+    outgoing = outgoing_corpus(args.messages, args.segments)
+
+    results = {
+        "incoming": (
+            timeit(lambda m: legacy_incoming(pretender, bot, m), incoming, args.repeat),
+            timeit(
+                lambda m: pretender.convert_incoming_msg(bot, m), incoming, args.repeat
+            ),
+        ),
+        "outgoing": (
+            timeit(lambda m: legacy_outgoing(pretender, m), outgoing, args.repeat),
+            timeit(pretender.convert_outgoing_msg, outgoing, args.repeat),
+        ),
+    }
+
+    for name, (legacy_us, registry_us) in results.items():
+        print(  # noqa: T201
+            f"{name:>8}: if/elif {legacy_us:>8.1f} us/msg, "
+            f"registry {registry_us:>8.1f} us/msg "
+            f"({legacy_us / registry_us:.2f}x)"
+        )
+
+    print("\nper-type stats (incoming):")  # noqa: T201
+    for seg_type, stats in sorted(RedOB11Pretender.incoming_converters.stats.items()):
+        print(  # noqa: T201
+            f"{seg_type:>8}: {stats.count:>9} calls, {stats.average * 1e6:>6.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
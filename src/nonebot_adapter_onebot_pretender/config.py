@@ -0,0 +1,63 @@
+from typing import Dict, Union, Literal, Optional
+
+from nonebot import get_driver
+from pydantic import BaseModel
+
+
+class Config(BaseModel):
+    # 消息存储后端
+    ob_pretender_store_backend: Literal["unqlite", "sqlite"] = "unqlite"
+    ob_pretender_store_encoding: Literal["binary", "json"] = "binary"
+    ob_pretender_store_compress_threshold: int = 1024
+    ob_pretender_store_migrate_on_startup: bool = False
+    # 消息存储写入队列
+    ob_pretender_store_batch_size: int = 64
+    ob_pretender_store_flush_interval_ms: int = 50
+    ob_pretender_store_queue_size: int = 4096
+    # 消息缓存
+    ob_pretender_msg_cache_size: int = 4096
+    ob_pretender_msg_cache_memory: int = 32 * 1024 * 1024
+    # 消息保留与压缩
+    ob_pretender_msg_max_age_days: Optional[float] = None
+    ob_pretender_msg_max_count: Optional[int] = None
+    ob_pretender_msg_sweep_interval: int = 600
+    ob_pretender_msg_sweep_batch_size: int = 500
+    ob_pretender_store_compact_on_startup: bool = False
+    # 媒体转发
+    ob_pretender_media_chunk_size: int = 64 * 1024
+    ob_pretender_media_timeout: float = 60.0
+    ob_pretender_media_cache_size: int = 256 * 1024 * 1024
+    # 上传去重
+    ob_pretender_upload_cache_size: int = 1024
+    ob_pretender_upload_cache_ttl: int = 6 * 60 * 60
+    ob_pretender_base64_spool_threshold: int = 1024 * 1024
+    # 消息段转换
+    ob_pretender_converter_timing: bool = False
+    ob_pretender_strict_validation: bool = False
+    # 延迟生成的日志内容
+    ob_pretender_log_level: Optional[Union[int, str]] = None
+    # 回复解析
+    ob_pretender_reply_timeout: float = 1.0
+    ob_pretender_reply_history_count: int = 20
+    # 群成员缓存
+    ob_pretender_member_cache_size: int = 128
+    ob_pretender_member_refresh_interval: int = 10 * 60
+    ob_pretender_member_fetch_concurrency: int = 2
+    # API 结果缓存
+    ob_pretender_api_cache_ttl: Dict[str, float] = {}
+    # 发送调度
+    # 默认不限速、不限并发，与未启用调度时的行为一致
+    ob_pretender_send_rate: float = 0
+    ob_pretender_send_burst: int = 10
+    ob_pretender_send_target_rate: float = 0
+    ob_pretender_send_target_burst: int = 5
+    ob_pretender_send_concurrency: int = 0
+    ob_pretender_send_queue_size: int = 0
+    ob_pretender_send_overflow: Literal["wait", "reject", "drop_oldest"] = "wait"
+    ob_pretender_broadcast_concurrency: int = 8
+
+    class Config:
+        extra = "ignore"
+
+
+conf = Config.parse_obj(get_driver().config)
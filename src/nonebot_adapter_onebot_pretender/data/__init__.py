@@ -1,5 +1,10 @@
-from unqlite import UnQLite
-
+from nonebot_adapter_onebot_pretender.config import conf
 from nonebot_adapter_onebot_pretender.store import datastore
+from nonebot_adapter_onebot_pretender.data.backends import (
+    MsgStoreBackend,
+    create_msg_store_backend,
+)
 
-db = UnQLite(str(datastore.data_dir / "database.db"))
+msg_store: MsgStoreBackend = create_msg_store_backend(
+    conf.ob_pretender_store_backend, datastore.data_dir
+)
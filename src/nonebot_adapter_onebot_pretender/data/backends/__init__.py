@@ -0,0 +1,139 @@
+from pathlib import Path
+from dataclasses import dataclass
+from abc import ABC, abstractmethod
+from typing import (
+    Dict,
+    List,
+    Tuple,
+    Iterable,
+    Optional,
+    Sequence,
+    NamedTuple,
+    AsyncIterator,
+)
+
+
+class MsgRecord(NamedTuple):
+    message_id: str
+    time: int
+    value: bytes
+    # 二级索引：群聊消息所在的群，私聊消息的对方
+    group_id: Optional[int] = None
+    peer_id: Optional[int] = None
+
+
+@dataclass
+class CompactionReport:
+    records: int
+    size_before: int
+    size_after: int
+    elapsed: float
+
+    @property
+    def reclaimed(self) -> int:
+        return self.size_before - self.size_after
+
+
+class MsgStoreBackend(ABC):
+    """
+    消息存储后端，按 message_id 保存已序列化的消息，
+    并按 (时间, 写入顺序) 排序以便范围扫描与过期清理。
+
+    消息不一定按时间顺序写入（如拉取的历史消息），排序不能依赖写入顺序。
+    """
+
+    @abstractmethod
+    async def get(self, message_id: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, message_ids: Sequence[str]) -> Dict[str, bytes]:
+        ...
+
+    async def put(self, record: MsgRecord):
+        await self.put_many([record])
+
+    @abstractmethod
+    async def put_many(self, records: Sequence[MsgRecord]):
+        """在一个事务内写入所有记录"""
+        ...
+
+    @abstractmethod
+    async def delete(self, message_ids: Iterable[str]):
+        ...
+
+    @abstractmethod
+    async def scan(
+        self,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        *,
+        group_id: Optional[int] = None,
+        peer_id: Optional[int] = None,
+        before: Optional[Tuple[int, str]] = None,
+        limit: int = 100,
+        reverse: bool = False,
+    ) -> List[MsgRecord]:
+        """
+        按 (时间, 写入顺序) 返回 start_time <= time < end_time 的记录，
+        reverse 时从最新开始。
+
+        指定 group_id 或 peer_id 时只返回该群聊或私聊会话的记录，
+        耗时只与返回的条数有关。
+
+        before 为 (time, message_id)，只返回该消息及按 (时间, 写入顺序) 在其之前的记录；
+        该消息不在存储中时返回 time <= before[0] 的所有记录。
+        """
+        ...
+
+    @abstractmethod
+    def iterate(self, batch_size: int = 500) -> AsyncIterator[List[MsgRecord]]:
+        """按 (时间, 写入顺序) 分批遍历所有记录，批与批之间不持有锁"""
+        ...
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    @abstractmethod
+    async def expire(
+        self, max_age: Optional[float], max_count: Optional[int], limit: int
+    ) -> List[str]:
+        """
+        按 (时间, 写入顺序) 从最旧的记录开始删除超过保留期限或超出保留条数的记录，
+        最多删除 limit 条
+        """
+        ...
+
+    async def prepare(self):
+        """启动时进行的一次性维护，如为旧版本保存的消息建立索引"""
+
+    @abstractmethod
+    async def compact(self) -> CompactionReport:
+        """回收已删除记录占用的空间，期间对存储的读写会等待，应在启动时进行"""
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+def create_msg_store_backend(name: str, data_dir: Path) -> MsgStoreBackend:
+    if name == "unqlite":
+        from .unqlite import UnQLiteMsgStoreBackend
+
+        return UnQLiteMsgStoreBackend(data_dir / "database.db")
+    elif name == "sqlite":
+        from .sqlite import SQLiteMsgStoreBackend
+
+        return SQLiteMsgStoreBackend(data_dir / "ob11_msg.sqlite3")
+    else:
+        raise ValueError(f"未知的消息存储后端 {name}")
+
+
+__all__ = (
+    "MsgRecord",
+    "CompactionReport",
+    "MsgStoreBackend",
+    "create_msg_store_backend",
+)
@@ -0,0 +1,271 @@
+import sqlite3
+from pathlib import Path
+from threading import RLock
+from time import time, perf_counter
+from typing import Dict, List, Tuple, Iterable, Optional, Sequence, AsyncIterator
+
+from nonebot.utils import run_sync
+
+from . import MsgRecord, MsgStoreBackend, CompactionReport
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ob11_msg (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id TEXT NOT NULL UNIQUE,
+    time INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    group_id INTEGER,
+    peer_id INTEGER
+);
+"""
+# 二级索引的末尾隐含 seq，因此 ORDER BY time, seq 可以直接使用索引
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS ob11_msg_time ON ob11_msg (time);
+CREATE INDEX IF NOT EXISTS ob11_msg_group ON ob11_msg (group_id, time)
+    WHERE group_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ob11_msg_peer ON ob11_msg (peer_id, time)
+    WHERE peer_id IS NOT NULL;
+"""
+
+_GET = "SELECT value FROM ob11_msg WHERE message_id = ?"
+_GET_SEQ = "SELECT time, seq FROM ob11_msg WHERE message_id = ?"
+_PUT = (
+    "INSERT INTO ob11_msg (message_id, time, value, group_id, peer_id) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (message_id) DO UPDATE SET time = excluded.time, "
+    "value = excluded.value, group_id = excluded.group_id, peer_id = excluded.peer_id"
+)
+_COLUMNS = "message_id, time, value, group_id, peer_id"
+_DELETE = "DELETE FROM ob11_msg WHERE message_id = ?"
+_COUNT = "SELECT COUNT(*) FROM ob11_msg"
+# 按 (time, seq) 排在 (?, ?) 之后，参数依次为 time, seq, time
+_AFTER = "(time = ? AND seq > ? OR time > ?)"
+
+# SQLite 单条语句的参数个数上限在旧版本中为 999
+_MAX_PARAMS = 900
+
+
+class SQLiteMsgStoreBackend(MsgStoreBackend):
+    """
+    使用 WAL 模式的 SQLite 保存消息，自增的 seq 列记录写入顺序，
+    扫描、遍历与过期清理都按 (time, seq) 排序。
+
+    语句均为固定 SQL，由 sqlite3 的语句缓存复用编译结果；批量写入使用 executemany。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(ob11_msg)")}
+        for column in ("group_id", "peer_id"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE ob11_msg ADD COLUMN {column} INTEGER")
+        self.conn.executescript(_INDEXES)
+        # sqlite3 的连接不能在多个线程中同时使用
+        self.lock = RLock()
+
+    def _get(self, message_id: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute(_GET, (message_id,)).fetchone()
+        return None if row is None else row[0]
+
+    async def get(self, message_id: str) -> Optional[bytes]:
+        return await run_sync(self._get)(message_id)
+
+    def _get_many(self, message_ids: Sequence[str]) -> Dict[str, bytes]:
+        result = {}
+        with self.lock:
+            for i in range(0, len(message_ids), _MAX_PARAMS):
+                chunk = message_ids[i : i + _MAX_PARAMS]
+                rows = self.conn.execute(
+                    "SELECT message_id, value FROM ob11_msg WHERE message_id IN "
+                    f"({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                result.update(rows)
+        return result
+
+    async def get_many(self, message_ids: Sequence[str]) -> Dict[str, bytes]:
+        return await run_sync(self._get_many)(list(message_ids))
+
+    def _put_many(self, records: Sequence[MsgRecord]):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(_PUT, records)
+
+    async def put_many(self, records: Sequence[MsgRecord]):
+        await run_sync(self._put_many)(records)
+
+    def _delete(self, message_ids: Iterable[str]):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(_DELETE, ((x,) for x in message_ids))
+
+    async def delete(self, message_ids: Iterable[str]):
+        await run_sync(self._delete)(list(message_ids))
+
+    def _scan(
+        self,
+        start_time: Optional[int],
+        end_time: Optional[int],
+        group_id: Optional[int],
+        peer_id: Optional[int],
+        before: Optional[Tuple[int, str]],
+        limit: int,
+        reverse: bool,
+    ) -> List[MsgRecord]:
+        conditions = []
+        params = []
+        if group_id is not None:
+            conditions.append("group_id = ?")
+            params.append(group_id)
+        elif peer_id is not None:
+            conditions.append("peer_id = ?")
+            params.append(peer_id)
+        if start_time is not None:
+            conditions.append("time >= ?")
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append("time < ?")
+            params.append(end_time)
+        order = "DESC" if reverse else "ASC"
+
+        with self.lock:
+            if before is not None:
+                before_time, before_id = before
+                row = self.conn.execute(_GET_SEQ, (before_id,)).fetchone()
+                if row is not None and row[0] == before_time:
+                    conditions.append("(time < ? OR (time = ? AND seq <= ?))")
+                    params += (before_time, before_time, row[1])
+                else:
+                    conditions.append("time <= ?")
+                    params.append(before_time)
+            where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM ob11_msg "
+                f"{where}ORDER BY time {order}, seq {order} LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [MsgRecord(*row) for row in rows]
+
+    async def scan(
+        self,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        *,
+        group_id: Optional[int] = None,
+        peer_id: Optional[int] = None,
+        before: Optional[Tuple[int, str]] = None,
+        limit: int = 100,
+        reverse: bool = False,
+    ) -> List[MsgRecord]:
+        return await run_sync(self._scan)(
+            start_time, end_time, group_id, peer_id, before, limit, reverse
+        )
+
+    def _iterate_batch(
+        self, start: Optional[Tuple[int, int]], batch_size: int
+    ) -> List[Tuple]:
+        with self.lock:
+            if start is None:
+                return self.conn.execute(
+                    f"SELECT seq, {_COLUMNS} FROM ob11_msg "
+                    "ORDER BY time, seq LIMIT ?",
+                    (batch_size,),
+                ).fetchall()
+            return self.conn.execute(
+                f"SELECT seq, {_COLUMNS} FROM ob11_msg "
+                f"WHERE {_AFTER} ORDER BY time, seq LIMIT ?",
+                (*start, start[0], batch_size),
+            ).fetchall()
+
+    async def iterate(self, batch_size: int = 500) -> AsyncIterator[List[MsgRecord]]:
+        start = None
+        while True:
+            rows = await run_sync(self._iterate_batch)(start, batch_size)
+            if rows:
+                # 以最后一条的 (time, seq) 作为下一批的起点
+                start = (rows[-1][2], rows[-1][0])
+                yield [MsgRecord(*row[1:]) for row in rows]
+            if len(rows) < batch_size:
+                break
+
+    def _count(self) -> int:
+        with self.lock:
+            return self.conn.execute(_COUNT).fetchone()[0]
+
+    async def count(self) -> int:
+        return await run_sync(self._count)()
+
+    def _expire(
+        self, max_age: Optional[float], max_count: Optional[int], limit: int
+    ) -> List[str]:
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            rows = []
+            if max_count is not None:
+                excess = self.conn.execute(_COUNT).fetchone()[0] - max_count
+                if excess > 0:
+                    rows = self.conn.execute(
+                        "SELECT time, seq, message_id FROM ob11_msg "
+                        "ORDER BY time, seq LIMIT ?",
+                        (min(excess, limit),),
+                    ).fetchall()
+            if max_age is not None and len(rows) < limit:
+                last_time, last_seq = rows[-1][:2] if rows else (-1, -1)
+                rows += self.conn.execute(
+                    "SELECT time, seq, message_id FROM ob11_msg "
+                    f"WHERE time < ? AND {_AFTER} ORDER BY time, seq LIMIT ?",
+                    (
+                        time() - max_age,
+                        last_time,
+                        last_seq,
+                        last_time,
+                        limit - len(rows),
+                    ),
+                ).fetchall()
+            self.conn.executemany(
+                "DELETE FROM ob11_msg WHERE seq = ?", ((seq,) for _, seq, _ in rows)
+            )
+        return [message_id for _, _, message_id in rows]
+
+    async def expire(
+        self, max_age: Optional[float], max_count: Optional[int], limit: int
+    ) -> List[str]:
+        return await run_sync(self._expire)(max_age, max_count, limit)
+
+    def _file_size(self) -> int:
+        size = 0
+        for suffix in ("", "-wal"):
+            path = self.path.with_name(self.path.name + suffix)
+            if path.exists():
+                size += path.stat().st_size
+        return size
+
+    def _compact(self) -> CompactionReport:
+        start = perf_counter()
+        with self.lock:
+            size_before = self._file_size()
+            self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            size_after = self._file_size()
+            records = self.conn.execute(_COUNT).fetchone()[0]
+
+        return CompactionReport(
+            records=records,
+            size_before=size_before,
+            size_after=size_after,
+            elapsed=perf_counter() - start,
+        )
+
+    async def compact(self) -> CompactionReport:
+        return await run_sync(self._compact)()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
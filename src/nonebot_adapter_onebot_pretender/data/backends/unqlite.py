@@ -0,0 +1,621 @@
+import os
+import json
+from heapq import merge
+from pathlib import Path
+from operator import itemgetter
+from threading import Lock, RLock
+from time import time, perf_counter
+from typing import (
+    Set,
+    Dict,
+    List,
+    Tuple,
+    Iterable,
+    Optional,
+    Sequence,
+    NamedTuple,
+    AsyncIterator,
+)
+
+from nonebot import logger
+from nonebot.utils import run_sync
+from unqlite import Cursor, UnQLite
+
+from . import MsgRecord, MsgStoreBackend, CompactionReport
+
+MSG_KEY_PREFIX = "ob11_msg_"
+SEQ_BACKFILLED_KEY = "ob11_msg_seq_backfilled"
+LIVE_COUNT_KEY = "ob11_msg_live_count"
+# 补全写入顺序记录时每次持有锁处理的记录数
+_BACKFILL_CHUNK_SIZE = 1000
+
+
+def msg_key(message_id: str) -> str:
+    return f"{MSG_KEY_PREFIX}{message_id}"
+
+
+def log_name(group_id: Optional[int] = None, peer_id: Optional[int] = None) -> str:
+    """顺序记录的名字，全局为空串，群聊为 g{group_id}，私聊为 u{peer_id}"""
+    if group_id is not None:
+        return f"g{group_id}"
+    elif peer_id is not None:
+        return f"u{peer_id}"
+    return ""
+
+
+def parse_log_name(log: str) -> Tuple[Optional[int], Optional[int]]:
+    if log.startswith("g"):
+        return int(log[1:]), None
+    elif log.startswith("u"):
+        return None, int(log[1:])
+    return None, None
+
+
+def seq_key(seq: int, log: str = "") -> str:
+    if log:
+        return f"ob11_msg_{log}_seq_{seq}"
+    return f"ob11_msg_seq_{seq}"
+
+
+def seq_head_key(log: str = "") -> str:
+    return f"ob11_msg_{log}_seq_head" if log else "ob11_msg_seq_head"
+
+
+def seq_tail_key(log: str = "") -> str:
+    return f"ob11_msg_{log}_seq_tail" if log else "ob11_msg_seq_tail"
+
+
+class SeqEntry(NamedTuple):
+    time: int
+    message_id: str
+    # 仅全局记录含有，该消息所属会话的顺序记录
+    log: str = ""
+
+
+def compact_unqlite_file(path: str) -> int:
+    """
+    将 path 处的 UnQLite 数据库复制到新文件后替换原文件，从而回收已删除记录占用的空间。
+
+    调用时该数据库不能被打开。返回复制的记录条数。
+    """
+    tmp_path = f"{path}.compact"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    records = 0
+    src = UnQLite(path)
+    dst = UnQLite(tmp_path)
+    try:
+        with dst.transaction():
+            for key, value in src.items():
+                dst[key] = value
+                records += 1
+    finally:
+        dst.close()
+        src.close()
+
+    os.replace(tmp_path, path)
+    return records
+
+
+class UnQLiteMsgStoreBackend(MsgStoreBackend):
+    """
+    消息以 ob11_msg_{message_id} 为键保存；
+    另外按 (时间, 写入顺序) 排序记录 ob11_msg_seq_{n} -> "time message_id log"，
+    [tail, head) 为有效区间，用于范围扫描与从最旧的消息开始过期清理。
+
+    每个群聊/私聊会话还有各自的顺序记录 ob11_msg_{log}_seq_{n} -> "time message_id"，
+    作为二级索引，使按会话的范围扫描只需访问该会话的记录。
+
+    消息通常按时间顺序写入，只需追加到末尾；
+    早于已有记录写入的消息（如拉取的历史消息）插入到按时间排序的位置，其后的记录依次后移。
+
+    删除的消息在顺序记录中留下记录，因此 [tail, head) 的长度不等于消息条数，
+    消息条数另外记录在 ob11_msg_live_count 中。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = UnQLite(str(path))
+        # 所有访问都在线程中进行，压缩时需要关闭并重新打开数据库，因此用锁串行化
+        self.lock = RLock()
+        # 修改数据库的操作另外持有该锁，补全写入顺序记录时借此保持游标有效
+        self._write_lock = Lock()
+        self._backfill_lock = Lock()
+        self._backfilled = False
+        self._live_counted = False
+
+    def _read_counter(self, key: str) -> int:
+        try:
+            return int(self.db[key])
+        except KeyError:
+            return 0
+
+    def _read_seq(self, seq: int, log: str = "") -> Optional[SeqEntry]:
+        try:
+            parts = self.db[seq_key(seq, log)].decode().split(" ")
+        except KeyError:
+            return None
+        # 旧版本的全局记录末尾还有该消息在会话记录中的位置，已不再使用
+        if len(parts) >= 3:
+            return SeqEntry(int(parts[0]), parts[1], parts[2])
+        return SeqEntry(int(parts[0]), parts[1])
+
+    def _seq_time(self, seq: int, log: str) -> Optional[int]:
+        try:
+            return int(self.db[seq_key(seq, log)].split(b" ", 1)[0])
+        except KeyError:
+            return None
+
+    def _insert_seq(self, log: str, entries: List[Tuple[int, str]]):
+        """
+        将按写入顺序排列的 (time, 记录) 插入顺序记录，保持按 (时间, 写入顺序) 排序。
+
+        晚于已有记录的只需追加到末尾；否则读出插入位置之后的记录，
+        与新记录归并后重新写入，同一秒内已有的记录在前
+        """
+        head = self._read_counter(seq_head_key(log))
+        tail = self._read_counter(seq_tail_key(log))
+        entries.sort(key=itemgetter(0))
+
+        pos = head
+        last_time = self._seq_time(head - 1, log) if head > tail else None
+        if last_time is not None and last_time > entries[0][0]:
+            pos = self._bisect_time(tail, head, entries[0][0] + 1, log)
+
+        moved = []
+        for seq in range(pos, head):
+            try:
+                value = self.db[seq_key(seq, log)]
+            except KeyError:
+                continue
+            moved.append((int(value.split(b" ", 1)[0]), value))
+
+        seq = pos
+        for _, value in merge(moved, entries, key=itemgetter(0)):
+            self.db[seq_key(seq, log)] = value
+            seq += 1
+        # 缺失的记录不再保留，末尾可能剩下多余的记录
+        for stale in range(seq, head):
+            try:
+                del self.db[seq_key(stale, log)]
+            except KeyError:
+                pass
+        self.db[seq_head_key(log)] = str(seq)
+
+    def _trim_seq(self, log: str):
+        """从 tail 开始删除会话记录中已删除消息的记录，直到遇到仍存在的消息"""
+        head = self._read_counter(seq_head_key(log))
+        tail = self._read_counter(seq_tail_key(log))
+        while tail < head:
+            entry = self._read_seq(tail, log)
+            if entry is not None:
+                if self.db.exists(msg_key(entry.message_id)):
+                    break
+                del self.db[seq_key(tail, log)]
+            tail += 1
+        self.db[seq_tail_key(log)] = str(tail)
+
+    def _record(self, entry: SeqEntry, log: str = "") -> Optional[MsgRecord]:
+        try:
+            value = self.db[msg_key(entry.message_id)]
+        except KeyError:
+            return None
+        return MsgRecord(
+            entry.message_id, entry.time, value, *parse_log_name(log or entry.log)
+        )
+
+    def _get(self, message_id: str) -> Optional[bytes]:
+        with self.lock:
+            try:
+                return self.db[msg_key(message_id)]
+            except KeyError:
+                return None
+
+    async def get(self, message_id: str) -> Optional[bytes]:
+        return await run_sync(self._get)(message_id)
+
+    def _get_many(self, message_ids: Sequence[str]) -> Dict[str, bytes]:
+        result = {}
+        with self.lock:
+            for message_id in message_ids:
+                try:
+                    result[message_id] = self.db[msg_key(message_id)]
+                except KeyError:
+                    pass
+        return result
+
+    async def get_many(self, message_ids: Sequence[str]) -> Dict[str, bytes]:
+        return await run_sync(self._get_many)(message_ids)
+
+    def _put_many(self, records: Sequence[MsgRecord]):
+        with self._write_lock, self.lock, self.db.transaction():
+            logs: Dict[str, List[Tuple[int, str]]] = {}
+            added = 0
+
+            for record in records:
+                key = msg_key(record.message_id)
+                if not self.db.exists(key):
+                    added += 1
+                    entry = f"{record.time} {record.message_id}"
+                    log = log_name(record.group_id, record.peer_id)
+                    if log:
+                        logs.setdefault(log, []).append((record.time, entry))
+                        entry += f" {log}"
+                    logs.setdefault("", []).append((record.time, entry))
+                self.db[key] = record.value
+
+            for log, entries in logs.items():
+                self._insert_seq(log, entries)
+            self._add_live_count(added)
+
+    async def put_many(self, records: Sequence[MsgRecord]):
+        await run_sync(self._put_many)(records)
+
+    def _delete(self, message_ids: Iterable[str]):
+        # 顺序记录保留，扫描与过期清理时会跳过已删除的消息
+        with self._write_lock, self.lock, self.db.transaction():
+            deleted = 0
+            for message_id in message_ids:
+                try:
+                    del self.db[msg_key(message_id)]
+                    deleted += 1
+                except KeyError:
+                    pass
+            self._add_live_count(-deleted)
+
+    async def delete(self, message_ids: Iterable[str]):
+        await run_sync(self._delete)(list(message_ids))
+
+    def _bisect_time(self, tail: int, head: int, msg_time: int, log: str) -> int:
+        """
+        顺序记录按时间递增，二分找到第一个 time >= msg_time 的位置。
+        缺失的记录只会是已过期删除的最旧记录。
+        """
+        lo, hi = tail, head
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._read_seq(mid, log)
+            if entry is None or entry.time < msg_time:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _bisect_before(
+        self, tail: int, head: int, before: Tuple[int, str], log: str
+    ) -> int:
+        """
+        返回 before 之后的第一个位置：先按时间二分，
+        再在同一秒的记录中找到 before，找不到时保留同一秒的所有记录
+        """
+        before_time, before_id = before
+        head = self._bisect_time(tail, head, before_time + 1, log)
+        for seq in range(head - 1, tail - 1, -1):
+            entry = self._read_seq(seq, log)
+            if entry is None or entry.time != before_time:
+                break
+            if entry.message_id == before_id:
+                return seq + 1
+        return head
+
+    def _scan(
+        self,
+        start_time: Optional[int],
+        end_time: Optional[int],
+        group_id: Optional[int],
+        peer_id: Optional[int],
+        before: Optional[Tuple[int, str]],
+        limit: int,
+        reverse: bool,
+    ) -> List[MsgRecord]:
+        self._backfill_seq()
+
+        log = log_name(group_id, peer_id)
+        result = []
+        with self.lock:
+            head = self._read_counter(seq_head_key(log))
+            tail = self._read_counter(seq_tail_key(log))
+            if start_time is not None:
+                tail = self._bisect_time(tail, head, start_time, log)
+            if end_time is not None:
+                head = self._bisect_time(tail, head, end_time, log)
+            if before is not None:
+                head = self._bisect_before(tail, head, before, log)
+
+            seqs = range(head - 1, tail - 1, -1) if reverse else range(tail, head)
+            for seq in seqs:
+                if len(result) >= limit:
+                    break
+                entry = self._read_seq(seq, log)
+                if entry is None:
+                    continue
+                record = self._record(entry, log)
+                if record is not None:
+                    result.append(record)
+        return result
+
+    async def scan(
+        self,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        *,
+        group_id: Optional[int] = None,
+        peer_id: Optional[int] = None,
+        before: Optional[Tuple[int, str]] = None,
+        limit: int = 100,
+        reverse: bool = False,
+    ) -> List[MsgRecord]:
+        return await run_sync(self._scan)(
+            start_time, end_time, group_id, peer_id, before, limit, reverse
+        )
+
+    def _iterate_batch(
+        self, start: Optional[int], batch_size: int
+    ) -> Tuple[List[MsgRecord], int, bool]:
+        result = []
+        with self.lock:
+            head = self._read_counter(seq_head_key())
+            seq = self._read_counter(seq_tail_key()) if start is None else start
+            end = min(seq + batch_size, head)
+            for seq in range(seq, end):
+                entry = self._read_seq(seq)
+                if entry is None:
+                    continue
+                record = self._record(entry)
+                if record is not None:
+                    result.append(record)
+        return result, end, end >= head
+
+    async def iterate(self, batch_size: int = 500) -> AsyncIterator[List[MsgRecord]]:
+        await run_sync(self._backfill_seq)()
+
+        start = None
+        while True:
+            records, start, done = await run_sync(self._iterate_batch)(
+                start, batch_size
+            )
+            if records:
+                yield records
+            if done:
+                break
+
+    def _add_live_count(self, delta: int):
+        """尚未统计消息条数时不记录，统计时会计入这些变化"""
+        if delta != 0 and self.db.exists(LIVE_COUNT_KEY):
+            self.db[LIVE_COUNT_KEY] = str(self._read_counter(LIVE_COUNT_KEY) + delta)
+
+    def _ensure_live_count(self):
+        """统计写入顺序 [tail, head) 中尚未删除的消息条数，只在第一次需要时进行"""
+        self._backfill_seq()
+        if self._live_counted:
+            return
+
+        with self._write_lock:
+            with self.lock:
+                if self.db.exists(LIVE_COUNT_KEY):
+                    self._live_counted = True
+                    return
+                head = self._read_counter(seq_head_key())
+                tail = self._read_counter(seq_tail_key())
+
+            # 统计期间持有写锁，区间不会变化；读取不受影响
+            live = 0
+            for chunk in range(tail, head, _BACKFILL_CHUNK_SIZE):
+                with self.lock:
+                    for seq in range(chunk, min(chunk + _BACKFILL_CHUNK_SIZE, head)):
+                        entry = self._read_seq(seq)
+                        if entry is not None and self.db.exists(
+                            msg_key(entry.message_id)
+                        ):
+                            live += 1
+
+            with self.lock, self.db.transaction():
+                self.db[LIVE_COUNT_KEY] = str(live)
+            self._live_counted = True
+
+    def _count(self) -> int:
+        self._ensure_live_count()
+
+        with self.lock:
+            return self._read_counter(LIVE_COUNT_KEY)
+
+    async def count(self) -> int:
+        return await run_sync(self._count)()
+
+    def _read_logged(self, tail: int, head: int) -> Set[str]:
+        """读取全局写入顺序 [tail, head) 中的消息，分块持有锁"""
+        logged = set()
+        for chunk in range(tail, head, _BACKFILL_CHUNK_SIZE):
+            with self.lock:
+                for seq in range(chunk, min(chunk + _BACKFILL_CHUNK_SIZE, head)):
+                    entry = self._read_seq(seq)
+                    if entry is not None:
+                        logged.add(entry.message_id)
+        return logged
+
+    def _read_legacy_chunk(
+        self, cursor: Cursor, logged: Set[str]
+    ) -> Tuple[List[Tuple[str, bytes]], bool]:
+        """
+        从游标处读取至多 _BACKFILL_CHUNK_SIZE 条记录中尚无写入顺序记录的消息，
+        返回这些消息以及是否已遍历完成
+        """
+        result = []
+        with self.lock:
+            for _ in range(_BACKFILL_CHUNK_SIZE):
+                if not cursor.is_valid():
+                    return result, True
+                key = cursor.key()
+                key = key.decode() if isinstance(key, bytes) else key
+                message_id = key[len(MSG_KEY_PREFIX) :]
+                if (
+                    key.startswith(MSG_KEY_PREFIX)
+                    and message_id.isdigit()
+                    and message_id not in logged
+                ):
+                    result.append((message_id, cursor.value()))
+                try:
+                    cursor.next_entry()
+                except StopIteration:
+                    return result, True
+        return result, not cursor.is_valid()
+
+    @staticmethod
+    def _legacy_entry(message_id: str, value: bytes) -> Tuple[int, str, str]:
+        try:
+            msg = json.loads(value)
+            msg_time = int(msg.get("time") or 0)
+            if msg.get("message_type") == "group":
+                log = log_name(group_id=msg.get("group_id"))
+            else:
+                sender = msg.get("sender") or {}
+                log = log_name(peer_id=msg.get("peer_id") or sender.get("user_id"))
+        except ValueError:
+            msg_time, log = 0, ""
+        return msg_time, message_id, log
+
+    def _write_legacy_chunk(self, legacy: Sequence[Tuple[int, str, str]], done: bool):
+        with self._write_lock, self.lock, self.db.transaction():
+            tails: Dict[str, int] = {}
+
+            def prev_seq(log: str) -> int:
+                if log not in tails:
+                    tails[log] = self._read_counter(seq_tail_key(log))
+                tails[log] -= 1
+                return tails[log]
+
+            for msg_time, message_id, log in legacy:
+                entry = f"{msg_time} {message_id}"
+                if log:
+                    self.db[seq_key(prev_seq(log), log)] = entry
+                    entry += f" {log}"
+                self.db[seq_key(prev_seq(""))] = entry
+
+            for log, tail in tails.items():
+                self.db[seq_tail_key(log)] = str(tail)
+            if done:
+                self.db[SEQ_BACKFILLED_KEY] = "1"
+
+    def _backfill_seq(self):
+        """
+        为启用写入顺序记录之前保存的消息补上记录，按消息时间从旧到新排在最前面。
+
+        遍历与写入都分块进行，块与块之间释放 self.lock，读取消息不会被阻塞；
+        遍历期间游标需要保持有效，因此写入要等遍历结束。
+        通常由 prepare 在启动时、开始接收事件之前完成，
+        这里的检查只是未调用 prepare 时的后备。
+        """
+        if self._backfilled:
+            return
+
+        with self._backfill_lock:
+            with self.lock:
+                if self.db.exists(SEQ_BACKFILLED_KEY):
+                    self._backfilled = True
+                    return
+
+            legacy: List[Tuple[int, str, str]] = []
+            with self._write_lock:
+                with self.lock:
+                    head = self._read_counter(seq_head_key())
+                    tail = self._read_counter(seq_tail_key())
+                logged = self._read_logged(tail, head)
+
+                with self.lock:
+                    cursor = self.db.cursor()
+                    cursor.first()
+                done = False
+                while not done:
+                    chunk, done = self._read_legacy_chunk(cursor, logged)
+                    legacy.extend(self._legacy_entry(*item) for item in chunk)
+                del cursor
+
+            # 从新到旧依次插到最前面，中途退出时剩余的消息仍比已补全的旧
+            legacy.sort(reverse=True)
+            for i in range(0, len(legacy), _BACKFILL_CHUNK_SIZE):
+                self._write_legacy_chunk(legacy[i : i + _BACKFILL_CHUNK_SIZE], False)
+            self._write_legacy_chunk((), True)
+            self._backfilled = True
+
+        if legacy:
+            logger.info(f"Backfilled write order for {len(legacy)} stored OB11 Msg(s)")
+
+    def _expire(
+        self, max_age: Optional[float], max_count: Optional[int], limit: int
+    ) -> List[str]:
+        self._ensure_live_count()
+
+        expired = []
+        logs = set()
+        deadline = time() - max_age if max_age is not None else None
+
+        with self._write_lock, self.lock, self.db.transaction():
+            head = self._read_counter(seq_head_key())
+            tail = self._read_counter(seq_tail_key())
+            live = self._read_counter(LIVE_COUNT_KEY)
+            while tail < head and len(expired) < limit:
+                entry = self._read_seq(tail)
+                if entry is None:
+                    tail += 1
+                    continue
+
+                # 已删除的消息只清理其写入顺序记录，不计入保留条数
+                alive = self.db.exists(msg_key(entry.message_id))
+                if alive:
+                    too_many = max_count is not None and live > max_count
+                    too_old = deadline is not None and entry.time < deadline
+                    if not too_many and not too_old:
+                        break
+
+                for key in (seq_key(tail), msg_key(entry.message_id)):
+                    try:
+                        del self.db[key]
+                    except KeyError:
+                        pass
+                if entry.log:
+                    logs.add(entry.log)
+                if alive:
+                    expired.append(entry.message_id)
+                    live -= 1
+                tail += 1
+            self.db[seq_tail_key()] = str(tail)
+            self.db[LIVE_COUNT_KEY] = str(live)
+            # 会话记录同样按时间排序，过期的消息都在其最前面
+            for log in logs:
+                self._trim_seq(log)
+
+        return expired
+
+    async def expire(
+        self, max_age: Optional[float], max_count: Optional[int], limit: int
+    ) -> List[str]:
+        return await run_sync(self._expire)(max_age, max_count, limit)
+
+    async def prepare(self):
+        await run_sync(self._ensure_live_count)()
+
+    def _compact(self) -> CompactionReport:
+        start = perf_counter()
+        with self._write_lock, self.lock:
+            size_before = self.path.stat().st_size
+            self.db.close()
+            try:
+                records = compact_unqlite_file(str(self.path))
+            finally:
+                self.db.open()
+            size_after = self.path.stat().st_size
+
+        return CompactionReport(
+            records=records,
+            size_before=size_before,
+            size_after=size_after,
+            elapsed=perf_counter() - start,
+        )
+
+    async def compact(self) -> CompactionReport:
+        return await run_sync(self._compact)()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,287 @@
+"""
+消息存储的紧凑二进制编码
+
+    header: MAGIC(0xB1) VERSION FLAGS
+    body:   message_id group group_id real_id peer_id message_type time
+            sender.user_id ... sender.title sender.extra
+            raw_message message forward extra
+
+除 message_type 与 message 外的字段都编码为带类型标记的值，整数使用 zigzag varint，
+消息段类型与常见的数据键使用单字节标记。FLAGS 的 FLAG_ZLIB 位表示 body 经过 zlib 压缩。
+
+版本 1 没有 peer_id 字段。各版本的字段列表固定写在这里，不随依赖的模型变化；
+字段列表改变时需要增加 VERSION，并保留旧版本的列表用于解码。
+
+JSON 编码的旧记录以 "{" 开头，与 MAGIC 不冲突，可用 is_binary_record 区分。
+"""
+import json
+import zlib
+import struct
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from nonebot.utils import DataclassEncoder
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+if TYPE_CHECKING:
+    from .ob11_msg import T_OB11Msg
+
+MAGIC = 0xB1
+VERSION = 2
+FLAG_ZLIB = 0x01
+
+_T_NONE = 0
+_T_STR = 1
+_T_INT = 2
+_T_TRUE = 3
+_T_FALSE = 4
+_T_FLOAT = 5
+_T_JSON = 6
+
+_SEGMENT_TYPES = (
+    "text",
+    "at",
+    "face",
+    "image",
+    "video",
+    "record",
+    "reply",
+    "forward",
+    "node",
+    "json",
+    "xml",
+    "poke",
+    "music",
+    "share",
+    "location",
+)
+_SEGMENT_KEYS = (
+    "text",
+    "qq",
+    "name",
+    "id",
+    "file",
+    "url",
+    "cover",
+    "type",
+    "data",
+    "content",
+    "user_id",
+    "nickname",
+)
+# 0 号标记表示后面紧跟字符串形式的类型/键名
+_SEGMENT_TYPE_TAGS = {t: i + 1 for i, t in enumerate(_SEGMENT_TYPES)}
+_SEGMENT_KEY_TAGS = {k: i + 1 for i, k in enumerate(_SEGMENT_KEYS)}
+
+_MODEL_FIELDS = ("message_id", "group", "group_id", "real_id", "peer_id")
+_MODEL_FIELDS_V1 = _MODEL_FIELDS[:4]
+# 版本 1、2 的 sender 字段，Sender 新增的字段编码在 sender.extra 中
+_SENDER_FIELDS = (
+    "user_id",
+    "nickname",
+    "sex",
+    "age",
+    "card",
+    "area",
+    "level",
+    "role",
+    "title",
+)
+_MESSAGE_TYPES = ("group", "private")
+
+_MAGIC_PREFIX = bytes((MAGIC,))
+_float = struct.Struct("<d")
+
+
+class _Writer:
+    __slots__ = ("buf",)
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def varint(self, n: int):
+        buf = self.buf
+        while n > 0x7F:
+            buf.append((n & 0x7F) | 0x80)
+            n >>= 7
+        buf.append(n)
+
+    def str(self, s: str):
+        data = s.encode()
+        self.varint(len(data))
+        self.buf += data
+
+    def value(self, v: Any):
+        buf = self.buf
+        if v is None:
+            buf.append(_T_NONE)
+        elif v is True:
+            buf.append(_T_TRUE)
+        elif v is False:
+            buf.append(_T_FALSE)
+        elif isinstance(v, str):
+            buf.append(_T_STR)
+            self.str(v)
+        elif isinstance(v, int) and -(2**63) <= v < 2**63:
+            buf.append(_T_INT)
+            self.varint((v << 1) ^ (v >> 63))
+        elif isinstance(v, float):
+            buf.append(_T_FLOAT)
+            buf += _float.pack(v)
+        else:
+            buf.append(_T_JSON)
+            self.str(json.dumps(v, cls=DataclassEncoder))
+
+    def tagged(self, tags: Dict[str, int], s: str):
+        tag = tags.get(s)
+        if tag is None:
+            self.buf.append(0)
+            self.str(s)
+        else:
+            self.buf.append(tag)
+
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf: bytes):
+        self.buf = buf
+        self.pos = 0
+
+    def byte(self) -> int:
+        b = self.buf[self.pos]
+        self.pos += 1
+        return b
+
+    def varint(self) -> int:
+        buf = self.buf
+        pos = self.pos
+        n = 0
+        shift = 0
+        while True:
+            b = buf[pos]
+            pos += 1
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        self.pos = pos
+        return n
+
+    def str(self) -> str:
+        n = self.varint()
+        start = self.pos
+        self.pos += n
+        return self.buf[start : self.pos].decode()
+
+    def value(self) -> Any:
+        t = self.byte()
+        if t == _T_STR:
+            return self.str()
+        elif t == _T_INT:
+            n = self.varint()
+            return (n >> 1) ^ -(n & 1)
+        elif t == _T_NONE:
+            return None
+        elif t == _T_TRUE:
+            return True
+        elif t == _T_FALSE:
+            return False
+        elif t == _T_FLOAT:
+            (v,) = _float.unpack_from(self.buf, self.pos)
+            self.pos += _float.size
+            return v
+        elif t == _T_JSON:
+            return json.loads(self.str())
+        raise ValueError(f"unknown value tag {t}")
+
+    def tagged(self, names: Tuple[str, ...]) -> str:
+        tag = self.byte()
+        if tag == 0:
+            return self.str()
+        return names[tag - 1]
+
+
+def encode_binary(msg: "T_OB11Msg", compress_threshold: int = 1024) -> bytes:
+    w = _Writer()
+    for field in _MODEL_FIELDS:
+        w.value(getattr(msg, field))
+    w.buf.append(_MESSAGE_TYPES.index(msg.message_type))
+    w.value(msg.time)
+
+    sender = msg.sender
+    for field in _SENDER_FIELDS:
+        w.value(getattr(sender, field, None))
+    sender_extra = {k: v for k, v in sender.__dict__.items() if k not in _SENDER_FIELDS}
+    w.value(sender_extra or None)
+
+    w.value(msg.raw_message)
+
+    w.varint(len(msg.message))
+    for seg in msg.message:
+        w.tagged(_SEGMENT_TYPE_TAGS, seg.type)
+        w.varint(len(seg.data))
+        for key, value in seg.data.items():
+            w.tagged(_SEGMENT_KEY_TAGS, key)
+            w.value(value)
+
+    w.value(msg.forward)
+
+    w.value(msg.extra_fields() or None)
+
+    body = bytes(w.buf)
+    flags = 0
+    if 0 <= compress_threshold <= len(body):
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= FLAG_ZLIB
+    return bytes((MAGIC, VERSION, flags)) + body
+
+
+def decode_binary(value: bytes) -> Dict[str, Any]:
+    """解码二进制记录，返回 OB11MsgModel 的字段"""
+    version, flags = value[1], value[2]
+    if version not in (1, VERSION):
+        raise ValueError(f"unsupported record version {version}")
+    body = value[3:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    r = _Reader(body)
+    model_fields = _MODEL_FIELDS if version >= 2 else _MODEL_FIELDS_V1
+    fields: Dict[str, Any] = {field: r.value() for field in model_fields}
+    fields["message_type"] = _MESSAGE_TYPES[r.byte()]
+    fields["time"] = r.value()
+    sender = {field: r.value() for field in _SENDER_FIELDS}
+    sender_extra = r.value()
+    if sender_extra:
+        sender.update(sender_extra)
+    fields["sender"] = Sender.construct(**sender)
+    fields["raw_message"] = r.value()
+
+    segs: List[MessageSegment] = []
+    for _ in range(r.varint()):
+        seg_type = r.tagged(_SEGMENT_TYPES)
+        data = {}
+        for _ in range(r.varint()):
+            key = r.tagged(_SEGMENT_KEYS)
+            data[key] = r.value()
+        segs.append(MessageSegment(seg_type, data))
+    message = Message()
+    message.extend(segs)
+    fields["message"] = message
+
+    fields["forward"] = r.value()
+    extra = r.value()
+    if extra:
+        fields.update(extra)
+
+    return fields
+
+
+def is_binary_record(value: bytes) -> bool:
+    return value[:1] == _MAGIC_PREFIX
+
+
+__all__ = ("encode_binary", "decode_binary", "is_binary_record")
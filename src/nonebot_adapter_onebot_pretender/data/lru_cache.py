@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Tuple, Generic, TypeVar, Callable, Optional
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass
+class LRUCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+
+class LRUCache(Generic[K, V]):
+    """
+    同时受条目数与估算内存占用约束的 LRU 缓存，任一超限即淘汰最久未使用的条目。
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        max_memory: int,
+        sizeof: Callable[[V], int] = lambda _: 0,
+    ):
+        self.max_size = max_size
+        self.max_memory = max_memory
+        self._sizeof = sizeof
+
+        self._data: "OrderedDict[K, Tuple[V, int]]" = OrderedDict()
+        self._memory = 0
+        self.stats = LRUCacheStats()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    @property
+    def memory(self) -> int:
+        return self._memory
+
+    def get(self, key: K) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            self.stats.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return item[0]
+
+    def put(self, key: K, value: V):
+        if self.max_size <= 0:
+            return
+
+        size = self._sizeof(value)
+        if size > self.max_memory:
+            self.pop(key)
+            return
+
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._memory -= old[1]
+
+        self._data[key] = (value, size)
+        self._memory += size
+
+        while len(self._data) > self.max_size or self._memory > self.max_memory:
+            _, (_, evicted_size) = self._data.popitem(last=False)
+            self._memory -= evicted_size
+            self.stats.evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        item = self._data.pop(key, None)
+        if item is None:
+            return None
+        self._memory -= item[1]
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
+        self._memory = 0
@@ -0,0 +1,232 @@
+import os
+import asyncio
+import hashlib
+from pathlib import Path
+from threading import Lock
+from functools import partial
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Set, Dict, List, Tuple, Callable, Optional, AsyncIterator
+
+from nonebot.utils import run_sync
+from nonebot import logger, get_driver
+
+from ..config import conf
+from ..store import datastore
+
+_TMP_SUFFIX = ".tmp"
+
+
+@dataclass
+class MediaCacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    """未命中时等待其他请求获取同一媒体的次数"""
+    evictions: int = 0
+    fill_failed: int = 0
+
+
+class MediaCache:
+    """
+    按字节数限制总大小的磁盘 LRU 媒体缓存。
+
+    每个键对应目录下的一个文件，写入时先写临时文件再 os.replace，
+    读取方不会看到写了一半的文件。
+    文件的 mtime 记录最近使用时间，重启后据此恢复 LRU 顺序，
+    扫描目录在启动时于线程中进行（或在第一次访问时进行）。
+    get_or_fill 对同一个键同时只有一个获取任务，所有请求等待其结果；
+    任务独立于发起它的请求，请求被取消不影响其他等待的请求。
+    tee 则在转发数据的同时写入缓存，不需要等待获取完成。
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = MediaCacheStats()
+
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._inflight: Dict[str, "asyncio.Task[Path]"] = {}
+        self._writing: Set[str] = set()
+        self._loaded = False
+        self._load_lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    async def load(self):
+        """扫描缓存目录，恢复 LRU 顺序并删除上次退出时残留的临时文件"""
+        if self.enabled:
+            await run_sync(self._ensure_loaded)()
+
+    def _load(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(_TMP_SUFFIX):
+                # 上次退出时没有写完的临时文件
+                os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total += size
+        self._unlink(self._evict())
+
+    @staticmethod
+    def _name(key: Tuple) -> str:
+        return hashlib.sha1("\0".join(map(str, key)).encode()).hexdigest()
+
+    def get(self, key: Tuple) -> Optional[Path]:
+        self._ensure_loaded()
+        name = self._name(key)
+        if name not in self._index:
+            return None
+
+        path = self.root / name
+        try:
+            os.utime(path)
+        except OSError:
+            # 文件被外部删除
+            self._total -= self._index.pop(name)
+            return None
+        self._index.move_to_end(name)
+        return path
+
+    def lookup(self, key: Tuple) -> Optional[Path]:
+        """与 get 相同，并计入命中统计"""
+        path = self.get(key)
+        if path is not None:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+        return path
+
+    async def get_or_fill(
+        self, key: Tuple, fill: Callable[[], AsyncIterator[bytes]]
+    ) -> Path:
+        """
+        返回缓存文件的路径，未命中时用 fill 产生的数据填充缓存。
+        """
+        path = self.lookup(key)
+        if path is not None:
+            return path
+
+        name = self._name(key)
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.create_task(self._fill(name, fill))
+            task.add_done_callback(partial(self._fill_done, name))
+            self._inflight[name] = task
+        else:
+            self.stats.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _fill_done(self, name: str, task: "asyncio.Task[Path]"):
+        if self._inflight.get(name) is task:
+            del self._inflight[name]
+        # 没有请求等待时也取出异常，避免 "exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.fill_failed += 1
+
+    async def _fill(self, name: str, fill: Callable[[], AsyncIterator[bytes]]) -> Path:
+        async for _ in self._write(name, fill()):
+            pass
+        return self.root / name
+
+    def tee(self, key: Tuple, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        转发 chunks 的数据，同时写入缓存。
+
+        数据全部读完后才加入缓存，中途停止（如客户端断开）时丢弃写入的部分；
+        该键正在写入时只转发，不重复写入。
+        """
+        self._ensure_loaded()
+        name = self._name(key)
+        if name in self._writing:
+            return chunks
+        return self._write(name, chunks)
+
+    async def _write(
+        self, name: str, chunks: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        path = self.root / name
+        tmp_path = self.root / f"{name}.{os.getpid()}.{id(chunks)}{_TMP_SUFFIX}"
+
+        size = 0
+        done = False
+        f = await run_sync(open)(tmp_path, "wb")
+        self._writing.add(name)
+        try:
+            async for chunk in chunks:
+                await run_sync(f.write)(chunk)
+                size += len(chunk)
+                yield chunk
+            await run_sync(f.close)()
+            await run_sync(os.replace)(tmp_path, path)
+            done = True
+        finally:
+            self._writing.discard(name)
+            if not done:
+                f.close()
+                tmp_path.unlink(missing_ok=True)
+
+        old_size = self._index.pop(name, None)
+        if old_size is not None:
+            self._total -= old_size
+        self._index[name] = size
+        self._total += size
+        evicted = self._evict()
+        if evicted:
+            await run_sync(self._unlink)(evicted)
+
+    def _evict(self) -> List[str]:
+        # 保留最新的一个文件，即使它本身超出了限制
+        evicted = []
+        while self._total > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            self.stats.evictions += 1
+            evicted.append(name)
+        return evicted
+
+    def _unlink(self, names: List[str]):
+        for name in names:
+            try:
+                os.unlink(self.root / name)
+            except OSError as e:
+                logger.opt(exception=e).warning(f"Failed to evict media cache {name}")
+
+
+media_cache = MediaCache(
+    datastore.data_dir / "media_cache", conf.ob_pretender_media_cache_size
+)
+
+
+@get_driver().on_startup
+async def _load_media_cache():
+    await media_cache.load()
+
+
+__all__ = ("MediaCache", "MediaCacheStats", "media_cache")
@@ -0,0 +1,71 @@
+import asyncio
+from typing import List, Optional
+
+from nonebot.utils import run_sync
+from nonebot import logger, get_driver
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.data import msg_store
+from nonebot_adapter_onebot_pretender.data.backends import MsgRecord
+from nonebot_adapter_onebot_pretender.data.codec import is_binary_record
+from nonebot_adapter_onebot_pretender.data.retention import compact_ob11_msg_store
+from nonebot_adapter_onebot_pretender.data.ob11_msg import (
+    decode_ob11_msg,
+    encode_ob11_msg,
+)
+
+
+def _convert(records: List[MsgRecord]) -> List[MsgRecord]:
+    binary = conf.ob_pretender_store_encoding == "binary"
+    return [
+        r._replace(value=encode_ob11_msg(decode_ob11_msg(r.value)))
+        for r in records
+        if is_binary_record(r.value) != binary
+    ]
+
+
+async def migrate_ob11_msg_store(batch_size: int = 500) -> int:
+    """
+    将存储中的记录转换为 OB_PRETENDER_STORE_ENCODING 指定的编码，返回转换的条数。
+
+    逐批读取与写入，批与批之间让出事件循环，可在运行时进行。
+    """
+    total = 0
+    async for records in msg_store.iterate(batch_size):
+        converted = await run_sync(_convert)(records)
+        if converted:
+            await msg_store.put_many(converted)
+            total += len(converted)
+        await asyncio.sleep(0)
+
+    logger.info(
+        f"Migrated {total} OB11 Msg(s) to {conf.ob_pretender_store_encoding} encoding"
+    )
+    return total
+
+
+_migration: Optional[asyncio.Task] = None
+
+driver = get_driver()
+
+
+@driver.on_startup
+async def _start_migration():
+    """
+    启动时依次压缩存储、补全旧数据的索引，之后的访问不会再遇到需要长时间持有锁的维护；
+    编码转换则在后台进行
+    """
+    global _migration
+
+    if conf.ob_pretender_store_compact_on_startup:
+        await compact_ob11_msg_store()
+    await msg_store.prepare()
+
+    if conf.ob_pretender_store_migrate_on_startup:
+        _migration = asyncio.create_task(migrate_ob11_msg_store())
+
+
+@driver.on_shutdown
+async def _stop_migration():
+    if _migration is not None:
+        _migration.cancel()
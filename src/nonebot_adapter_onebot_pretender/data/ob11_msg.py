@@ -1,13 +1,23 @@
-from asyncio import create_task
-from typing import List, Literal, Optional
+import json
+from typing import Any, Dict, List, Tuple, Union, Literal, Iterable, Optional
 
-from nonebot import logger
 from pydantic import Field, BaseModel
-from nonebot.adapters.onebot.v11 import Message
+from nonebot import logger, get_driver
 from nonebot.adapters.onebot.v11.event import Sender
 from nonebot.utils import DataclassEncoder, run_sync
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
 
-from nonebot_adapter_onebot_pretender.data import db
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.data import msg_store
+from nonebot_adapter_onebot_pretender.data.backends import MsgRecord
+from nonebot_adapter_onebot_pretender.data.lru_cache import LRUCache
+from nonebot_adapter_onebot_pretender.trusted_model import construct_trusted
+from nonebot_adapter_onebot_pretender.data.write_queue import WriteBehindQueue
+from nonebot_adapter_onebot_pretender.data.codec import (
+    decode_binary,
+    encode_binary,
+    is_binary_record,
+)
 
 
 class OB11MsgModel(BaseModel):
@@ -21,28 +31,381 @@ class OB11MsgModel(BaseModel):
     message: Message = Field(default_factory=Message)
     raw_message: str = ""
     forward: Optional[List[dict]]
+    # 私聊消息的对方，仅用于索引，不在 API 中返回
+    peer_id: Optional[int]
 
     class Config:
         extra = "allow"
         json_encoders = {Message: DataclassEncoder}
 
+    def extra_fields(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k not in self.__fields__}
 
-@run_sync
-def load_ob11_msg(message_id: str) -> Optional[OB11MsgModel]:
+
+class OB11MsgRecord:
+    """
+    消息在内存中的紧凑表示，字段与 OB11MsgModel 相同，不经过 pydantic。
+
+    从存储读取的消息、bot 发出的消息与拉取的历史消息都以该类缓存，
+    只在需要 pydantic 模型时（如 JSON 编码）才通过 to_model 转换。
+    """
+
+    __slots__ = (
+        "message_id",
+        "group",
+        "group_id",
+        "real_id",
+        "message_type",
+        "sender",
+        "time",
+        "message",
+        "raw_message",
+        "forward",
+        "peer_id",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        *,
+        message_id: int,
+        message_type: Literal["group", "private"],
+        group: bool = False,
+        group_id: Optional[int] = None,
+        real_id: int = 0,
+        sender: Optional[Sender] = None,
+        time: int = 0,
+        message: Optional[Message] = None,
+        raw_message: str = "",
+        forward: Optional[List[dict]] = None,
+        peer_id: Optional[int] = None,
+        **extra: Any,
+    ):
+        self.message_id = message_id
+        self.group = group
+        self.group_id = group_id
+        self.real_id = real_id
+        self.message_type = message_type
+        self.sender = Sender.construct() if sender is None else sender
+        self.time = time
+        self.message = Message() if message is None else message
+        self.raw_message = raw_message
+        self.forward = forward
+        self.peer_id = peer_id
+        self.extra = extra
+
+    def __repr__(self) -> str:
+        return (
+            f"OB11MsgRecord(message_id={self.message_id!r},"
+            f" message_type={self.message_type!r}, time={self.time!r},"
+            f" message={self.message!r})"
+        )
+
+    def extra_fields(self) -> Dict[str, Any]:
+        return self.extra
+
+    def fields(self) -> Dict[str, Any]:
+        result = {name: getattr(self, name) for name in self.__slots__[:-1]}
+        result.update(self.extra)
+        return result
+
+    def to_model(self) -> OB11MsgModel:
+        return construct_trusted(OB11MsgModel, **self.fields())
+
+
+T_OB11Msg = Union[OB11MsgModel, OB11MsgRecord]
+
+
+def make_ob11_msg(**fields: Any) -> T_OB11Msg:
+    """
+    构造本插件产生的消息，字段需要已经是正确的类型；
+    开启 ob_pretender_strict_validation 时构造经过校验的 OB11MsgModel
+    """
+    if conf.ob_pretender_strict_validation:
+        return OB11MsgModel(**fields)
+    return OB11MsgRecord(**fields)
+
+
+def as_ob11_msg_model(message: T_OB11Msg) -> OB11MsgModel:
+    if isinstance(message, OB11MsgRecord):
+        return message.to_model()
+    return message
+
+
+def _construct_from_json(fields: Dict[str, Any]) -> Optional[T_OB11Msg]:
+    # 本插件以 OB11MsgModel.json() 写入的 JSON 记录，字段已经是正确的类型，跳过校验；
+    # 形状不符时返回 None，交给 pydantic 校验
+    message = fields.get("message")
+    sender = fields.get("sender")
+    if (
+        not isinstance(message, list)
+        or not isinstance(sender, dict)
+        or not isinstance(fields.get("message_id"), int)
+        or fields.get("message_type") not in ("group", "private")
+    ):
+        return None
     try:
-        msg = db[f"ob11_msg_{message_id}"]
-        msg = OB11MsgModel.parse_raw(msg, content_type="json")
-        return msg
-    except KeyError:
+        segs = [MessageSegment(seg["type"], seg["data"]) for seg in message]
+    except (TypeError, KeyError):
         return None
+    fields["message"] = Message()
+    fields["message"].extend(segs)
+    fields["sender"] = construct_trusted(Sender, **sender)
+    return make_ob11_msg(**fields)
+
+
+def decode_ob11_msg(value: bytes) -> T_OB11Msg:
+    if is_binary_record(value):
+        # 二进制记录只可能由本插件写入，跳过校验
+        return make_ob11_msg(**decode_binary(value))
+    fields = json.loads(value)
+    if isinstance(fields, dict):
+        msg = _construct_from_json(fields)
+        if msg is not None:
+            return msg
+    return OB11MsgModel.parse_obj(fields)
+
+
+def encode_ob11_msg(message: T_OB11Msg) -> bytes:
+    if conf.ob_pretender_store_encoding == "json":
+        return as_ob11_msg_model(message).json().encode()
+    return encode_binary(message, conf.ob_pretender_store_compress_threshold)
+
+
+def _copy_json(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return [_copy_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    return value
+
+
+def dump_ob11_msg(message: T_OB11Msg) -> Dict[str, Any]:
+    """
+    转换为 get_msg 等 API 返回的格式，
+    结果与 json.loads(message.json(exclude_none=True, exclude={"peer_id"})) 相同，
+    但直接由字段构造，不经过 JSON 序列化与解析。
+    """
+    if isinstance(message, OB11MsgRecord):
+        fields = message.fields()
+    else:
+        fields = message.__dict__
+
+    result = {}
+    for key, value in fields.items():
+        if value is None or key == "peer_id":
+            continue
+        if key == "message":
+            value = [{"type": seg.type, "data": _copy_json(seg.data)} for seg in value]
+        elif isinstance(value, BaseModel):
+            value = {
+                k: _copy_json(v) for k, v in value.__dict__.items() if v is not None
+            }
+        else:
+            value = _copy_json(value)
+        result[key] = value
+    return result
+
+
+def _encode_ob11_msg_record(message_id: str, message: T_OB11Msg) -> MsgRecord:
+    return MsgRecord(
+        message_id,
+        message.time,
+        encode_ob11_msg(message),
+        message.group_id if message.message_type == "group" else None,
+        message.peer_id if message.message_type == "private" else None,
+    )
+
+
+# 不超过该字节数的记录直接在事件循环中解码，解码比切换到线程池更快
+_INLINE_DECODE_SIZE = 4096
+
+
+def _estimate_ob11_msg_size(message: T_OB11Msg) -> int:
+    # 粗略估算，只统计字符串内容，足以约束缓存的总体内存占用
+    size = 512 + len(message.raw_message)
+    for seg in message.message:
+        size += 128
+        for value in seg.data.values():
+            if isinstance(value, str):
+                size += len(value)
+    return size
+
+
+_cache: LRUCache[str, T_OB11Msg] = LRUCache(
+    conf.ob_pretender_msg_cache_size,
+    conf.ob_pretender_msg_cache_memory,
+    _estimate_ob11_msg_size,
+)
+
+
+def peek_ob11_msg(message_id: str) -> Optional[T_OB11Msg]:
+    """只在内存中（消息缓存与待写入队列）查找，不读取存储"""
+    message_id = str(message_id)
+    msg = _cache.get(message_id)
+    if msg is None:
+        msg = _write_queue.get_pending(message_id)
+    return msg
+
+
+async def load_ob11_msg(message_id: str) -> Optional[T_OB11Msg]:
+    message_id = str(message_id)
+
+    msg = _cache.get(message_id)
+    if msg is not None:
+        return msg
+
+    msg = _write_queue.get_pending(message_id)
+    if msg is None:
+        value = await msg_store.get(message_id)
+        if value is not None:
+            if len(value) <= _INLINE_DECODE_SIZE:
+                msg = decode_ob11_msg(value)
+            else:
+                msg = await run_sync(decode_ob11_msg)(value)
+    if msg is not None:
+        _cache.put(message_id, msg)
+    return msg
+
+
+async def load_ob11_msgs(message_ids: Iterable[str]) -> Dict[str, T_OB11Msg]:
+    """批量读取消息，内存中未命中的消息在一次存储读取中取出，不存在的消息不在结果中"""
+    result: Dict[str, T_OB11Msg] = {}
+    missed = []
+    for message_id in dict.fromkeys(str(x) for x in message_ids):
+        msg = _cache.get(message_id)
+        if msg is None:
+            msg = _write_queue.get_pending(message_id)
+            if msg is None:
+                missed.append(message_id)
+                continue
+            _cache.put(message_id, msg)
+        result[message_id] = msg
+
+    if missed:
+        values = await msg_store.get_many(missed)
+        if values:
+            decoded = await run_sync(_decode_ob11_msgs)(list(values.values()))
+            for message_id, msg in zip(values, decoded):
+                _cache.put(message_id, msg)
+                result[message_id] = msg
+    return result
+
+
+async def _save_ob11_msgs(records: List[Tuple[str, MsgRecord]]):
+    await msg_store.put_many([record for _, record in records])
+    logger.debug(f"Saved {len(records)} OB11 Msg(s)")
+
+
+# 消息在入队时编码：无法编码的消息不会进入批次而阻塞之后的写入，
+# 入队后对消息对象的修改也不会影响写入的内容
+_write_queue: WriteBehindQueue[str, T_OB11Msg] = WriteBehindQueue(
+    _save_ob11_msgs,
+    batch_size=conf.ob_pretender_store_batch_size,
+    flush_interval=conf.ob_pretender_store_flush_interval_ms / 1000,
+    max_size=conf.ob_pretender_store_queue_size,
+    encode=_encode_ob11_msg_record,
+)
+
+
+def _decode_ob11_msgs(values: List[bytes]) -> List[T_OB11Msg]:
+    return [decode_ob11_msg(value) for value in values]
+
+
+async def load_ob11_msg_history(
+    *,
+    group_id: Optional[int] = None,
+    peer_id: Optional[int] = None,
+    before: Optional[T_OB11Msg] = None,
+    count: int = 20,
+) -> List[T_OB11Msg]:
+    """
+    按 (时间, 写入顺序) 从旧到新返回群聊或私聊会话中最近的 count 条消息。
+
+    指定 before 时返回该消息及其之前的消息。
+    """
+    if count <= 0:
+        return []
+
+    # 存储中的消息由后端按会话索引筛选，不再检查消息本身的字段，
+    # 旧版本保存的私聊消息没有 peer_id，但补全写入顺序时已按发送者建立了索引
+    records = await msg_store.scan(
+        group_id=group_id,
+        peer_id=peer_id,
+        before=(before.time, str(before.message_id)) if before is not None else None,
+        limit=count,
+        reverse=True,
+    )
+    stored_ids = {record.message_id for record in records}
+
+    def is_pending_in_range(msg: T_OB11Msg) -> bool:
+        if group_id is not None and (
+            msg.message_type != "group" or msg.group_id != group_id
+        ):
+            return False
+        if peer_id is not None and (
+            msg.message_type != "private" or msg.peer_id != peer_id
+        ):
+            return False
+        return before is None or msg.time <= before.time
+
+    # 尚未写入的消息在写入顺序上晚于存储中的所有消息
+    pending = []
+    for msg in _write_queue.pending_values():
+        message_id = str(msg.message_id)
+        if before is not None and message_id == str(before.message_id):
+            pending.append(msg)
+            break
+        if message_id not in stored_ids and is_pending_in_range(msg):
+            pending.append(msg)
+    if before is not None and str(before.message_id) in stored_ids:
+        # before 已写入存储时，同一秒内尚未写入的消息都在其之后
+        pending = [msg for msg in pending if msg.time < before.time]
+
+    messages: Dict[str, T_OB11Msg] = {}
+    missed = []
+    for record in reversed(records):
+        msg = _write_queue.get_pending(record.message_id) or _cache.get(
+            record.message_id
+        )
+        if msg is None:
+            missed.append(record)
+        messages[record.message_id] = msg
+    if missed:
+        decoded = await run_sync(_decode_ob11_msgs)([r.value for r in missed])
+        for record, msg in zip(missed, decoded):
+            messages[record.message_id] = msg
+    for msg in pending:
+        messages[str(msg.message_id)] = msg
+
+    # 排序是稳定的，同一秒内保持写入顺序
+    result = sorted(messages.values(), key=lambda msg: msg.time)
+    return result[-count:]
+
+
+async def save_ob11_msg(message_id: str, message: T_OB11Msg):
+    message_id = str(message_id)
+    _cache.put(message_id, message)
+    await _write_queue.put(message_id, message)
+
+
+async def save_ob11_msgs(messages: List[Tuple[str, T_OB11Msg]]):
+    """批量保存消息"""
+    messages = [(str(message_id), message) for message_id, message in messages]
+    for message_id, message in messages:
+        _cache.put(message_id, message)
+    await _write_queue.put_many(messages)
+
+
+def get_ob11_msg_write_queue() -> WriteBehindQueue[str, T_OB11Msg]:
+    return _write_queue
 
 
-@run_sync
-@logger.catch
-def _do_save_ob11_msg(message_id: str, message: OB11MsgModel):
-    db[f"ob11_msg_{message_id}"] = message.json()
-    logger.debug(f"Saved OB11 Msg: {message.dict()}")
+def get_ob11_msg_cache() -> LRUCache[str, T_OB11Msg]:
+    return _cache
 
 
-def save_ob11_msg(message_id: str, message: OB11MsgModel):
-    create_task(_do_save_ob11_msg(message_id, message))
+@get_driver().on_shutdown
+async def _flush_ob11_msg_write_queue():
+    await _write_queue.close()
+    msg_store.close()
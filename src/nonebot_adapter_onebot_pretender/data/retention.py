@@ -0,0 +1,90 @@
+import asyncio
+from typing import Optional
+
+from nonebot import logger, get_driver
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.data import msg_store
+from nonebot_adapter_onebot_pretender.data.backends import CompactionReport
+from nonebot_adapter_onebot_pretender.data.ob11_msg import get_ob11_msg_cache
+
+
+async def expire_ob11_msgs(
+    max_age: Optional[float] = None,
+    max_count: Optional[int] = None,
+    batch_size: int = 500,
+) -> int:
+    """
+    删除超过保留期限或超出保留条数的消息，返回删除的条数。
+
+    每批最多删除 batch_size 条，批与批之间让出事件循环。
+    """
+    if max_age is None and max_count is None:
+        return 0
+
+    cache = get_ob11_msg_cache()
+    total = 0
+    while True:
+        expired = await msg_store.expire(max_age, max_count, batch_size)
+        for message_id in expired:
+            cache.pop(message_id)
+        total += len(expired)
+        if len(expired) < batch_size:
+            break
+        await asyncio.sleep(0)
+
+    if total > 0:
+        logger.info(f"Expired {total} OB11 Msg(s)")
+    return total
+
+
+async def compact_ob11_msg_store() -> CompactionReport:
+    """
+    压缩消息存储，期间对存储的读写会等待压缩完成。
+
+    OB_PRETENDER_STORE_COMPACT_ON_STARTUP 开启时由 migrate 在启动时进行。
+    """
+    report = await msg_store.compact()
+    logger.info(
+        f"Compacted OB11 Msg store: {report.records} record(s), "
+        f"{report.reclaimed} byte(s) reclaimed in {report.elapsed:.2f}s"
+    )
+    return report
+
+
+def _get_max_age() -> Optional[float]:
+    if conf.ob_pretender_msg_max_age_days is None:
+        return None
+    return conf.ob_pretender_msg_max_age_days * 24 * 60 * 60
+
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(conf.ob_pretender_msg_sweep_interval)
+        try:
+            await expire_ob11_msgs(
+                _get_max_age(),
+                conf.ob_pretender_msg_max_count,
+                conf.ob_pretender_msg_sweep_batch_size,
+            )
+        except Exception as e:
+            logger.opt(exception=e).error("Failed to expire OB11 Msg(s)")
+
+
+_sweeper: Optional[asyncio.Task] = None
+
+driver = get_driver()
+
+
+@driver.on_startup
+async def _start_sweeper():
+    global _sweeper
+
+    if _get_max_age() is not None or conf.ob_pretender_msg_max_count is not None:
+        _sweeper = asyncio.create_task(_sweep_forever())
+
+
+@driver.on_shutdown
+async def _stop_sweeper():
+    if _sweeper is not None:
+        _sweeper.cancel()
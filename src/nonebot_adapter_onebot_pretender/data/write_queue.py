@@ -0,0 +1,250 @@
+import asyncio
+from time import perf_counter
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+    Generic,
+    TypeVar,
+    Callable,
+    Iterable,
+    Optional,
+    Awaitable,
+)
+
+from nonebot import logger
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_STOP = object()
+
+# 事务失败后重试的等待时间（秒），每次失败翻倍
+_RETRY_INITIAL_DELAY = 0.5
+_RETRY_MAX_DELAY = 30.0
+# 失败的批次最多重试的次数，之后丢弃该批次，避免写者停滞导致队列占满
+_MAX_RETRIES = 5
+# 停止写者时失败的批次最多再重试的次数
+_CLOSE_RETRIES = 3
+
+
+@dataclass
+class WriteQueueStats:
+    enqueued: int = 0
+    committed: int = 0
+    commits: int = 0
+    failed: int = 0
+    """写入失败的记录数（包括之后重试成功的）"""
+    retries: int = 0
+    rejected: int = 0
+    """无法编码、没有入队的记录数"""
+    dropped: int = 0
+    """重试次数用尽后丢弃的记录数"""
+    unsaved: int = 0
+    """停止时仍未能写入、只保留在内存中的记录数"""
+    last_commit_latency: float = 0.0
+    max_commit_latency: float = 0.0
+    total_commit_latency: float = 0.0
+
+    @property
+    def avg_commit_latency(self) -> float:
+        if self.commits == 0:
+            return 0.0
+        return self.total_commit_latency / self.commits
+
+
+class WriteBehindQueue(Generic[K, V]):
+    """
+    单写者的后写队列：调用方入队后立即返回，由唯一的写者协程每攒够 batch_size 条
+    或每隔 flush_interval 秒将积压的记录交给 commit 在一个事务内写入。
+
+    指定 encode 时，记录在入队时由 encode(key, value) 编码，commit 收到的是编码结果；
+    无法编码的记录在入队时记录日志后丢弃，不会进入批次。
+
+    队列满时 put 会等待（背压）；尚未落盘的记录可通过 get_pending 读取。
+    写入失败的批次保留在 pending 中，按指数退避最多重试 _MAX_RETRIES 次，
+    仍失败则记录日志后丢弃；
+    停止时最多再重试 _CLOSE_RETRIES 次，仍失败的记录留在 pending 中。
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[List[Tuple[K, Any]]], Awaitable[None]],
+        *,
+        batch_size: int,
+        flush_interval: float,
+        max_size: int,
+        encode: Optional[Callable[[K, V], Any]] = None,
+    ):
+        self._commit = commit
+        self._encode = encode
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = max(flush_interval, 0.0)
+        self.max_size = max(max_size, 1)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._pending: Dict[K, V] = {}
+        self.stats = WriteQueueStats()
+
+    @property
+    def depth(self) -> int:
+        return 0 if self._queue is None else self._queue.qsize()
+
+    def get_pending(self, key: K) -> Optional[V]:
+        return self._pending.get(key)
+
+    def pending_values(self) -> List[V]:
+        return list(self._pending.values())
+
+    def _ensure_writer(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_size)
+            self._batch_ready = asyncio.Event()
+            self._closing = asyncio.Event()
+        if self._writer is None or self._writer.done():
+            self._closing.clear()
+            self._writer = asyncio.create_task(self._run())
+        return self._queue
+
+    def _prepare(self, items: Iterable[Tuple[K, V]]) -> List[Tuple[K, V, Any]]:
+        """编码记录，无法编码的记录记录日志后丢弃"""
+        if self._encode is None:
+            return [(key, value, value) for key, value in items]
+
+        result = []
+        for key, value in items:
+            try:
+                result.append((key, value, self._encode(key, value)))
+            except Exception as e:
+                self.stats.rejected += 1
+                logger.opt(exception=e).error(
+                    f"Failed to encode record {key}, it is not saved"
+                )
+        return result
+
+    async def put(self, key: K, value: V):
+        await self.put_many([(key, value)])
+
+    async def put_many(self, items: List[Tuple[K, V]]):
+        """一次入队多条记录，它们会按 batch_size 合并到尽量少的事务中写入"""
+        prepared = self._prepare(items)
+        if not prepared:
+            return
+        queue = self._ensure_writer()
+        for key, value, _ in prepared:
+            self._pending[key] = value
+        self.stats.enqueued += len(prepared)
+        for item in prepared:
+            await queue.put(item)
+            if queue.qsize() + 1 >= self.batch_size:
+                self._batch_ready.set()
+
+    async def _collect(
+        self, queue: asyncio.Queue
+    ) -> Tuple[List[Tuple[K, V, Any]], bool]:
+        batch = []
+        item = await queue.get()
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+
+        if queue.qsize() + 1 < self.batch_size:
+            # 等到攒够一批或超时，期间不从队列取出元素，避免取消时丢失
+            self._batch_ready.clear()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        while len(batch) < self.batch_size:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _discard_pending(self, batch: List[Tuple[K, V, Any]]):
+        for key, value, _ in batch:
+            if self._pending.get(key) is value:
+                del self._pending[key]
+
+    async def _flush(self, batch: List[Tuple[K, V, Any]]) -> bool:
+        start = perf_counter()
+        try:
+            await self._commit([(key, encoded) for key, _, encoded in batch])
+        except Exception as e:
+            self.stats.failed += len(batch)
+            logger.opt(exception=e).error(f"Failed to commit {len(batch)} records")
+            return False
+        else:
+            self.stats.committed += len(batch)
+            self._discard_pending(batch)
+            return True
+        finally:
+            latency = perf_counter() - start
+            self.stats.commits += 1
+            self.stats.last_commit_latency = latency
+            self.stats.total_commit_latency += latency
+            self.stats.max_commit_latency = max(self.stats.max_commit_latency, latency)
+
+    async def _flush_with_retry(self, batch: List[Tuple[K, V, Any]]):
+        delay = _RETRY_INITIAL_DELAY
+        retries = close_retries = 0
+        while not await self._flush(batch):
+            if self._closing.is_set():
+                if close_retries >= _CLOSE_RETRIES:
+                    self.stats.unsaved += len(batch)
+                    logger.error(
+                        f"Gave up committing {len(batch)} records on close, "
+                        "they are kept in memory only"
+                    )
+                    return
+                close_retries += 1
+                delay = min(delay, _RETRY_INITIAL_DELAY)
+            elif retries >= _MAX_RETRIES:
+                self.stats.dropped += len(batch)
+                self._discard_pending(batch)
+                logger.error(
+                    f"Gave up committing {len(batch)} records after {retries} retries, "
+                    "they are dropped"
+                )
+                return
+            retries += 1
+
+            self.stats.retries += 1
+            logger.warning(f"Retrying commit of {len(batch)} records in {delay}s")
+            if self._closing.is_set():
+                await asyncio.sleep(delay)
+            else:
+                # 停止时不再等待完整的退避时间
+                try:
+                    await asyncio.wait_for(self._closing.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            delay = min(delay * 2, _RETRY_MAX_DELAY)
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch, stop = await self._collect(queue)
+            if batch:
+                await self._flush_with_retry(batch)
+            if stop:
+                return
+
+    async def close(self):
+        """将队列中剩余的记录全部写入后停止写者"""
+        if self._writer is None or self._writer.done():
+            return
+        self._closing.set()
+        await self._queue.put(_STOP)
+        self._batch_ready.set()
+        await self._writer
@@ -1,16 +1,20 @@
 from functools import wraps
-from typing import TYPE_CHECKING, List, Callable, Optional, Awaitable
+from typing import TYPE_CHECKING, Dict, List, Tuple, Callable, Optional, Awaitable
 
 from nonebot import message
 
 if TYPE_CHECKING:
     from nonebot import Bot
+    from nonebot.adapters import Adapter
     from nonebot.internal.adapter import Event
 
     T_EventHandler = Callable[[Bot, Event], Awaitable[bool]]
+    T_EventRoute = Callable[[Bot, Event], Awaitable[None]]
 
 _origin_handle_event: Optional[Callable[["Bot", "Event"], Awaitable[None]]] = None
 _event_handler: List["T_EventHandler"] = []
+# (实际协议适配器, bot self_id) -> 处理该 bot 事件的函数，在 bot 连接/断开时维护
+_event_routes: Dict[Tuple["Adapter", str], "T_EventRoute"] = {}
 
 
 async def origin_handle_event(bot: "Bot", event: "Event") -> None:
@@ -18,16 +22,35 @@ async def origin_handle_event(bot: "Bot", event: "Event") -> None:
 
 
 def patch_event_handle(handler: "T_EventHandler") -> "T_EventHandler":
+    """
+    注册依次尝试的事件处理函数，返回 True 表示事件已被处理。
+
+    每个事件都要逐个调用，只适合数量很少的处理函数；
+    按 bot 分派的场合使用 add_event_route。
+    """
     _event_handler.append(handler)
     return handler
 
 
+def add_event_route(adapter: "Adapter", self_id: str, route: "T_EventRoute"):
+    """将 adapter 下 self_id 对应的 bot 的事件交由 route 处理"""
+    _event_routes[(adapter, self_id)] = route
+
+
+def remove_event_route(adapter: "Adapter", self_id: str):
+    _event_routes.pop((adapter, self_id), None)
+
+
 def init_patch_handle_event():
     global _origin_handle_event
     _origin_handle_event = message.handle_event
 
     @wraps(_origin_handle_event)
     async def handle_event(bot: "Bot", event: "Event") -> None:
+        route = _event_routes.get((bot.adapter, bot.self_id))
+        if route is not None:
+            await route(bot, event)
+            return
         for handler in _event_handler:
             if await handler(bot, event):
                 return
@@ -36,4 +59,10 @@ def init_patch_handle_event():
     message.handle_event = handle_event
 
 
-__all__ = ("patch_event_handle", "origin_handle_event", "init_patch_handle_event")
+__all__ = (
+    "patch_event_handle",
+    "add_event_route",
+    "remove_event_route",
+    "origin_handle_event",
+    "init_patch_handle_event",
+)
@@ -0,0 +1,21 @@
+from typing import Any, Type, TypeVar
+
+from pydantic import BaseModel
+
+from .config import conf
+
+T_Model = TypeVar("T_Model", bound=BaseModel)
+
+
+def construct_trusted(model: Type[T_Model], **values: Any) -> T_Model:
+    """
+    构造由本插件产生、字段类型已经正确的模型，跳过 pydantic 校验。
+
+    开启 ob_pretender_strict_validation 时正常校验，用于排查字段类型的错误。
+    """
+    if conf.ob_pretender_strict_validation:
+        return model(**values)
+    return model.construct(**values)
+
+
+__all__ = ("construct_trusted",)
@@ -10,7 +10,12 @@ from nonebot.adapters import Adapter as BaseAdapter
 from nonebot.adapters.onebot.v11 import Bot as OB11Bot
 from nonebot.adapters.onebot.v11 import Adapter as OB11Adapter
 
-from ..patch_handle_event import patch_event_handle, origin_handle_event
+from .api_cache import api_cache
+from ..patch_handle_event import (
+    add_event_route,
+    remove_event_route,
+    origin_handle_event,
+)
 
 if TYPE_CHECKING:
     from .pretender import OB11Pretender
@@ -27,22 +32,21 @@ class Adapter(OB11Adapter, Generic[T_ActualAdapter, T_ActualBot], ABC):
         self.actual_adapter = self._create_actual_adapter_with_hack(driver, **kwargs)
 
     def _setup(self) -> None:
-        @patch_event_handle
-        async def handle_event(bot: BaseBot, event: BaseEvent) -> bool:
-            if bot.self_id in self.actual_adapter.bots:
-                handled_event = await self.pretender.handle_event(bot, event)
-                if handled_event is None:
-                    self.pretender.log(
-                        "WARNING",
-                        f"No event handler for {type(event).__name__} "
-                        f"({self.actual_adapter.get_name()}) found, "
-                        f"event was ignored",
-                    )
-                else:
-                    await origin_handle_event(self.bots[bot.self_id], handled_event)
-                return True
-            else:
-                return False
+        # 不启动 OneBot V11 的连接服务，
+        # 事件由 bot 连接时注册的路由转交给 _handle_actual_event
+        pass
+
+    async def _handle_actual_event(self, bot: BaseBot, event: BaseEvent) -> None:
+        handled_event = await self.pretender.handle_event(bot, event)
+        if handled_event is None:
+            self.pretender.log(
+                "WARNING",
+                f"No event handler for {type(event).__name__} "
+                f"({self.actual_adapter.get_name()}) found, "
+                f"event was ignored",
+            )
+        else:
+            await origin_handle_event(self.bots[bot.self_id], handled_event)
 
     @classmethod
     @abstractmethod
@@ -62,10 +66,15 @@ class Adapter(OB11Adapter, Generic[T_ActualAdapter, T_ActualBot], ABC):
         def bot_connect(bot: T_ActualBot) -> None:
             ob11bot = OB11Bot(pretender_adapter, bot.self_id)
             pretender_adapter.bot_connect(ob11bot)
+            add_event_route(
+                bot.adapter, bot.self_id, pretender_adapter._handle_actual_event
+            )
 
         hacky_driver._bot_connect = bot_connect
 
         def bot_disconnect(bot: T_ActualBot) -> None:
+            remove_event_route(bot.adapter, bot.self_id)
+            api_cache.invalidate(self_id=bot.self_id)
             pretender_bot = pretender_adapter.bots.get(bot.self_id)
             assert (
                 pretender_bot is not None
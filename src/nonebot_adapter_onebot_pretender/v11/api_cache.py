@@ -0,0 +1,160 @@
+import asyncio
+from time import monotonic
+from functools import wraps
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Any, Dict, Tuple, Callable, Optional, Awaitable
+
+from ..config import conf
+
+_Key = Tuple[str, str, Tuple]
+
+_MAX_ENTRIES = 1024
+
+
+@dataclass
+class ApiCacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    """未命中时等待相同参数的进行中调用的次数"""
+    invalidated: int = 0
+
+
+def _copy_result(value: Any) -> Any:
+    # API 的返回值是 JSON 形式的 list/dict，调用方可能修改它，返回缓存时复制一份
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy_result(v) for k, v in value.items()}
+    return value
+
+
+class ApiCache:
+    """
+    api_call_handler 的结果缓存。
+
+    以 (API, bot, 参数) 为键，条目在该 API 的 TTL 后过期；
+    相同参数的调用正在进行时，其余调用等待其结果而不再请求协议端。
+    ttl_overrides 按 API 名覆盖 cached_api 指定的 TTL，TTL 不大于 0 表示不缓存。
+    """
+
+    def __init__(self, ttl_overrides: Dict[str, float], max_entries: int):
+        self.ttl_overrides = ttl_overrides
+        self.max_entries = max_entries
+        self.stats: Dict[str, ApiCacheStats] = {}
+
+        self._data: "OrderedDict[_Key, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[_Key, "asyncio.Future[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_ttl(self, api: str, default: float) -> float:
+        return self.ttl_overrides.get(api, default)
+
+    def _stats(self, api: str) -> ApiCacheStats:
+        stats = self.stats.get(api)
+        if stats is None:
+            stats = self.stats[api] = ApiCacheStats()
+        return stats
+
+    async def call(
+        self,
+        api: str,
+        self_id: str,
+        data: Dict[str, Any],
+        ttl: float,
+        func: Callable[[], Awaitable[Any]],
+        *,
+        refresh: bool = False,
+    ) -> Any:
+        ttl = self.get_ttl(api, ttl)
+        try:
+            key = (api, self_id, tuple(sorted(data.items())))
+            hash(key)
+        except TypeError:
+            # 参数不可哈希，不缓存
+            return await func()
+        if ttl <= 0:
+            return await func()
+
+        stats = self._stats(api)
+        if not refresh:
+            item = self._data.get(key)
+            if item is not None:
+                value, expire_at = item
+                if expire_at > monotonic():
+                    self._data.move_to_end(key)
+                    stats.hits += 1
+                    return _copy_result(value)
+                del self._data[key]
+        stats.misses += 1
+
+        future = self._inflight.get(key)
+        if future is not None:
+            stats.coalesced += 1
+            return _copy_result(await asyncio.shield(future))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            self._data[key] = (value, monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            future.set_result(value)
+            return _copy_result(value)
+        finally:
+            del self._inflight[key]
+
+    def invalidate(self, api: Optional[str] = None, self_id: Optional[str] = None):
+        """作废指定 API 和/或 bot 的缓存，都不指定时作废全部缓存"""
+        for key in list(self._data):
+            if api is not None and key[0] != api:
+                continue
+            if self_id is None or key[1] == self_id:
+                del self._data[key]
+                self._stats(key[0]).invalidated += 1
+
+
+api_cache = ApiCache(conf.ob_pretender_api_cache_ttl, _MAX_ENTRIES)
+
+
+def cached_api(ttl: float, api: Optional[str] = None):
+    """
+    缓存 api_call_handler 的结果，需要放在 api_call_handler 之下。
+
+    api 为缓存使用的 API 名，默认为函数名；
+    调用时传入 no_cache=True 可以跳过缓存重新请求。
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        name = api or func.__name__
+
+        @wraps(func)
+        async def wrapper(self, bot, *, no_cache: bool = False, **data: Any):
+            return await api_cache.call(
+                name,
+                bot.self_id,
+                data,
+                ttl,
+                lambda: func(self, bot, **data),
+                refresh=no_cache,
+            )
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = ("ApiCache", "ApiCacheStats", "api_cache", "cached_api")
@@ -0,0 +1,135 @@
+from time import perf_counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Callable, Iterable, Optional
+
+from nonebot.adapters import MessageSegment
+
+if TYPE_CHECKING:
+    from .pretender import OB11Pretender
+
+T_SegmentConverter = Callable[..., Optional[MessageSegment]]
+
+
+@dataclass
+class SegmentConverterStats:
+    count: int = 0
+    elapsed: float = 0.0
+    """累计耗时（秒），仅在开启计时时记录"""
+
+    @property
+    def average(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.elapsed / self.count
+
+
+class SegmentConverterRegistry:
+    """
+    按消息段类型查找转换函数的注册表。
+
+    转换函数的签名为 (pretender, *args, seg) -> Optional[MessageSegment]，
+    返回 None 表示无法转换该消息段。
+
+    每种类型总是记录调用次数；timing 为 True 时还记录累计耗时。
+    """
+
+    def __init__(self, timing: bool = False):
+        self.timing = timing
+        # 转换函数与其统计放在一起，转换时只需查找一次
+        self._entries: Dict[str, Tuple[T_SegmentConverter, SegmentConverterStats]] = {}
+        self.unsupported: Dict[str, int] = {}
+
+    def __contains__(self, seg_type: str) -> bool:
+        return seg_type in self._entries
+
+    @property
+    def converters(self) -> Dict[str, T_SegmentConverter]:
+        return {seg_type: entry[0] for seg_type, entry in self._entries.items()}
+
+    @property
+    def stats(self) -> Dict[str, SegmentConverterStats]:
+        return {seg_type: entry[1] for seg_type, entry in self._entries.items()}
+
+    def register(self, seg_type: str, converter: Optional[T_SegmentConverter] = None):
+        """
+        注册 seg_type 的转换函数，覆盖已有的注册。不传入 converter 时作为装饰器使用。
+        """
+        if converter is None:
+
+            def decorator(func: T_SegmentConverter) -> T_SegmentConverter:
+                self.register(seg_type, func)
+                return func
+
+            return decorator
+
+        old = self._entries.get(seg_type)
+        self._entries[seg_type] = (
+            converter,
+            old[1] if old is not None else SegmentConverterStats(),
+        )
+        return converter
+
+    def unregister(self, seg_type: str):
+        self._entries.pop(seg_type, None)
+
+    def convert(
+        self, pretender: "OB11Pretender", seg: MessageSegment, *args: Any
+    ) -> Optional[MessageSegment]:
+        return self.convert_many(pretender, (seg,), *args)[0][1]
+
+    def convert_many(
+        self, pretender: "OB11Pretender", segs: Iterable[MessageSegment], *args: Any
+    ) -> List[Tuple[MessageSegment, Optional[MessageSegment]]]:
+        """
+        依次转换 segs，返回 (原消息段, 转换结果) 的列表
+        """
+        entries = self._entries
+        timing = self.timing
+        result = []
+        for seg in segs:
+            entry = entries.get(seg.type)
+            converted = None
+            if entry is not None:
+                converter, stats = entry
+                if timing:
+                    start = perf_counter()
+                    converted = converter(pretender, *args, seg)
+                    stats.elapsed += perf_counter() - start
+                else:
+                    converted = converter(pretender, *args, seg)
+                stats.count += 1
+
+            if converted is None:
+                self.unsupported[seg.type] = self.unsupported.get(seg.type, 0) + 1
+            result.append((seg, converted))
+        return result
+
+
+def outgoing_segment_converter(*seg_types: str):
+    """将方法注册为 OB11 消息段到实际协议消息段的转换函数"""
+
+    def decorator(func: T_SegmentConverter) -> T_SegmentConverter:
+        func.__outgoing_segment_types__ = seg_types
+
+        return func
+
+    return decorator
+
+
+def incoming_segment_converter(*seg_types: str):
+    """将方法注册为实际协议消息段到 OB11 消息段的转换函数"""
+
+    def decorator(func: T_SegmentConverter) -> T_SegmentConverter:
+        func.__incoming_segment_types__ = seg_types
+
+        return func
+
+    return decorator
+
+
+__all__ = (
+    "SegmentConverterStats",
+    "SegmentConverterRegistry",
+    "outgoing_segment_converter",
+    "incoming_segment_converter",
+)
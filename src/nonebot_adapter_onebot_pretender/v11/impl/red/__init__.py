@@ -1,31 +1,75 @@
-import json
-from base64 import b64decode
-from datetime import datetime
+import asyncio
+from io import BytesIO
 from pathlib import Path
-from typing import Dict, List, Type, Union, Optional
-from urllib.parse import urlencode, urlunsplit
+from copy import deepcopy
+from datetime import datetime
+from functools import cached_property
+from urllib.parse import quote, urlunsplit
+from typing import Any, Dict, List, Type, Tuple, Union, Callable, Iterable, Optional
 
-from nonebot.adapters.onebot.v11 import ActionFailed
-from nonebot.adapters.onebot.v11 import Message as OB11Msg
-from nonebot.adapters.onebot.v11 import MessageSegment as OB11MS
-from nonebot.adapters.onebot.v11 import event as ob11_event
-from nonebot.adapters.onebot.v11.event import Reply, Sender
-from nonebot.adapters.red import Adapter as RedAdapter
 from nonebot.adapters.red import Bot as RedBot
+from nonebot.adapters.red.api.model import Member
 from nonebot.adapters.red import Message as RedMsg
-from nonebot.adapters.red import MessageSegment as RedMS
 from nonebot.adapters.red import event as red_event
 from nonebot.adapters.red.api.model import ChatType
+from nonebot.adapters.onebot.v11 import ActionFailed
+from nonebot.utils import escape_tag, logger_wrapper
+from nonebot.adapters.red import Adapter as RedAdapter
+from nonebot.adapters.red import MessageSegment as RedMS
+from nonebot.adapters.onebot.v11 import Message as OB11Msg
+from nonebot.adapters.onebot.v11 import event as ob11_event
+from nonebot.adapters.onebot.v11.event import Reply, Sender
+from nonebot.adapters.onebot.v11 import MessageSegment as OB11MS
+from nonebot.adapters.red.api.model import Message as MessageModel
 from nonebot.adapters.red.message import ForwardNode, MediaMessageSegment
-from nonebot.utils import DataclassEncoder, logger_wrapper
 
-from ...factory import register_ob11_pretender
-from ...pretender import OB11Pretender, event_handler, api_call_handler
-from ....data.ob11_msg import OB11MsgModel, load_ob11_msg, save_ob11_msg
+from ....config import conf
+from .media import BASE64_PREFIX
+from .reply import ReplyResolver
+from ....data.lru_cache import LRUCache
+from .members import iter_group_members
 from ....webapi import red  # noqa: F401
+from ...api_cache import api_cache, cached_api
+from ...factory import register_ob11_pretender
+from ....trusted_model import construct_trusted
+from ....data import migrate, retention  # noqa: F401
+from ...send_scheduler import T_Priority, send_scheduler
+from .member_cache import member_role, member_user_id, group_member_cache
+from ...converter import incoming_segment_converter, outgoing_segment_converter
+from ...pretender import (
+    OB11Pretender,
+    event_handler,
+    api_call_handler,
+    is_log_level_enabled,
+)
+from .upload_cache import (
+    CachedMediaMessageSegment,
+    release_media,
+    send_with_media,
+    invalidate_cached_uploads,
+)
+from ....data.ob11_msg import (
+    T_OB11Msg,
+    dump_ob11_msg,
+    load_ob11_msg,
+    make_ob11_msg,
+    peek_ob11_msg,
+    save_ob11_msg,
+    load_ob11_msgs,
+    save_ob11_msgs,
+    load_ob11_msg_history,
+)
 
 log = logger_wrapper("OneBot V11 Pretender (RedProtocol)")
 
+# 保留的未在派发前解析完成的回复条数
+_PENDING_REPLY_CACHE_SIZE = 1024
+
+
+def _quote(value) -> str:
+    value = str(value)
+    return value if value.isdigit() else quote(value, safe="")
+
 
 @register_ob11_pretender(RedAdapter)
 class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
@@ -34,143 +78,381 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
         return RedAdapter
 
     @classmethod
-    def log(cls, level: str, content: str, exc: Optional[BaseException] = None):
+    def log(
+        cls,
+        level: str,
+        content: Union[str, Callable[[], str]],
+        exc: Optional[BaseException] = None,
+    ):
+        if callable(content):
+            if not is_log_level_enabled(level):
+                return
+            # 延迟生成的内容通常是事件、消息的 repr，不应被当作颜色标签解析
+            content = escape_tag(content())
         log(level, content, exc)
 
-    def construct_media_url(self, bot_self_id: str, seg: MediaMessageSegment) -> str:
-        parameters = {
-            "botId": bot_self_id,
-            "msgId": seg.data["_msg_id"],
-            "chatType": seg.data["_chat_type"],
-            "target": seg.data["_peer_uin"],
-            "elementId": seg.data["id"],
-            "thumbSize": 0,
-            "downloadType": 2,
-        }
-        query = urlencode(query=parameters, doseq=True)
-        url = urlunsplit(
+    @cached_property
+    def reply_resolver(self) -> ReplyResolver:
+        return ReplyResolver(
+            self._fetch_history_msgs, conf.ob_pretender_reply_history_count
+        )
+
+    async def _fetch_history_msgs(
+        self,
+        bot: RedBot,
+        chat_type: ChatType,
+        peer: str,
+        offset_msg_id: str,
+        count: int,
+    ) -> List[T_OB11Msg]:
+        """从 Red 拉取 offset_msg_id 及其之前的历史消息，本地没有的消息顺便存入存储"""
+        # RedBot.get_history_messages 传入的参数名与 API 处理函数不一致，直接调用 API
+        resp = await bot.call_api(
+            "get_history_messages",
+            chat_type=chat_type,
+            target=peer,
+            offset_msg_id=offset_msg_id,
+            count=count,
+        )
+        raw_msgs = resp.get("msgList", []) if isinstance(resp, dict) else resp
+
+        result = []
+        for data in raw_msgs:
+            event_type = (
+                red_event.GroupMessageEvent
+                if data.get("chatType") == ChatType.GROUP
+                else red_event.PrivateMessageEvent
+            )
+            try:
+                event = event_type.parse_obj(data)
+            except Exception as e:
+                log("DEBUG", f"Failed to parse history message: {data}", e)
+                continue
+
+            msg = peek_ob11_msg(event.msgId)
+            if msg is None:
+                message = self.convert_incoming_msg(bot, event.message)
+                msg = make_ob11_msg(
+                    group=event.is_group,
+                    group_id=int(event.peerUin or "0") if event.is_group else None,
+                    message_id=int(event.msgId),
+                    real_id=int(event.msgId),
+                    message_type="group" if event.is_group else "private",
+                    sender=construct_trusted(
+                        Sender,
+                        nickname=event.sendNickName or event.sendMemberName,
+                        user_id=int(event.senderUin or "0"),
+                    ),
+                    time=int(event.msgTime or "0"),
+                    message=message,
+                    raw_message=message.extract_plain_text(),
+                    peer_id=None if event.is_group else int(event.peerUin or "0"),
+                )
+                await save_ob11_msg(event.msgId, msg)
+            result.append(msg)
+        return result
+
+    async def _resolve_reply(
+        self, bot: RedBot, event: red_event.MessageEvent
+    ) -> "Optional[asyncio.Future[Optional[T_OB11Msg]]]":
+        """
+        开始解析事件中回复的消息，最多等待 ob_pretender_reply_timeout 秒。
+
+        返回的 Future 可能尚未完成，此时由 _set_reply 记录供 get_reply 等待。
+        """
+        if not (event.reply and event.reply.replayMsgId):
+            return None
+
+        future = self.reply_resolver.resolve(
+            bot,
+            event.chatType,
+            event.peerUin or event.senderUin,
+            event.reply.replayMsgId,
+        )
+        if not future.done():
+            await asyncio.wait({future}, timeout=conf.ob_pretender_reply_timeout)
+        return future
+
+    @cached_property
+    def _pending_replies(
+        self,
+    ) -> "LRUCache[Tuple[int, int], asyncio.Future[Optional[T_OB11Msg]]]":
+        # 解析完成后仍保留一段时间，事件派发后较晚调用 get_reply 也能取得结果
+        return LRUCache(_PENDING_REPLY_CACHE_SIZE, 0)
+
+    @staticmethod
+    def _make_reply(
+        event: ob11_event.MessageEvent,
+        future: "asyncio.Future[Optional[T_OB11Msg]]",
+    ) -> Optional[Reply]:
+        if future.cancelled():
+            return None
+        exc = future.exception()
+        if exc is not None:
+            log(
+                "WARNING",
+                f"Failed to resolve reply of message {event.message_id}",
+                exc,
+            )
+            return None
+        msg = future.result()
+        if msg is None:
+            log("DEBUG", f"Reply of message {event.message_id} not found")
+            return None
+        return construct_trusted(
+            Reply,
+            time=msg.time,
+            message_type=msg.message_type,
+            message_id=msg.message_id,
+            real_id=msg.real_id,
+            sender=msg.sender.copy(),
+            message=deepcopy(msg.message),
+        )
+
+    def _set_reply(
+        self,
+        event: ob11_event.MessageEvent,
+        future: "Optional[asyncio.Future[Optional[T_OB11Msg]]]",
+    ):
+        """
+        在事件派发前填入回复的消息。
+
+        超出等待时间时 reply 固定为 None，事件派发后不会再被修改；
+        需要该回复的 handler 可以通过 get_reply 等待解析结果。
+        """
+        if future is None:
+            return
+        if future.done():
+            event.reply = self._make_reply(event, future)
+            return
+
+        self._pending_replies.put((event.self_id, event.message_id), future)
+
+        def callback(future: "asyncio.Future[Optional[T_OB11Msg]]"):
+            if not future.cancelled() and future.exception() is not None:
+                log(
+                    "WARNING",
+                    f"Failed to resolve reply of message {event.message_id}",
+                    future.exception(),
+                )
+
+        future.add_done_callback(callback)
+
+    async def get_reply(self, event: ob11_event.MessageEvent) -> Optional[Reply]:
+        """
+        获取消息事件中回复的消息。
+
+        事件派发时回复已解析完成的，直接返回 event.reply；
+        否则等待仍在进行的解析，返回结果而不修改事件。
+        """
+        if event.reply is not None:
+            return event.reply
+        future = self._pending_replies.get((event.self_id, event.message_id))
+        if future is None:
+            return None
+        await asyncio.wait({future})
+        # 解析失败已由 _set_reply 记录
+        if future.cancelled() or future.exception() is not None:
+            return None
+        return self._make_reply(event, future)
+
+    @cached_property
+    def _media_url_prefix(self) -> str:
+        return urlunsplit(
             (
                 "http",
                 f"localhost:{self.adapter.driver.config.port}",
                 "/ob_pretender/red/media",
-                query,
+                "",
                 "",
             )
         )
-        return url
+
+    def construct_media_url(self, bot_self_id: str, seg: MediaMessageSegment) -> str:
+        # 参数几乎都是数字，不需要 urlencode 逐个转义
+        return (
+            f"{self._media_url_prefix}?botId={_quote(bot_self_id)}"
+            f"&msgId={_quote(seg.data['_msg_id'])}"
+            f"&chatType={_quote(seg.data['_chat_type'])}"
+            f"&target={_quote(seg.data['_peer_uin'])}"
+            f"&elementId={_quote(seg.data['id'])}"
+            "&thumbSize=0&downloadType=2"
+        )
+
+    @staticmethod
+    def convert_outgoing_media(seg_type: str, file) -> CachedMediaMessageSegment:
+        seg = CachedMediaMessageSegment(seg_type, {})
+        if isinstance(file, str):
+            # base64:// 在上传时才于线程中解码
+            if not file.startswith(BASE64_PREFIX):
+                file = Path(file)
+        elif isinstance(file, BytesIO):
+            file = file.getvalue()
+
+        seg.data["file"] = file
+        if seg_type == "voice":
+            seg.data["duration"] = 1
+        return seg
 
     def convert_outgoing_msg(self, outgoing: OB11Msg) -> RedMsg:
         msg = RedMsg()
-        for m in outgoing:
-            if m.type == "text":
-                msg.append(RedMS.text(m.data["text"]))
-            elif m.type == "at":
-                if m.data["qq"] == "all":
-                    msg.append(RedMS.at_all())
-                else:
-                    msg.append(RedMS.at(m.data["qq"]))
-            elif m.type == "face":
-                msg.append(RedMS.face(m.data["id"]))
-            elif m.type == "image":
-                file = m.data["file"]
-                if isinstance(file, str):
-                    if file.startswith("base64://"):
-                        file = b64decode(file.removeprefix("base64://"))
-                    else:
-                        file = Path(file)
-                msg.append(RedMS.image(file))
-            elif m.type == "video":
-                file = m.data["file"]
-                if isinstance(file, str):
-                    file = Path(file)
-                msg.append(RedMS.video(file))
-            elif m.type == "record":
-                file = m.data["file"]
-                if isinstance(file, str):
-                    file = Path(file)
-                msg.append(RedMS.voice(file))
-            elif m.type == "reply":
-                msg.append(
-                    RedMS.reply(
-                        m.data.get("seq"),
-                        m.data.get("id"),
-                        m.data.get("qq"),
-                    )
-                )
-            else:
-                log("WARNING", f"暂不支持 {m.type} 类型消息转换 (OB11 -> Red)")
+        try:
+            self._convert_outgoing_msg(outgoing, msg)
+        except BaseException:
+            release_media(msg)
+            raise
         return msg
 
+    def _convert_outgoing_msg(self, outgoing: OB11Msg, msg: RedMsg):
+        for m, seg in self.outgoing_converters.convert_many(self, outgoing):
+            if seg is None:
+                log("WARNING", f"暂不支持 {m.type} 类型消息转换 (OB11 -> Red)")
+            else:
+                msg.append(seg)
+
     def convert_incoming_msg(self, bot: RedBot, incoming: RedMsg) -> OB11Msg:
         msg = OB11Msg()
-        for m in incoming:
-            if m.type == "text":
-                msg.append(OB11MS.text(m.data["text"]))
-            elif m.type == "at":
-                msg.append(
-                    OB11MS(
-                        "at",
-                        {"qq": str(m.data["user_id"]), "name": m.data.get("user_name")},
-                    )
-                )
-            elif m.type == "at_all":
-                msg.append(OB11MS.at("all"))
-            elif m.type == "face":
-                msg.append(OB11MS("face", {"id": str(m.data["face_id"])}))
-            # elif m.type == "max_member_countrket_face":
-            #     msg.append(
-            #         OB11MS(
-            #             "image",
-            #             {
-            #                 "file": "file://" + m.data["static_path"],
-            #                 "url": "file://" + m.data["static_path"],
-            #             },
-            #         )
-            #     )
-            elif m.type == "image" and isinstance(m, MediaMessageSegment):
-                msg.append(
-                    OB11MS(
-                        "image",
-                        {
-                            "file": "file://" + m.data["path"],
-                            "url": self.construct_media_url(bot.self_id, m),
-                        },
-                    )
-                )
-            elif m.type == "video" and isinstance(m, MediaMessageSegment):
-                msg.append(
-                    OB11MS(
-                        "video",
-                        {
-                            "file": "file://" + m.data["path"],
-                            "url": self.construct_media_url(bot.self_id, m),
-                            "cover": "file://" + m.data["thumb_path"],
-                        },
-                    )
-                )
-            elif m.type == "voice" and isinstance(m, MediaMessageSegment):
-                msg.append(
-                    OB11MS(
-                        "record",
-                        {
-                            "file": "file://" + m.data["path"],
-                            "url": self.construct_media_url(bot.self_id, m),
-                        },
-                    )
-                )
-            elif m.type == "reply":
-                msg.append(
-                    OB11MS(
-                        "reply",
-                        {
-                            "id": str(m.data["msg_id"]),
-                        },
-                    )
-                )
-            else:
+        for m, seg in self.incoming_converters.convert_many(self, incoming, bot):
+            if seg is None:
                 log("WARNING", f"暂不支持 {m.type} 类型消息转换 (Red -> OB11)")
+            else:
+                msg.append(seg)
         return msg
 
+    def convert_incoming_msgs(
+        self, bot: RedBot, message: RedMsg, original_message: RedMsg
+    ) -> Tuple[OB11Msg, OB11Msg]:
+        """
+        转换消息事件的 message 与 original_message。
+
+        message 是 original_message 去掉回复、@ 等之后的结果，
+        二者相同的消息段只转换一次。
+        """
+        converted = self.incoming_converters.convert_many(self, original_message, bot)
+        for m, seg in converted:
+            if seg is None:
+                log("WARNING", f"暂不支持 {m.type} 类型消息转换 (Red -> OB11)")
+        ori_msg = OB11Msg(seg for _, seg in converted if seg is not None)
+
+        if message == original_message:
+            return OB11Msg(ori_msg), ori_msg
+
+        # message 中的消息段按顺序出现在 original_message 中，只有被修改过的需要重新转换
+        msg = OB11Msg()
+        i = 0
+        for m in message:
+            for j in range(i, len(converted)):
+                if converted[j][0] == m:
+                    seg = converted[j][1]
+                    i = j + 1
+                    break
+            else:
+                seg = self.incoming_converters.convert(self, m, bot)
+            if seg is not None:
+                msg.append(seg)
+        return msg, ori_msg
+
+    async def _make_message_event(
+        self,
+        bot: RedBot,
+        event: red_event.MessageEvent,
+        event_type: Type[ob11_event.MessageEvent],
+        model_fields: Dict[str, Any],
+        event_fields: Dict[str, Any],
+    ) -> ob11_event.MessageEvent:
+        """
+        保存消息并构造 OB11 消息事件，事件与存储模型都跳过校验直接构造。
+
+        MessageEvent 校验时会把 original_message 设为 message 的副本，
+        跳过校验时同样如此，两种模式下事件的内容一致。
+        存储的消息使用单独的副本，handler 原地修改事件的消息不会影响 get_msg 的结果。
+        """
+        msg, ori_msg = self.convert_incoming_msgs(
+            bot, event.message, event.original_message
+        )
+        raw_message = ori_msg.extract_plain_text()
+        model = make_ob11_msg(
+            **model_fields, message=deepcopy(msg), raw_message=raw_message
+        )
+        ob11_event_ = construct_trusted(
+            event_type,
+            **event_fields,
+            message=msg,
+            original_message=deepcopy(msg),
+            raw_message=raw_message,
+        )
+
+        await save_ob11_msg(event.msgId, model)
+        return ob11_event_
+
+    @outgoing_segment_converter("text")
+    def _convert_outgoing_text(self, m: OB11MS) -> RedMS:
+        return RedMS.text(m.data["text"])
+
+    @outgoing_segment_converter("at")
+    def _convert_outgoing_at(self, m: OB11MS) -> RedMS:
+        if m.data["qq"] == "all":
+            return RedMS.at_all()
+        return RedMS.at(m.data["qq"])
+
+    @outgoing_segment_converter("face")
+    def _convert_outgoing_face(self, m: OB11MS) -> RedMS:
+        return RedMS.face(m.data["id"])
+
+    @outgoing_segment_converter("image", "video", "record")
+    def _convert_outgoing_media(self, m: OB11MS) -> RedMS:
+        seg_type = "voice" if m.type == "record" else m.type
+        return self.convert_outgoing_media(seg_type, m.data["file"])
+
+    @outgoing_segment_converter("reply")
+    def _convert_outgoing_reply(self, m: OB11MS) -> RedMS:
+        return RedMS.reply(
+            m.data.get("seq"),
+            m.data.get("id"),
+            m.data.get("qq"),
+        )
+
+    @incoming_segment_converter("text")
+    def _convert_incoming_text(self, bot: RedBot, m: RedMS) -> OB11MS:
+        return OB11MS.text(m.data["text"])
+
+    @incoming_segment_converter("at")
+    def _convert_incoming_at(self, bot: RedBot, m: RedMS) -> OB11MS:
+        return OB11MS(
+            "at",
+            {"qq": str(m.data["user_id"]), "name": m.data.get("user_name")},
+        )
+
+    @incoming_segment_converter("at_all")
+    def _convert_incoming_at_all(self, bot: RedBot, m: RedMS) -> OB11MS:
+        return OB11MS.at("all")
+
+    @incoming_segment_converter("face")
+    def _convert_incoming_face(self, bot: RedBot, m: RedMS) -> OB11MS:
+        return OB11MS("face", {"id": str(m.data["face_id"])})
+
+    @incoming_segment_converter("image", "video", "voice")
+    def _convert_incoming_media(self, bot: RedBot, m: RedMS) -> Optional[OB11MS]:
+        if not isinstance(m, MediaMessageSegment):
+            return None
+
+        data = {
+            "file": "file://" + m.data["path"],
+            "url": self.construct_media_url(bot.self_id, m),
+        }
+        if m.type == "video":
+            data["cover"] = "file://" + m.data["thumb_path"]
+        return OB11MS("record" if m.type == "voice" else m.type, data)
+
+    @incoming_segment_converter("reply")
+    def _convert_incoming_reply(self, bot: RedBot, m: RedMS) -> OB11MS:
+        return OB11MS(
+            "reply",
+            {
+                "id": str(m.data["msg_id"]),
+            },
+        )
+
     @api_call_handler()
     async def send_msg(
         self,
@@ -180,22 +462,54 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
         user_id: Optional[int] = None,
         group_id: Optional[int] = None,
         message: Union[str, OB11Msg],
+        priority: T_Priority = "interactive",
         **data: Dict,
     ) -> Dict:
         if message_type == "private":
-            return await self.send_private_msg(bot, user_id=user_id, message=message)
+            return await self.send_private_msg(
+                bot, user_id=user_id, message=message, priority=priority
+            )
         elif message_type == "group":
-            return await self.send_group_msg(bot, group_id=group_id, message=message)
+            return await self.send_group_msg(
+                bot, group_id=group_id, message=message, priority=priority
+            )
         elif user_id:
-            return await self.send_private_msg(bot, user_id=user_id, message=message)
+            return await self.send_private_msg(
+                bot, user_id=user_id, message=message, priority=priority
+            )
         elif group_id:
-            return await self.send_group_msg(bot, group_id=group_id, message=message)
+            return await self.send_group_msg(
+                bot, group_id=group_id, message=message, priority=priority
+            )
         else:
             raise ValueError("请传入正确的参数")
 
+    @staticmethod
+    async def _scheduled_send(
+        bot: RedBot,
+        target: Tuple[ChatType, int],
+        send: Callable[[], Any],
+        *messages: RedMsg,
+        priority: T_Priority,
+    ) -> Any:
+        """经发送调度器排队后发送，没有发送的消息也会删除临时文件"""
+        return await send_scheduler.submit(
+            bot.self_id,
+            target,
+            lambda: send_with_media(send, *messages),
+            priority,
+            discard=lambda: release_media(*messages),
+        )
+
     @api_call_handler()
     async def send_group_msg(
-        self, bot: RedBot, *, group_id: int, message: Union[str, OB11Msg], **data: Dict
+        self,
+        bot: RedBot,
+        *,
+        group_id: int,
+        message: Union[str, OB11Msg],
+        priority: T_Priority = "interactive",
+        **data: Dict,
     ) -> Dict:
         if isinstance(message, str):
             message = OB11Msg(message)
@@ -203,29 +517,27 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
 
         message = self.convert_outgoing_msg(message)
 
-        res = await bot.send_group_message(group_id, message)
-        save_ob11_msg(
-            res.msgId,
-            OB11MsgModel(
-                group=True,
-                group_id=group_id,
-                message_id=int(res.msgId),
-                real_id=int(res.msgId),
-                message_type="group",
-                sender=Sender(
-                    nickname=res.sendNickName or res.sendMemberName,
-                    user_id=int(bot.self_id),
-                ),
-                time=int(res.msgTime or "0"),
-                message=ob11_msg,
-                raw_message=ob11_msg.extract_plain_text(),
-            ),
+        res = await self._scheduled_send(
+            bot,
+            (ChatType.GROUP, int(group_id)),
+            lambda: bot.send_group_message(group_id, message),
+            message,
+            priority=priority,
+        )
+        await save_ob11_msg(
+            res.msgId, self._sent_ob11_msg(bot, res, ob11_msg, group_id=group_id)
         )
         return {"message_id": int(res.msgId)}
 
     @api_call_handler()
     async def send_private_msg(
-        self, bot: RedBot, *, user_id: int, message: Union[str, OB11Msg], **data: Dict
+        self,
+        bot: RedBot,
+        *,
+        user_id: int,
+        message: Union[str, OB11Msg],
+        priority: T_Priority = "interactive",
+        **data: Dict,
     ) -> Dict:
         if isinstance(message, str):
             message = OB11Msg(message)
@@ -233,26 +545,140 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
 
         message = self.convert_outgoing_msg(message)
 
-        res = await bot.send_friend_message(user_id, message)
-        save_ob11_msg(
-            res.msgId,
-            OB11MsgModel(
-                group=False,
-                group_id=None,
-                message_id=int(res.msgId),
-                real_id=int(res.msgId),
-                message_type="private",
-                sender=Sender(
-                    nickname=res.sendNickName or res.sendMemberName,
-                    user_id=int(bot.self_id),
-                ),
-                time=int(res.msgTime or "0"),
-                message=ob11_msg,
-                raw_message=ob11_msg.extract_plain_text(),
-            ),
+        res = await self._scheduled_send(
+            bot,
+            (ChatType.FRIEND, int(user_id)),
+            lambda: bot.send_friend_message(user_id, message),
+            message,
+            priority=priority,
+        )
+        await save_ob11_msg(
+            res.msgId, self._sent_ob11_msg(bot, res, ob11_msg, user_id=user_id)
         )
         return {"message_id": int(res.msgId)}
 
+    @api_call_handler()
+    async def send_broadcast_msg(
+        self,
+        bot: RedBot,
+        *,
+        message: Union[str, OB11Msg],
+        group_ids: Optional[List[int]] = None,
+        user_ids: Optional[List[int]] = None,
+        priority: T_Priority = "bulk",
+        **data: Dict,
+    ) -> List[Dict]:
+        """
+        扩展 API：向多个群和好友发送同一条消息。
+
+        消息只转换、上传一次，之后以有限的并发经发送调度器发往各个目标；
+        按 group_ids、user_ids 的顺序返回每个目标的结果，单个目标失败不影响其他目标。
+        """
+        if isinstance(message, str):
+            message = OB11Msg(message)
+        ob11_msg = message
+
+        targets = [(ChatType.GROUP, int(x)) for x in group_ids or ()]
+        targets += [(ChatType.FRIEND, int(x)) for x in user_ids or ()]
+        if not targets:
+            raise ValueError("请传入正确的参数")
+
+        message = self.convert_outgoing_msg(message)
+        try:
+            responses = await self._broadcast(bot, message, targets, priority)
+            if all(isinstance(res, BaseException) for res in responses):
+                # 与 send_with_media 相同，上传缓存可能已经失效，重新上传后再发送一次
+                if invalidate_cached_uploads(message):
+                    responses = await self._broadcast(bot, message, targets, priority)
+        finally:
+            release_media(message)
+
+        results = []
+        sent = []
+        for (chat_type, target), res in zip(targets, responses):
+            if chat_type == ChatType.GROUP:
+                result: Dict[str, Any] = {"message_type": "group", "group_id": target}
+                kwargs = {"group_id": target}
+            else:
+                result = {"message_type": "private", "user_id": target}
+                kwargs = {"user_id": target}
+
+            if isinstance(res, BaseException):
+                if isinstance(res, asyncio.CancelledError):
+                    raise res
+                self.log(
+                    "WARNING",
+                    f"Failed to broadcast to {result['message_type']} {target}: {res}",
+                )
+                result.update(status="failed", message_id=None, msg=str(res))
+            else:
+                sent.append(
+                    (res.msgId, self._sent_ob11_msg(bot, res, ob11_msg, **kwargs))
+                )
+                result.update(status="ok", message_id=int(res.msgId))
+            results.append(result)
+
+        await save_ob11_msgs(sent)
+        return results
+
+    @staticmethod
+    async def _broadcast(
+        bot: RedBot,
+        message: RedMsg,
+        targets: List[Tuple[ChatType, int]],
+        priority: T_Priority,
+    ) -> List[Union[MessageModel, BaseException]]:
+        # 导出时上传媒体，之后各个目标发送同一份元素
+        elements = await message.export(bot)
+        semaphore = asyncio.Semaphore(max(conf.ob_pretender_broadcast_concurrency, 1))
+
+        async def send(chat_type: ChatType, target: int) -> MessageModel:
+            async with semaphore:
+                resp = await send_scheduler.submit(
+                    bot.self_id,
+                    (chat_type, target),
+                    lambda: bot.call_api(
+                        "send_message",
+                        chat_type=chat_type,
+                        target=str(target),
+                        elements=elements,
+                    ),
+                    priority,
+                )
+            return MessageModel.parse_obj(resp)
+
+        return await asyncio.gather(
+            *(send(chat_type, target) for chat_type, target in targets),
+            return_exceptions=True,
+        )
+
+    @staticmethod
+    def _sent_ob11_msg(
+        bot: RedBot,
+        res: MessageModel,
+        ob11_msg: OB11Msg,
+        *,
+        group_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> T_OB11Msg:
+        """bot 自己发出的消息的存储模型"""
+        return make_ob11_msg(
+            group=group_id is not None,
+            group_id=group_id,
+            message_id=int(res.msgId),
+            real_id=int(res.msgId),
+            message_type="group" if group_id is not None else "private",
+            sender=construct_trusted(
+                Sender,
+                nickname=res.sendNickName or res.sendMemberName,
+                user_id=int(bot.self_id),
+            ),
+            time=int(res.msgTime or "0"),
+            message=ob11_msg,
+            raw_message=ob11_msg.extract_plain_text(),
+            peer_id=user_id,
+        )
+
     async def _send_forward_msg(
         self,
         bot: RedBot,
@@ -260,72 +686,125 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
         chat_type: ChatType,
         target: int,
         messages: Union[List[Dict], List[OB11MS], OB11Msg],
+        priority: T_Priority = "interactive",
     ) -> Dict:
-        messages = [
-            json.loads(json.dumps(seg, cls=DataclassEncoder))
-            if isinstance(seg, OB11MS)
-            else seg
+        # 将Message转换为List
+        segs = [
+            {"type": seg.type, "data": seg.data} if isinstance(seg, OB11MS) else seg
             for seg in messages
-        ]  # 将Message转换为List
+        ]
+        segs = [seg for seg in segs if seg.get("type") == "node"]
+
+        stored = await load_ob11_msgs(
+            str(data["id"])
+            for data in (seg.get("data") or {} for seg in segs)
+            if "id" in data
+        )
+
+        # 相同的消息只转换一次，各个节点共用转换结果
+        converted: Dict[str, RedMsg] = {}
+
+        def convert(ob11_msg: OB11Msg) -> RedMsg:
+            key = str(ob11_msg)
+            msg = converted.get(key)
+            if msg is None:
+                msg = converted[key] = self.convert_outgoing_msg(ob11_msg)
+            return msg
 
         nodes = []
+        try:
+            for seg in segs:
+                data = seg.get("data") or {}
 
-        for seg in messages:
-            if seg.get("type") != "node":
-                continue
-            data = seg.get("data") or {}
-
-            if "id" in data:
-                ob11_msg = await load_ob11_msg(data["id"])
-                if ob11_msg is None:
-                    continue
-
-                nodes.append(
-                    ForwardNode(
-                        uin=str(ob11_msg.sender.user_id),
-                        name=ob11_msg.sender.nickname,
-                        group=ob11_msg.group_id,
-                        message=self.convert_outgoing_msg(ob11_msg.message),
-                        time=ob11_msg.time,
+                if "id" in data:
+                    ob11_msg = stored.get(str(data["id"]))
+                    if ob11_msg is None:
+                        continue
+
+                    nodes.append(
+                        ForwardNode(
+                            uin=str(ob11_msg.sender.user_id),
+                            name=ob11_msg.sender.nickname,
+                            group=ob11_msg.group_id,
+                            message=convert(ob11_msg.message),
+                            time=ob11_msg.time,
+                        )
                     )
-                )
-            elif "uin" in data or "user_id" in data:
-                nodes.append(
-                    ForwardNode(
-                        uin=str(data.get("uin") or data.get("user_id")),
-                        name=data.get("name")
-                             or data.get("nickname")
-                             or str(data.get("uin") or data.get("user_id")),
-                        group=0,
-                        message=self.convert_outgoing_msg(
-                            OB11Msg(OB11MS(**raw_seg) for raw_seg in data["content"])
-                        ),
+                elif "uin" in data or "user_id" in data:
+                    nodes.append(
+                        ForwardNode(
+                            uin=str(data.get("uin") or data.get("user_id")),
+                            name=data.get("name")
+                            or data.get("nickname")
+                            or str(data.get("uin") or data.get("user_id")),
+                            group=0,
+                            message=convert(
+                                self._forward_node_content(data["content"])
+                            ),
+                        )
                     )
-                )
+        except BaseException:
+            release_media(*converted.values())
+            raise
 
-        await bot.send_fake_forward(nodes, chat_type, target)
+        await self._scheduled_send(
+            bot,
+            (chat_type, int(target)),
+            lambda: bot.send_fake_forward(nodes, chat_type, target),
+            *converted.values(),
+            priority=priority,
+        )
         return {
             "message_id": 0,
             "forward_id": "",
         }
 
+    @staticmethod
+    def _forward_node_content(content: Union[str, Iterable]) -> OB11Msg:
+        if isinstance(content, str):
+            return OB11Msg(content)
+        return OB11Msg(
+            seg if isinstance(seg, OB11MS) else OB11MS(**seg) for seg in content
+        )
+
     @api_call_handler()
     async def send_group_forward_msg(
-        self, bot: RedBot, *, group_id: int, messages: List[Dict], **data: Dict
+        self,
+        bot: RedBot,
+        *,
+        group_id: int,
+        messages: List[Dict],
+        priority: T_Priority = "interactive",
+        **data: Dict,
     ) -> Dict:
         return await self._send_forward_msg(
-            bot, chat_type=ChatType.GROUP, target=group_id, messages=messages
+            bot,
+            chat_type=ChatType.GROUP,
+            target=group_id,
+            messages=messages,
+            priority=priority,
         )
 
     @api_call_handler()
     async def send_private_forward_msg(
-        self, bot: RedBot, *, user_id: int, messages: List[Dict], **data: Dict
+        self,
+        bot: RedBot,
+        *,
+        user_id: int,
+        messages: List[Dict],
+        priority: T_Priority = "interactive",
+        **data: Dict,
     ) -> Dict:
         return await self._send_forward_msg(
-            bot, chat_type=ChatType.FRIEND, target=user_id, messages=messages
+            bot,
+            chat_type=ChatType.FRIEND,
+            target=user_id,
+            messages=messages,
+            priority=priority,
         )
 
     @api_call_handler()
+    @cached_api(ttl=5 * 60)
     async def get_login_info(self, bot: RedBot, **data: Dict) -> Dict:
         profile = await bot.get_self_profile()
         return {
@@ -334,6 +813,7 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
         }
 
     @api_call_handler()
+    @cached_api(ttl=60)
     async def get_friend_list(self, bot: RedBot, **data: Dict) -> List:
         friends = await bot.get_friends()
         return [
@@ -346,6 +826,7 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
         ]
 
     @api_call_handler()
+    @cached_api(ttl=60)
     async def get_group_list(self, bot: RedBot, **data: Dict) -> List:
         groups = await bot.get_groups()
         return [
@@ -361,33 +842,63 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
             for group in groups
         ]
 
+    @staticmethod
+    def _group_member_info(group_id: int, member: Member) -> Dict:
+        return {
+            "group_id": group_id,
+            "user_id": member_user_id(member),
+            "nickname": member.nick,
+            "card": member.cardName,
+            "sex": "unknown",
+            "age": 0,
+            "area": "",
+            "join_time": 0,
+            "last_sent_time": 0,
+            "level": 0,
+            "role": member_role(member.role),
+            "unfriendly": False,
+            "title": "",
+            "title_expire_time": 0,
+            "card_changeable": False,
+            "shut_up_timestamp": member.shutUpTime,
+        }
+
     @api_call_handler()
     async def get_group_member_list(
-        self, bot: RedBot, *, group_id: int, **data: Dict
+        self, bot: RedBot, *, group_id: int, no_cache: bool = False, **data: Dict
     ) -> List:
-        members = await bot.get_members(group_id, 2 ** 16 - 1)
+        if not group_member_cache.enabled:
+            # 不缓存时边接收边构造响应，不保留中间的成员列表
+            return [
+                self._group_member_info(group_id, member)
+                async for member in iter_group_members(bot, group_id)
+            ]
+
+        members = await group_member_cache.get(bot, group_id, refresh=no_cache)
         return [
-            {
-                "group_id": group_id,
-                "user_id": int(member.uin or member.uid or member.qid),
-                "nickname": member.nick,
-                "card": member.cardName,
-                "sex": "unknown",
-                "age": 0,
-                "area": "",
-                "join_time": 0,
-                "last_sent_time": 0,
-                "level": 0,
-                "role": "member",  # TODO
-                "unfriendly": False,
-                "title": "",
-                "title_expire_time": 0,
-                "card_changeable": False,
-                "shut_up_timestamp": member.shutUpTime,
-            }
-            for member in members
+            self._group_member_info(group_id, member) for member in members.values()
         ]
 
+    @api_call_handler()
+    async def get_group_member_info(
+        self,
+        bot: RedBot,
+        *,
+        group_id: int,
+        user_id: int,
+        no_cache: bool = False,
+        **data: Dict,
+    ) -> Dict:
+        members = await group_member_cache.get(bot, group_id, refresh=no_cache)
+        member = members.get(int(user_id))
+        if member is None and not no_cache:
+            # 可能是缓存之后才入群的成员
+            members = await group_member_cache.get(bot, group_id, refresh=True)
+            member = members.get(int(user_id))
+        if member is None:
+            raise ActionFailed(msg="群成员不存在")
+        return self._group_member_info(group_id, member)
+
     @api_call_handler()
     async def delete_msg(self, bot: RedBot, *, message_id: int, **data: Dict) -> None:
         msg = await load_ob11_msg(message_id)
@@ -403,10 +914,57 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
     async def get_msg(self, bot: RedBot, *, message_id: int, **data: Dict) -> Dict:
         msg = await load_ob11_msg(str(message_id))
         if msg is not None:
-            return json.loads(msg.json(exclude_none=True))
+            return dump_ob11_msg(msg)
         else:
             raise ActionFailed(msg="消息不存在")
 
+    async def _get_msg_history(
+        self,
+        *,
+        group_id: Optional[int] = None,
+        peer_id: Optional[int] = None,
+        message_seq: Optional[int] = None,
+        count: int = 20,
+    ) -> Dict:
+        before = None
+        if message_seq:
+            before = await load_ob11_msg(str(message_seq))
+            if before is None:
+                raise ActionFailed(msg="消息不存在")
+
+        messages = await load_ob11_msg_history(
+            group_id=group_id, peer_id=peer_id, before=before, count=count
+        )
+        return {"messages": [dump_ob11_msg(msg) for msg in messages]}
+
+    @api_call_handler()
+    async def get_group_msg_history(
+        self,
+        bot: RedBot,
+        *,
+        group_id: int,
+        message_seq: Optional[int] = None,
+        count: int = 20,
+        **data: Dict,
+    ) -> Dict:
+        return await self._get_msg_history(
+            group_id=int(group_id), message_seq=message_seq, count=count
+        )
+
+    @api_call_handler()
+    async def get_friend_msg_history(
+        self,
+        bot: RedBot,
+        *,
+        user_id: int,
+        message_seq: Optional[int] = None,
+        count: int = 20,
+        **data: Dict,
+    ) -> Dict:
+        return await self._get_msg_history(
+            peer_id=int(user_id), message_seq=message_seq, count=count
+        )
+
     @api_call_handler()
     async def set_group_ban(
         self,
@@ -440,116 +998,122 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
     async def handle_group_message_event(
         self, bot: RedBot, event: red_event.GroupMessageEvent
     ) -> ob11_event.GroupMessageEvent:
-        msg = self.convert_incoming_msg(bot, event.message)
-        ori_msg = self.convert_incoming_msg(bot, event.original_message)
-
-        reply = None
-        if event.reply and event.reply.replayMsgId:
-            reply = await self.get_msg(bot, message_id=int(event.reply.replayMsgId))
-            if reply is not None:
-                reply = Reply.parse_obj(reply)
-
-        save_ob11_msg(
-            event.msgId,
-            OB11MsgModel(
-                group=True,
-                group_id=int(event.peerUin or "0"),
-                message_id=int(event.msgId),
-                real_id=int(event.msgId),
-                message_type="group",
-                sender=Sender(
+        reply = await self._resolve_reply(bot, event)
+
+        ob11_event_ = await self._make_message_event(
+            bot,
+            event,
+            ob11_event.GroupMessageEvent,
+            {
+                "group": True,
+                "group_id": int(event.peerUin or "0"),
+                "message_id": int(event.msgId),
+                "real_id": int(event.msgId),
+                "message_type": "group",
+                "sender": construct_trusted(
+                    Sender,
                     nickname=event.sendNickName or event.sendMemberName,
                     user_id=int(event.senderUin or "0"),
                 ),
-                time=int(event.msgTime or "0"),
-                message=msg,
-                raw_message=ori_msg.extract_plain_text(),
-            ),
+                "time": int(event.msgTime or "0"),
+            },
+            {
+                "time": int(event.msgTime or "0"),
+                "self_id": int(bot.self_id or "0"),
+                "post_type": "message",
+                "sub_type": "normal",
+                "user_id": int(event.senderUin or "0"),
+                "message_id": int(event.msgId or "0"),
+                "font": 0,
+                "sender": construct_trusted(
+                    Sender,
+                    user_id=int(event.senderUin or "0"),
+                    nickname=event.sendNickName or event.sendMemberName,
+                    sex="unknown",
+                    age=0,
+                    card=event.sendMemberName,
+                    role=self._sender_role(bot, event),
+                    title="",
+                ),
+                "message_type": "group",
+                "group_id": int(event.peerUin),
+                "to_me": event.to_me,
+                "reply": None,
+                "anonymous": None,
+            },
         )
+        self._set_reply(ob11_event_, reply)
+        return ob11_event_
 
-        return ob11_event.GroupMessageEvent(
-            time=int(event.msgTime or "0"),
-            self_id=int(bot.self_id or "0"),
-            post_type="message",
-            sub_type="normal",
-            user_id=int(event.senderUin or "0"),
-            message_id=int(event.msgId or "0"),
-            message=msg,
-            original_message=ori_msg,
-            raw_message=ori_msg.extract_plain_text(),
-            font=0,
-            sender=Sender(
-                user_id=int(event.senderUin or "0"),
-                nickname=event.sendNickName or event.sendMemberName,
-                sex="unknown",
-                age=0,
-                card=event.sendMemberName,
-                role="member",  # todo
-                title="",
-            ),
-            message_type="group",
-            group_id=int(event.peerUin),
-            to_me=event.to_me,
-            reply=reply,
-            anonymous=None,
+    @staticmethod
+    def _sender_role(bot: RedBot, event: red_event.GroupMessageEvent) -> str:
+        member = group_member_cache.peek_member(
+            bot.self_id, int(event.peerUin), int(event.senderUin or "0")
         )
+        if member is None:
+            # 不等待请求，之后的消息可以使用缓存
+            group_member_cache.prefetch(bot, int(event.peerUin))
+            return "member"
+        return member_role(member.role)
 
     @event_handler(red_event.PrivateMessageEvent)
     async def handle_private_message_event(
         self, bot: RedBot, event: red_event.PrivateMessageEvent
     ) -> ob11_event.PrivateMessageEvent:
-        msg = self.convert_incoming_msg(bot, event.message)
-        ori_msg = self.convert_incoming_msg(bot, event.original_message)
-
-        reply = None
-        if event.reply and event.reply.replayMsgId:
-            reply = Reply.parse_obj(
-                await self.get_msg(bot, message_id=int(event.reply.replayMsgId))
-            )
+        reply = await self._resolve_reply(bot, event)
 
-        save_ob11_msg(
-            event.msgId,
-            OB11MsgModel(
-                group=False,
-                message_id=int(event.msgId),
-                real_id=int(event.msgId),
-                message_type="private",
-                sender=Sender(
+        ob11_event_ = await self._make_message_event(
+            bot,
+            event,
+            ob11_event.PrivateMessageEvent,
+            {
+                "group": False,
+                "message_id": int(event.msgId),
+                "real_id": int(event.msgId),
+                "message_type": "private",
+                "sender": construct_trusted(
+                    Sender,
                     nickname=event.sendNickName or event.sendMemberName,
                     user_id=int(event.senderUin or "0"),
                 ),
-                time=int(event.msgTime or "0"),
-                message=msg,
-                raw_message=ori_msg.extract_plain_text(),
-            ),
-        )
-
-        return ob11_event.PrivateMessageEvent(
-            time=int(event.msgTime or "0"),
-            self_id=int(bot.self_id or "0"),
-            post_type="message",
-            sub_type="friend",
-            user_id=int(event.senderUin or "0"),
-            message_id=int(event.msgId or "0"),
-            message=msg,
-            original_message=ori_msg,
-            raw_message=ori_msg.extract_plain_text(),
-            font=0,
-            sender=Sender(
-                user_id=int(event.senderUin or "0"),
-                nickname=event.sendNickName or event.sendMemberName,
-                sex="unknown",
-                age=0,
-            ),
-            message_type="private",
-            to_me=event.to_me,
-            reply=reply,
+                "time": int(event.msgTime or "0"),
+                "peer_id": int(event.senderUin or "0"),
+            },
+            {
+                "time": int(event.msgTime or "0"),
+                "self_id": int(bot.self_id or "0"),
+                "post_type": "message",
+                "sub_type": "friend",
+                "user_id": int(event.senderUin or "0"),
+                "message_id": int(event.msgId or "0"),
+                "font": 0,
+                "sender": construct_trusted(
+                    Sender,
+                    user_id=int(event.senderUin or "0"),
+                    nickname=event.sendNickName or event.sendMemberName,
+                    sex="unknown",
+                    age=0,
+                ),
+                "message_type": "private",
+                "to_me": event.to_me,
+                "reply": None,
+            },
         )
+        self._set_reply(ob11_event_, reply)
+        return ob11_event_
 
     @event_handler(red_event.MemberAddEvent)
     async def handle_member_add_event(
         self, bot: RedBot, event: red_event.MemberAddEvent
     ) -> ob11_event.GroupIncreaseNoticeEvent:
+        # 群成员数变化；bot 自己入群时群列表也会变化
+        api_cache.invalidate("get_group_list", bot.self_id)
+        group_member_cache.update_member(
+            bot.self_id,
+            int(event.peerUin or event.peerUid or "0"),
+            int(event.memberUid or "0"),
+            nick=event.memberName or "",
+        )
         return ob11_event.GroupIncreaseNoticeEvent(
             time=int(event.msgTime or "0"),
             self_id=int(bot.self_id or "0"),
@@ -561,10 +1125,35 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
             operator_id=int(event.operatorUid or "0"),
         )
 
+    @staticmethod
+    def _update_shut_up_members(
+        bot: RedBot, event: red_event.MemberMuteEvent, shut_up_time: int
+    ):
+        group_id = int(event.peerUin or event.peerUid or "0")
+        group_member_cache.update_member(
+            bot.self_id,
+            group_id,
+            int(event.member.uin or event.member.uid or "0"),
+            nick=event.member.name,
+            cardName=event.member.card,
+            role=event.member.role,
+            shutUpTime=shut_up_time,
+        )
+        # 事件同时带有操作者当前的身份
+        group_member_cache.update_member(
+            bot.self_id,
+            group_id,
+            int(event.operator.uin or event.operator.uid or "0"),
+            role=event.operator.role,
+        )
+
     @event_handler(red_event.MemberMutedEvent)
     async def handle_member_muted_event(
         self, bot: RedBot, event: red_event.MemberMutedEvent
     ) -> ob11_event.GroupBanNoticeEvent:
+        self._update_shut_up_members(
+            bot, event, int((event.start + event.duration).timestamp())
+        )
         return ob11_event.GroupBanNoticeEvent(
             time=int(datetime.now().timestamp()),
             self_id=int(bot.self_id or "0"),
@@ -581,6 +1170,7 @@ class RedOB11Pretender(OB11Pretender[RedAdapter, RedBot, red_event.Event]):
     async def handle_member_unmuted_event(
         self, bot: RedBot, event: red_event.MemberUnmuteEvent
     ) -> ob11_event.GroupBanNoticeEvent:
+        self._update_shut_up_members(bot, event, 0)
         return ob11_event.GroupBanNoticeEvent(
             time=int(datetime.now().timestamp()),
             self_id=int(bot.self_id or "0"),
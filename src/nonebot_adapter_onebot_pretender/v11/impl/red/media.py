@@ -0,0 +1,72 @@
+import os
+import re
+import hashlib
+import tempfile
+from pathlib import Path
+from base64 import b64decode
+from typing import Tuple, Union, Iterator, Optional
+
+# 必须是 4 的倍数
+_CHUNK_SIZE = 64 * 1024
+_NON_ALPHABET = re.compile(r"[^A-Za-z0-9+/=]")
+
+BASE64_PREFIX = "base64://"
+
+
+def iter_base64_decode(data: str, start: int = 0) -> Iterator[bytes]:
+    """
+    从 data[start:] 分块解码 base64，每次只复制一块，不产生整个字符串的副本。
+
+    与 b64decode 一样忽略字母表以外的字符（如换行）。
+    """
+    carry = ""
+    for i in range(start, len(data), _CHUNK_SIZE):
+        chunk = carry + data[i : i + _CHUNK_SIZE]
+        if _NON_ALPHABET.search(chunk):
+            chunk = _NON_ALPHABET.sub("", chunk)
+        n = len(chunk) - len(chunk) % 4
+        carry = chunk[n:]
+        if n:
+            yield b64decode(chunk[:n])
+    if carry:
+        yield b64decode(carry + "=" * (-len(carry) % 4))
+
+
+def decode_base64_media(
+    data: str, spool_threshold: int
+) -> Tuple[Union[bytes, Path], Optional[str]]:
+    """
+    解码 base64:// 形式的媒体。
+
+    解码后的大小不超过 spool_threshold 时直接返回 bytes；
+    否则分块写入临时文件，返回其路径与写入过程中计算的 blake2b 摘要。
+    spool_threshold 小于 0 表示总是在内存中解码。
+    临时文件由调用方在发送完成后删除。
+    """
+    start = len(BASE64_PREFIX) if data.startswith(BASE64_PREFIX) else 0
+    decoded_size = (len(data) - start) * 3 // 4
+    if spool_threshold < 0 or decoded_size <= spool_threshold:
+        return b64decode(data[start:]), None
+
+    digest = hashlib.blake2b()
+    fd, path = tempfile.mkstemp(prefix="ob_pretender_", suffix=".media")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter_base64_decode(data, start):
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return Path(path), digest.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.blake2b()
+    with path.open("rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+__all__ = ("BASE64_PREFIX", "iter_base64_decode", "decode_base64_media", "file_digest")
@@ -0,0 +1,219 @@
+import asyncio
+from time import monotonic
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Set, Dict, Tuple, Literal, Optional
+
+from nonebot.adapters.red import Bot as RedBot
+from nonebot.adapters.red.api.model import Member
+
+from ....config import conf
+from .members import iter_group_members
+
+_Key = Tuple[str, int]
+_Members = Dict[int, Member]
+
+T_Role = Literal["owner", "admin", "member"]
+
+# 同时在后台预取的群数量上限
+_MAX_PREFETCHES = 4
+
+# QQNT 的群成员身份
+_ROLES: Dict[int, T_Role] = {4: "owner", 3: "admin", 2: "member"}
+
+
+def member_role(role: Optional[int]) -> T_Role:
+    return _ROLES.get(role, "member")
+
+
+def member_user_id(member: Member) -> int:
+    return int(member.uin or member.uid or member.qid)
+
+
+@dataclass
+class GroupMemberCacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    """未命中时等待其他请求获取同一群成员列表的次数"""
+    expired: int = 0
+    updates: int = 0
+    """由群成员事件增量更新的次数"""
+    prefetch_skipped: int = 0
+    """因预取过于频繁或同时预取的群过多而跳过的预取次数"""
+
+
+class GroupMemberCache:
+    """
+    以 (bot, 群号) 为键缓存群成员列表，最多缓存 max_groups 个群，条目在 ttl 秒后过期。
+
+    群成员增加、禁言与解除禁言事件会增量更新已缓存的群，过期前不再向 Red 请求；
+    同一个群同时只有一个请求去获取成员列表。
+
+    后台预取同时最多进行 _MAX_PREFETCHES 个；每个群在 ttl 秒内最多预取一次，
+    无论成功与否，活跃的群多于 max_groups 时不会反复获取被换出的群。
+    缓存的成员字典不原地修改，更新时替换为新的字典。
+    """
+
+    def __init__(self, max_groups: int, ttl: float):
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self.stats = GroupMemberCacheStats()
+
+        self._data: "OrderedDict[_Key, Tuple[_Members, float]]" = OrderedDict()
+        self._inflight: Dict[_Key, "asyncio.Future[_Members]"] = {}
+        self._tasks: Set["asyncio.Task"] = set()
+        # 群 -> 可以再次预取的时间，按加入顺序即到期顺序排列
+        self._prefetched: "OrderedDict[_Key, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_groups > 0
+
+    def peek(self, self_id: str, group_id: int) -> Optional[_Members]:
+        """只查找缓存，过期或不存在时返回 None"""
+        key = (self_id, int(group_id))
+        item = self._data.get(key)
+        if item is None:
+            return None
+        members, expire_at = item
+        if expire_at <= monotonic():
+            del self._data[key]
+            self.stats.expired += 1
+            return None
+        self._data.move_to_end(key)
+        return members
+
+    def peek_member(
+        self, self_id: str, group_id: int, user_id: int
+    ) -> Optional[Member]:
+        members = self.peek(self_id, group_id)
+        if members is None:
+            return None
+        return members.get(int(user_id))
+
+    async def get(
+        self, bot: RedBot, group_id: int, *, refresh: bool = False
+    ) -> _Members:
+        """返回群成员列表，未命中或 refresh 为 True 时向 Red 请求"""
+        group_id = int(group_id)
+        if not refresh:
+            members = self.peek(bot.self_id, group_id)
+            if members is not None:
+                self.stats.hits += 1
+                return members
+        self.stats.misses += 1
+
+        key = (bot.self_id, group_id)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            members = {}
+            async for member in iter_group_members(bot, group_id):
+                members[member_user_id(member)] = member
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            if self.enabled:
+                self._put(key, members)
+            future.set_result(members)
+            return members
+        finally:
+            del self._inflight[key]
+
+    def prefetch(self, bot: RedBot, group_id: int):
+        """群未缓存时在后台获取成员列表，不等待结果"""
+        if not self.enabled:
+            return
+        key = (bot.self_id, int(group_id))
+        if key in self._data or key in self._inflight:
+            return
+
+        now = monotonic()
+        while self._prefetched and next(iter(self._prefetched.values())) <= now:
+            self._prefetched.popitem(last=False)
+        if key in self._prefetched or len(self._tasks) >= _MAX_PREFETCHES:
+            self.stats.prefetch_skipped += 1
+            return
+        self._prefetched[key] = now + self.ttl
+
+        async def fetch():
+            try:
+                await self.get(bot, group_id)
+            except Exception:
+                # 下次访问时会再次请求，这里不记录
+                pass
+
+        task = asyncio.create_task(fetch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _put(self, key: _Key, members: _Members):
+        self._data[key] = (members, monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_groups:
+            self._data.popitem(last=False)
+
+    def update_member(self, self_id: str, group_id: int, user_id: int, **fields):
+        """
+        更新已缓存的群中的成员，成员不存在时以 fields 新增；群未缓存时忽略
+        """
+        members = self.peek(self_id, group_id)
+        if members is None:
+            return
+        # 之前返回给调用方的成员字典不原地修改
+        key = (self_id, int(group_id))
+        members = dict(members)
+        self._data[key] = (members, self._data[key][1])
+
+        user_id = int(user_id)
+        member = members.get(user_id)
+        if member is None:
+            values = {
+                "uid": "",
+                "qid": "",
+                "uin": str(user_id),
+                "nick": "",
+                "remark": "",
+                "cardType": 0,
+                "cardName": "",
+                "role": 2,
+                "avatarPath": "",
+                "shutUpTime": 0,
+                "isDelete": False,
+            }
+            values.update(fields)
+            members[user_id] = Member.construct(**values)
+        else:
+            # 之前返回给调用方的成员对象不原地修改
+            members[user_id] = member.copy(update=fields)
+        self.stats.updates += 1
+
+    def invalidate(self, self_id: str, group_id: int):
+        self._data.pop((self_id, int(group_id)), None)
+
+
+group_member_cache = GroupMemberCache(
+    conf.ob_pretender_member_cache_size, conf.ob_pretender_member_refresh_interval
+)
+
+__all__ = (
+    "GroupMemberCache",
+    "GroupMemberCacheStats",
+    "group_member_cache",
+    "member_role",
+    "member_user_id",
+)
@@ -0,0 +1,130 @@
+import json
+import codecs
+import asyncio
+from typing import Any, AsyncIterator
+from weakref import WeakKeyDictionary
+
+from nonebot import get_driver
+from nonebot.adapters.red import Bot as RedBot
+from nonebot.adapters.red.api.model import Member
+from nonebot.adapters.onebot.v11 import ActionFailed, NetworkError
+
+from ....config import conf
+from ....webapi.red import httpx, get_http_client
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = _WHITESPACE + ",]"
+
+_semaphores: "WeakKeyDictionary[RedBot, asyncio.Semaphore]" = WeakKeyDictionary()
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    逐个解析分块到达的 JSON 数组中的元素，不需要把整个数组读入内存
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+    it = chunks.__aiter__()
+
+    while True:
+        # 跳过空白与分隔符，定位到下一个元素
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buf):
+            c = buf[pos]
+            if not started:
+                if c != "[":
+                    raise ValueError(f"expect JSON array, got {c!r}")
+                started = True
+                pos += 1
+                continue
+            if c == "]":
+                return
+            if c == ",":
+                pos += 1
+                continue
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 元素尚未完整到达
+                if eof:
+                    raise
+            else:
+                # 数字等标量可能只到达了一部分，需要看到其后的分隔符才算完整
+                if (
+                    eof
+                    or isinstance(value, (dict, list, str))
+                    or (end < len(buf) and buf[end] in _DELIMITERS)
+                ):
+                    pos = end
+                    yield value
+                    continue
+        elif eof:
+            raise ValueError("unexpected end of JSON array")
+
+        try:
+            chunk = await it.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            chunk = b""
+        buf = buf[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+
+async def _iter_members_stream(
+    bot: RedBot, group_id: int, size: int
+) -> AsyncIterator[Member]:
+    """
+    与 Red 适配器经由驱动器发出的请求一致：使用 NoneBot 的 api_timeout、跟随重定向，
+    代理同样取自环境变量；请求失败时抛出 NetworkError，响应无法解析时抛出 ActionFailed
+    """
+    try:
+        async with get_http_client().stream(
+            "POST",
+            str(bot.info.api_base / "group/getMemberList"),
+            headers={"Authorization": f"Bearer {bot.info.token}"},
+            json={"group": group_id, "size": size},
+            timeout=get_driver().config.api_timeout,
+            follow_redirects=True,
+        ) as response:
+            if response.status_code != 200:
+                raise NetworkError(f"获取群成员列表失败：HTTP {response.status_code}")
+            async for item in iter_json_array(response.aiter_bytes()):
+                yield Member.parse_obj(item["detail"])
+    except httpx.HTTPError as e:
+        raise NetworkError(f"获取群成员列表失败：{e!r}") from e
+    except (ValueError, TypeError, KeyError) as e:
+        raise ActionFailed(msg="无法解析 Red 返回的群成员列表") from e
+
+
+async def iter_group_members(
+    bot: RedBot, group_id: int, size: int = 2**16 - 1
+) -> AsyncIterator[Member]:
+    """
+    逐个产生群成员。
+
+    Red 的 getMemberList 不支持分页，安装了 httpx 时流式读取并逐个解析响应，
+    内存中不会同时存在整个响应与解析后的成员列表；
+    每个 bot 同时进行的获取数量受 ob_pretender_member_fetch_concurrency 限制，
+    大群的成员列表不会占满该 bot 的连接。
+    """
+    semaphore = _semaphores.get(bot)
+    if semaphore is None:
+        semaphore = _semaphores[bot] = asyncio.Semaphore(
+            max(conf.ob_pretender_member_fetch_concurrency, 1)
+        )
+
+    async with semaphore:
+        if httpx is None:
+            for member in await bot.get_members(group_id, size):
+                yield member
+        else:
+            async for member in _iter_members_stream(bot, group_id, size):
+                yield member
+
+
+__all__ = ("iter_json_array", "iter_group_members")
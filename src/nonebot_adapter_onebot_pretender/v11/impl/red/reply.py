@@ -0,0 +1,134 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Set, Dict, List, Tuple, Callable, Optional, Awaitable
+
+from nonebot.adapters.red import Bot as RedBot
+from nonebot.adapters.red.api.model import ChatType
+
+from ....data.ob11_msg import T_OB11Msg, load_ob11_msg, peek_ob11_msg
+
+# 同一会话在该时间窗口内未命中的回复合并为一次历史消息拉取
+_BATCH_WINDOW = 0.01
+
+_BatchKey = Tuple[str, ChatType, str]
+T_FetchHistory = Callable[[RedBot, ChatType, str, str, int], Awaitable[List[T_OB11Msg]]]
+
+
+@dataclass
+class ReplyResolverStats:
+    memory_hits: int = 0
+    store_hits: int = 0
+    history_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    """等待其他事件解析同一条消息的次数"""
+    history_fetches: int = 0
+
+
+class ReplyResolver:
+    """
+    解析消息事件中回复的消息。
+
+    先同步查找内存中的消息缓存与待写入队列；
+    未命中时在后台依次查找消息存储与 Red 的历史消息。
+    同一条消息的并发解析合并为一次，
+    同一会话短时间内的多个 Red 查询合并为一次历史消息拉取。
+    fetch_history(bot, chat_type, peer, offset_msg_id, count) 返回 offset_msg_id
+    及其之前最多 count 条消息。
+    """
+
+    def __init__(self, fetch_history: T_FetchHistory, history_count: int):
+        self.fetch_history = fetch_history
+        self.history_count = history_count
+        self.stats = ReplyResolverStats()
+
+        self._inflight: Dict[str, "asyncio.Future[Optional[T_OB11Msg]]"] = {}
+        self._batches: Dict[
+            _BatchKey, Dict[str, "asyncio.Future[Optional[T_OB11Msg]]"]
+        ] = {}
+        self._tasks: Set["asyncio.Task"] = set()
+
+    def resolve(
+        self, bot: RedBot, chat_type: ChatType, peer: str, message_id: str
+    ) -> "asyncio.Future[Optional[T_OB11Msg]]":
+        """
+        返回解析结果的 Future，消息不存在时结果为 None。
+        内存中命中时返回的 Future 已经完成。
+        """
+        message_id = str(message_id)
+        loop = asyncio.get_running_loop()
+
+        msg = peek_ob11_msg(message_id)
+        if msg is not None:
+            self.stats.memory_hits += 1
+            future = loop.create_future()
+            future.set_result(msg)
+            return future
+
+        future = self._inflight.get(message_id)
+        if future is not None:
+            self.stats.coalesced += 1
+            return future
+
+        future = loop.create_task(self._resolve(bot, chat_type, peer, message_id))
+        self._inflight[message_id] = future
+        future.add_done_callback(lambda _: self._inflight.pop(message_id, None))
+        return future
+
+    async def _resolve(
+        self, bot: RedBot, chat_type: ChatType, peer: str, message_id: str
+    ) -> Optional[T_OB11Msg]:
+        msg = await load_ob11_msg(message_id)
+        if msg is not None:
+            self.stats.store_hits += 1
+            return msg
+
+        key = (bot.self_id, chat_type, peer)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = {}
+            task = asyncio.create_task(self._run_batch(bot, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        future = batch.get(message_id)
+        if future is None:
+            future = batch[message_id] = asyncio.get_running_loop().create_future()
+
+        msg = await asyncio.shield(future)
+        if msg is not None:
+            self.stats.history_hits += 1
+        else:
+            self.stats.misses += 1
+        return msg
+
+    async def _run_batch(self, bot: RedBot, key: _BatchKey):
+        await asyncio.sleep(_BATCH_WINDOW)
+        pending = self._batches.pop(key)
+        _, chat_type, peer = key
+
+        try:
+            # 从最新的目标消息往前拉取，一次尽量覆盖更多的目标消息；
+            # 每轮至少确定 offset 这一条的结果，循环必然结束
+            while pending:
+                offset = max(pending, key=int)
+                self.stats.history_fetches += 1
+                messages = await self.fetch_history(
+                    bot, chat_type, peer, offset, self.history_count
+                )
+                for msg in messages:
+                    future = pending.pop(str(msg.message_id), None)
+                    if future is not None:
+                        future.set_result(msg)
+                future = pending.pop(offset, None)
+                if future is not None:
+                    future.set_result(None)
+        except asyncio.CancelledError:
+            for future in pending.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in pending.values():
+                future.set_exception(e)
+
+
+__all__ = ("ReplyResolver", "ReplyResolverStats")
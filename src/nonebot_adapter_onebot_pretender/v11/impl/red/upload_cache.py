@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from time import monotonic
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import (
+    Dict,
+    Tuple,
+    TypeVar,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Awaitable,
+    cast,
+)
+
+from nonebot.utils import run_sync
+from nonebot.drivers import Request
+from nonebot.adapters.red import Bot as RedBot
+from nonebot.adapters.red import Message as RedMsg
+from nonebot.adapters.red.api.model import UploadResponse
+from nonebot.adapters.red.message import MediaMessageSegment
+
+from ....config import conf
+from .media import file_digest, decode_base64_media
+
+T = TypeVar("T")
+
+_Key = Tuple[str, str, str]
+
+
+@dataclass
+class UploadCacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    """未命中时等待其他请求上传同一文件的次数"""
+    expired: int = 0
+    invalidated: int = 0
+    """发送被 Red 拒绝而作废的次数"""
+
+
+class UploadCache:
+    """
+    以 (bot, 媒体类型, 文件摘要) 为键缓存 Red upload 的结果，
+    相同内容的媒体重复发送时不再上传。
+
+    Red 上传后的文件可能被清理，因此条目有过期时间；
+    使用缓存的消息发送失败时由 send_with_media 作废相关条目并重新上传。
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = UploadCacheStats()
+
+        self._data: "OrderedDict[_Key, Tuple[UploadResponse, float]]" = OrderedDict()
+        self._inflight: Dict[_Key, "asyncio.Future[UploadResponse]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: _Key) -> Optional[UploadResponse]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        resp, expire_at = item
+        if expire_at <= monotonic():
+            del self._data[key]
+            self.stats.expired += 1
+            return None
+        self._data.move_to_end(key)
+        return resp
+
+    def put(self, key: _Key, resp: UploadResponse):
+        self._data[key] = (resp, monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: _Key):
+        if self._data.pop(key, None) is not None:
+            self.stats.invalidated += 1
+
+    async def upload(
+        self, key: _Key, do_upload: Callable[[], Awaitable[UploadResponse]]
+    ) -> Tuple[UploadResponse, bool]:
+        """
+        返回上传结果以及是否来自缓存
+        """
+        resp = self.get(key)
+        if resp is not None:
+            self.stats.hits += 1
+            return resp, True
+        self.stats.misses += 1
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(future), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            resp = await do_upload()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            self.put(key, resp)
+            future.set_result(resp)
+            return resp, False
+        finally:
+            del self._inflight[key]
+
+
+upload_cache = UploadCache(
+    conf.ob_pretender_upload_cache_size, conf.ob_pretender_upload_cache_ttl
+)
+
+
+class CachedMediaMessageSegment(MediaMessageSegment):
+    """
+    上传时使用 upload_cache 的媒体消息段。
+
+    data["file"] 除 bytes 外也可以是 Path，此时上传时才从文件流式读取；
+    也可以是 base64:// 形式的字符串，上传时才在线程中解码，不阻塞事件循环。
+    spooled 为 True 表示该文件是解码 base64 时写入的临时文件，发送完成后删除。
+    """
+
+    cache_key: Optional[_Key] = None
+    cache_hit: bool = False
+    digest: Optional[str] = None
+    spooled: bool = False
+
+    async def _upload_file(self, bot: RedBot, path: Path) -> UploadResponse:
+        with path.open("rb") as f:
+            resp = await bot.adapter.request(
+                Request(
+                    "POST",
+                    bot.info.api_base / "upload",
+                    headers={"Authorization": f"Bearer {bot.info.token}"},
+                    files={f"file_{self.type}": (f"file_{self.type}", f)},
+                )
+            )
+        return UploadResponse.parse_raw(resp.content)
+
+    def _decode_base64(self):
+        # 在线程中写回结果，等待解码的上传被取消时临时文件仍由 release 删除
+        file, self.digest = decode_base64_media(
+            self.data["file"], conf.ob_pretender_base64_spool_threshold
+        )
+        self.data["file"] = file
+        self.spooled = isinstance(file, Path)
+
+    async def upload(self, bot: RedBot) -> UploadResponse:
+        if isinstance(self.data.get("file"), str):
+            await run_sync(self._decode_base64)()
+
+        file = self.data.get("file")
+        if isinstance(file, Path):
+
+            def do_upload():
+                return self._upload_file(bot, file)
+
+        else:
+
+            def do_upload():
+                return super(CachedMediaMessageSegment, self).upload(bot)
+
+        if not upload_cache.enabled or not isinstance(file, (bytes, Path)):
+            return await do_upload()
+
+        if self.digest is None:
+            if isinstance(file, Path):
+                self.digest = await run_sync(file_digest)(file)
+            else:
+                self.digest = hashlib.blake2b(file).hexdigest()
+
+        self.cache_key = (bot.self_id, self.type, self.digest)
+        resp, self.cache_hit = await upload_cache.upload(self.cache_key, do_upload)
+        return resp
+
+    def release(self):
+        if self.spooled:
+            cast(Path, self.data["file"]).unlink(missing_ok=True)
+            self.spooled = False
+
+    @classmethod
+    def from_segment(cls, seg: MediaMessageSegment) -> "CachedMediaMessageSegment":
+        return cls(seg.type, seg.data)
+
+
+def _media_segments(messages: Iterable[RedMsg]) -> Iterator[CachedMediaMessageSegment]:
+    for message in messages:
+        for seg in message:
+            if isinstance(seg, CachedMediaMessageSegment):
+                yield seg
+
+
+def release_media(*messages: RedMsg):
+    """删除消息中解码 base64 时写入的临时文件"""
+    for seg in _media_segments(messages):
+        seg.release()
+
+
+def invalidate_cached_uploads(*messages: RedMsg) -> bool:
+    """作废消息中使用的上传缓存条目，返回是否有条目被作废"""
+    stale = [seg for seg in _media_segments(messages) if seg.cache_hit]
+    for seg in stale:
+        upload_cache.invalidate(seg.cache_key)
+        seg.cache_hit = False
+    return bool(stale)
+
+
+async def send_with_media(send: Callable[[], Awaitable[T]], *messages: RedMsg) -> T:
+    """
+    发送可能包含媒体的消息。
+
+    使用了缓存上传结果的消息发送失败时，作废这些条目并重新上传后再发送一次；
+    无论成功与否，发送结束后删除临时文件。
+    """
+    try:
+        try:
+            return await send()
+        except Exception:
+            if not invalidate_cached_uploads(*messages):
+                raise
+        return await send()
+    finally:
+        release_media(*messages)
+
+
+__all__ = (
+    "UploadCache",
+    "UploadCacheStats",
+    "upload_cache",
+    "CachedMediaMessageSegment",
+    "release_media",
+    "send_with_media",
+    "invalidate_cached_uploads",
+)
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from abc import ABCMeta, abstractmethod
 from typing import (
     TYPE_CHECKING,
@@ -5,6 +6,7 @@ from typing import (
     Dict,
     Type,
     Tuple,
+    Union,
     Generic,
     TypeVar,
     Callable,
@@ -12,7 +14,7 @@ from typing import (
     ParamSpec,
 )
 
-from nonebot import logger
+from nonebot import logger, get_driver
 from nonebot.adapters import Bot as BaseBot
 from nonebot.adapters import Event as BaseEvent
 from nonebot.adapters import Adapter as BaseAdapter
@@ -20,6 +22,9 @@ from nonebot.adapters.onebot.v11 import Bot as OB11Bot
 from nonebot.adapters.onebot.v11 import ApiNotAvailable
 from nonebot.adapters.onebot.v11 import Event as OB11Event
 
+from ..config import conf
+from .converter import SegmentConverterRegistry
+
 if TYPE_CHECKING:
     from .adapter import Adapter as OB11PretenderAdapter
 
@@ -34,6 +39,31 @@ T_ApiHandler = Callable[["OB11Pretender", T_ActualBot, ...], Any]
 T_EventHandler = Callable[["OB11Pretender", T_ActualBot, T_ActualEvent], OB11Event]
 
 
+@lru_cache(maxsize=None)
+def _level_no(level: str) -> int:
+    return logger.level(level).no
+
+
+def is_log_level_enabled(level: str) -> bool:
+    """
+    判断是否需要生成该等级的日志内容。
+
+    NoneBot 的默认 handler 以 level=0 注册、在 filter 中按 log_level 过滤，
+    loguru 的 opt(lazy=True) 因此总会求值，而 loguru 没有公开各 handler 的等级，
+    这里与 ob_pretender_log_level（未设置时为 NoneBot 的 log_level）比较；
+    无法判断时视为需要生成。
+    """
+    try:
+        min_level = conf.ob_pretender_log_level
+        if min_level is None:
+            min_level = get_driver().config.log_level
+        if isinstance(min_level, str):
+            min_level = _level_no(min_level)
+        return _level_no(level) >= min_level
+    except Exception:
+        return True
+
+
 class OB11PretenderMeta(ABCMeta):
     def __new__(
         mcls, name: str, base: Tuple[type, ...], namespace: dict, *args, **kwargs
@@ -53,6 +83,25 @@ class OB11PretenderMeta(ABCMeta):
                 event_handlers[item.__event_type__] = item
 
         namespace["_event_handler_mapping"] = event_handlers
+        namespace["_event_handler_cache"] = {}
+
+        # 消息段转换函数会被子类继承，子类可以覆盖或增加
+        for attr, marker in (
+            ("outgoing_converters", "__outgoing_segment_types__"),
+            ("incoming_converters", "__incoming_segment_types__"),
+        ):
+            registry = SegmentConverterRegistry(conf.ob_pretender_converter_timing)
+            for b in reversed(base):
+                inherited = getattr(b, attr, None)
+                if inherited is not None:
+                    for seg_type, converter in inherited.converters.items():
+                        registry.register(seg_type, converter)
+
+            for item in namespace.values():
+                for seg_type in getattr(item, marker, ()):
+                    registry.register(seg_type, item)
+
+            namespace[attr] = registry
 
         return super().__new__(mcls, name, base, namespace, **kwargs)
 
@@ -62,12 +111,31 @@ class OB11Pretender(
 ):
     _api_call_handler_mapping: Dict[str, T_ApiHandler]
     _event_handler_mapping: Dict[Type[BaseEvent], T_EventHandler]
+    _event_handler_cache: Dict[Type[BaseEvent], Optional[T_EventHandler]]
+    """具体事件类型到按 MRO 解析出的处理函数，None 表示没有对应的处理函数"""
+
+    outgoing_converters: SegmentConverterRegistry
+    """OB11 消息段到实际协议消息段的转换函数，第三方可以调用 register 增加或覆盖"""
+    incoming_converters: SegmentConverterRegistry
+    """实际协议消息段到 OB11 消息段的转换函数，第三方可以调用 register 增加或覆盖"""
 
     def __init__(self, adapter: "OB11PretenderAdapter[T_ActualAdapter, T_ActualBot]"):
         self.adapter = adapter
 
     @classmethod
-    def log(cls, level: str, content: str, exc: Optional[BaseException] = None):
+    def log(
+        cls,
+        level: str,
+        content: Union[str, Callable[[], str]],
+        exc: Optional[BaseException] = None,
+    ):
+        """
+        content 为函数时，只有在该日志等级会被输出时才调用它生成日志内容
+        """
+        if callable(content):
+            if not is_log_level_enabled(level):
+                return
+            content = content()
         logger.opt(exception=exc).log(level, content)
 
     @classmethod
@@ -82,26 +150,34 @@ class OB11Pretender(
         actual_bot = self.adapter.get_actual_bot(bot)
         return await handler(self, actual_bot, **data)
 
-    async def handle_event(
-        self, bot: T_ActualBot, event: T_ActualEvent
-    ) -> Optional[OB11Event]:
-        self.log(
-            "DEBUG",
-            f"Receive {self.adapter.actual_adapter.get_name()}"
-            f" {type(event).__name__}: " + str(event),
-        )
-        self.log(
-            "TRACE",
-            f"{self.adapter.actual_adapter.get_name()}"
-            f" {type(event).__name__}: " + str(event.json()),
-        )
+    @classmethod
+    def resolve_event_handler(
+        cls, event_type: Type[BaseEvent]
+    ) -> Optional[T_EventHandler]:
+        """
+        按 MRO 查找 event_type 的处理函数，结果按具体事件类型缓存
+        """
+        try:
+            return cls._event_handler_cache[event_type]
+        except KeyError:
+            pass
 
         handler = None
-        for t_event in type(event).mro():
-            handler = self._event_handler_mapping.get(t_event)
+        for t_event in event_type.__mro__:
+            handler = cls._event_handler_mapping.get(t_event)
             if handler is not None:
                 break
+        cls._event_handler_cache[event_type] = handler
+        return handler
+
+    async def handle_event(
+        self, bot: T_ActualBot, event: T_ActualEvent
+    ) -> Optional[OB11Event]:
+        name = self.adapter.actual_adapter.get_name()
+        self.log("DEBUG", lambda: f"Receive {name} {type(event).__name__}: {event}")
+        self.log("TRACE", lambda: f"{name} {type(event).__name__}: {event.json()}")
 
+        handler = self.resolve_event_handler(type(event))
         if handler is None:
             return None
 
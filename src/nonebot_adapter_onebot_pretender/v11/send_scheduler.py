@@ -0,0 +1,370 @@
+import asyncio
+from time import monotonic
+from dataclasses import dataclass
+from collections import OrderedDict, deque
+from typing import (
+    Any,
+    Set,
+    Dict,
+    Deque,
+    Tuple,
+    Literal,
+    TypeVar,
+    Callable,
+    Hashable,
+    Optional,
+    Awaitable,
+)
+
+from nonebot.adapters.onebot.v11 import ActionFailed
+
+from ..config import conf
+
+T = TypeVar("T")
+
+T_Priority = Literal["interactive", "bulk"]
+T_Overflow = Literal["wait", "reject", "drop_oldest"]
+
+LANES: Tuple[T_Priority, ...] = ("interactive", "bulk")
+"""优先级从高到低"""
+
+# 超过该数量时清理已经回满、没有待发送消息的目标令牌桶
+_MAX_IDLE_BUCKETS = 4096
+
+
+class TokenBucket:
+    """rate 不大于 0 表示不限速"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """距离有可用令牌还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+@dataclass
+class SendLaneStats:
+    sent: int = 0
+    failed: int = 0
+    rejected: int = 0
+    """队满被拒绝的次数"""
+    dropped: int = 0
+    """队满时被丢弃的最旧消息数"""
+    wait_total: float = 0.0
+    """累计排队时间（秒）"""
+    wait_max: float = 0.0
+
+    @property
+    def wait_average(self) -> float:
+        n = self.sent + self.failed
+        if n == 0:
+            return 0.0
+        return self.wait_total / n
+
+
+class _Job:
+    __slots__ = ("target", "lane", "func", "discard", "future", "enqueued_at")
+
+    def __init__(
+        self,
+        target: Hashable,
+        lane: T_Priority,
+        func: Callable[[], Awaitable[Any]],
+        discard: Optional[Callable[[], None]],
+        future: "asyncio.Future[Any]",
+    ):
+        self.target = target
+        self.lane = lane
+        self.func = func
+        self.discard = discard
+        self.future = future
+        self.enqueued_at = monotonic()
+
+    def drop(self):
+        if self.discard is not None:
+            self.discard()
+
+
+class _BotQueue:
+    def __init__(self, rate: float, burst: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.lanes: Dict[T_Priority, "OrderedDict[Hashable, Deque[_Job]]"] = {
+            lane: OrderedDict() for lane in LANES
+        }
+        self.sizes: Dict[T_Priority, int] = dict.fromkeys(LANES, 0)
+        self.busy: Set[Hashable] = set()
+        self.target_buckets: Dict[Hashable, TokenBucket] = {}
+        self.wakeup = asyncio.Event()
+        self.space = asyncio.Event()
+        self.task: Optional["asyncio.Task"] = None
+
+
+class SendScheduler:
+    """
+    发送消息的调度器。
+
+    每个 bot 与每个发送目标各有一个令牌桶，
+    所有 bot 同时进行的发送数不超过 concurrency；
+    rate、target_rate、concurrency、queue_size 不大于 0 时不做对应的限制。
+    interactive 队列中的消息总是先于 bulk 队列发送，同一队列中的不同目标轮流发送，
+    同一目标同时只发送一条以保证顺序。
+    每个 bot 每个队列最多排队 queue_size 条，
+    队满时按 overflow 等待、拒绝或丢弃最旧的消息。
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float,
+        burst: int,
+        target_rate: float,
+        target_burst: int,
+        concurrency: int,
+        queue_size: int,
+        overflow: T_Overflow,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.target_rate = target_rate
+        self.target_burst = target_burst
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.stats: Dict[T_Priority, SendLaneStats] = {
+            lane: SendLaneStats() for lane in LANES
+        }
+
+        self._concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[str, _BotQueue] = {}
+
+    def queued(self, self_id: Optional[str] = None) -> Dict[T_Priority, int]:
+        """排队中的消息数"""
+        result = dict.fromkeys(LANES, 0)
+        for bot_id, queue in self._queues.items():
+            if self_id is None or bot_id == self_id:
+                for lane in LANES:
+                    result[lane] += queue.sizes[lane]
+        return result
+
+    async def submit(
+        self,
+        self_id: str,
+        target: Hashable,
+        func: Callable[[], Awaitable[T]],
+        priority: T_Priority = "interactive",
+        *,
+        discard: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """
+        排队等待发送，轮到时调用 func 并返回其结果。
+
+        消息因队满被拒绝、丢弃或调用方取消而没有发送时调用 discard。
+        """
+        if priority not in LANES:
+            raise ValueError(f"未知的发送优先级 {priority}")
+        if self._semaphore is None and self._concurrency > 0:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+
+        queue = self._queues.get(self_id)
+        if queue is None:
+            queue = self._queues[self_id] = _BotQueue(self.rate, self.burst)
+
+        try:
+            await self._reserve(queue, priority)
+        except BaseException:
+            if discard is not None:
+                discard()
+            raise
+
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(target, priority, func, discard, future)
+        jobs = queue.lanes[priority].get(target)
+        if jobs is None:
+            jobs = queue.lanes[priority][target] = deque()
+        jobs.append(job)
+        queue.sizes[priority] += 1
+
+        queue.wakeup.set()
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._dispatch(self_id, queue))
+
+        return await future
+
+    async def _reserve(self, queue: _BotQueue, lane: T_Priority):
+        if self.queue_size <= 0:
+            return
+        while queue.sizes[lane] >= self.queue_size:
+            if self.overflow == "reject":
+                self.stats[lane].rejected += 1
+                raise ActionFailed(msg="发送队列已满")
+            if self.overflow == "drop_oldest":
+                self._drop_oldest(queue, lane)
+                continue
+            queue.space.clear()
+            await queue.space.wait()
+
+    def _drop_oldest(self, queue: _BotQueue, lane: T_Priority):
+        targets = queue.lanes[lane]
+        target = min(targets, key=lambda t: targets[t][0].enqueued_at)
+        job = self._pop(queue, lane, target)
+        job.drop()
+        if not job.future.done():
+            job.future.set_exception(ActionFailed(msg="发送队列已满，消息被丢弃"))
+            job.future.exception()
+        self.stats[lane].dropped += 1
+
+    def _pop(self, queue: _BotQueue, lane: T_Priority, target: Hashable) -> _Job:
+        targets = queue.lanes[lane]
+        jobs = targets[target]
+        job = jobs.popleft()
+        if jobs:
+            # 轮转到队尾，让其他目标先发送
+            targets.move_to_end(target)
+        else:
+            del targets[target]
+        queue.sizes[lane] -= 1
+        queue.space.set()
+        return job
+
+    def _target_bucket(self, queue: _BotQueue, target: Hashable) -> TokenBucket:
+        bucket = queue.target_buckets.get(target)
+        if bucket is None:
+            if len(queue.target_buckets) >= _MAX_IDLE_BUCKETS:
+                now = monotonic()
+                for t, b in list(queue.target_buckets.items()):
+                    if b.full(now) and t not in queue.busy:
+                        del queue.target_buckets[t]
+            bucket = queue.target_buckets[target] = TokenBucket(
+                self.target_rate, self.target_burst
+            )
+        return bucket
+
+    def _next_job(self, queue: _BotQueue) -> Tuple[Optional[_Job], Optional[float]]:
+        """
+        返回下一条可以发送的消息；
+        没有时返回需要等待的秒数，None 表示等待新的消息或发送完成
+        """
+        now = monotonic()
+        bot_delay = queue.bucket.delay(now)
+        min_delay = None
+
+        for lane in LANES:
+            targets = queue.lanes[lane]
+            for target in list(targets):
+                jobs = targets[target]
+                # 清理调用方已经取消的消息
+                while jobs and jobs[0].future.done():
+                    self._pop(queue, lane, target).drop()
+                if target not in targets or target in queue.busy:
+                    continue
+
+                delay = max(bot_delay, self._target_bucket(queue, target).delay(now))
+                if delay > 0:
+                    if min_delay is None or delay < min_delay:
+                        min_delay = delay
+                    continue
+
+                queue.bucket.take(now)
+                queue.target_buckets[target].take(now)
+                return self._pop(queue, lane, target), None
+
+        return None, min_delay
+
+    async def _dispatch(self, self_id: str, queue: _BotQueue):
+        try:
+            while True:
+                queue.wakeup.clear()
+                await self._acquire()
+                job, delay = self._next_job(queue)
+                if job is not None:
+                    queue.busy.add(job.target)
+                    asyncio.create_task(self._run(queue, job))
+                    continue
+
+                self._release()
+                if delay is None and not any(queue.sizes.values()) and not queue.busy:
+                    return
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            queue.task = None
+
+    async def _acquire(self):
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+
+    def _release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    async def _run(self, queue: _BotQueue, job: _Job):
+        stats = self.stats[job.lane]
+        wait = monotonic() - job.enqueued_at
+        stats.wait_total += wait
+        stats.wait_max = max(stats.wait_max, wait)
+
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except BaseException as e:
+            stats.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            stats.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            queue.busy.discard(job.target)
+            self._release()
+            queue.wakeup.set()
+
+
+send_scheduler = SendScheduler(
+    rate=conf.ob_pretender_send_rate,
+    burst=conf.ob_pretender_send_burst,
+    target_rate=conf.ob_pretender_send_target_rate,
+    target_burst=conf.ob_pretender_send_target_burst,
+    concurrency=conf.ob_pretender_send_concurrency,
+    queue_size=conf.ob_pretender_send_queue_size,
+    overflow=conf.ob_pretender_send_overflow,
+)
+
+__all__ = (
+    "LANES",
+    "TokenBucket",
+    "SendLaneStats",
+    "SendScheduler",
+    "send_scheduler",
+)
@@ -1,20 +1,345 @@
-from typing import cast
+import os
+import json
+import hashlib
+import mimetypes
+from pathlib import Path
+from dataclasses import dataclass
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlsplit
+from typing import Dict, Tuple, Callable, Optional, Awaitable, AsyncIterator, cast
 
-from fastapi import Response
 from starlette import status
-from nonebot import get_app, get_bot
+from nonebot.utils import run_sync
+from fastapi import Request, Response
+from nonebot.adapters.red import Bot as RedBot
 from starlette.responses import StreamingResponse
 from nonebot.adapters.red.api.model import ChatType
+from nonebot.adapters.red.api.handle import HANDLERS
 from nonebot.adapters.red import Adapter as RedAdapter
+from nonebot import logger, get_app, get_bot, get_driver
 
+from ..config import conf
+from ..data.ob11_msg import load_ob11_msg
+from ..data.media_cache import media_cache
 from ..v11.adapter import Adapter as OB11PretenderAdapter
 
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
 app = get_app()
 
 
-@app.get("/ob_pretender/red/media")
+@dataclass
+class MediaStats:
+    local: int = 0
+    """直接发送本地文件的次数"""
+    upstream: int = 0
+    """通过 Red fetchRichMedia 获取的次数"""
+    upstream_failed: int = 0
+
+
+media_stats = MediaStats()
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """直接请求 Red HTTP API 时共用的连接池，需要安装 httpx"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(conf.ob_pretender_media_timeout)
+        )
+    return _client
+
+
+@get_driver().on_shutdown
+async def _close_client():
+    if _client is not None:
+        await _client.aclose()
+
+
+_MAGIC_MEDIA_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"#!SILK", "audio/silk"),
+    (b"\x02#!SILK", "audio/silk"),
+    (b"#!AMR", "audio/amr"),
+    (b"ID3", "audio/mpeg"),
+)
+
+
+def _sniff_media_type(head: bytes) -> Optional[str]:
+    for magic, media_type in _MAGIC_MEDIA_TYPES:
+        if head.startswith(magic):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+    return None
+
+
+def _sniff_file(path: Path) -> Optional[str]:
+    with open(path, "rb") as f:
+        return _sniff_media_type(f.read(16))
+
+
+def _parse_range(
+    value: Optional[str], size: Optional[int]
+) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节区间，返回闭区间 (start, end)；不满足条件时返回 None 表示忽略 Range。
+
+    区间无法满足时抛出 ValueError。
+    """
+    if not value or size is None or not value.startswith("bytes="):
+        return None
+    spec = value[len("bytes=") :].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (x.strip() for x in spec.split("-", 1))
+    try:
+        if first == "":
+            # bytes=-N，最后 N 个字节
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise ValueError(value)
+    return start, end
+
+
+async def _slice(
+    chunks: AsyncIterator[bytes], start: int, end: int
+) -> AsyncIterator[bytes]:
+    """从数据流中截取 [start, end] 字节"""
+    pos = 0
+    async for chunk in chunks:
+        chunk_start = pos
+        pos += len(chunk)
+        if pos <= start:
+            continue
+        lo = max(start - chunk_start, 0)
+        hi = min(end + 1 - chunk_start, len(chunk))
+        if lo < hi:
+            yield chunk[lo:hi]
+        if pos > end:
+            break
+
+
+class _MediaMeta:
+    __slots__ = ("media_type", "path", "time")
+
+    def __init__(
+        self, media_type: Optional[str], path: Optional[Path], time: Optional[int]
+    ):
+        self.media_type = media_type
+        self.path = path
+        self.time = time
+
+    def local_file(self) -> Optional[Path]:
+        """Red 已将文件下载到本地且可读时返回其路径"""
+        if self.path is None:
+            return None
+        try:
+            if self.path.is_file() and self.path.stat().st_size > 0:
+                if os.access(self.path, os.R_OK):
+                    return self.path
+        except OSError:
+            pass
+        return None
+
+
+_SEGMENT_MEDIA_TYPES = {
+    "image": "image/jpeg",
+    "video": "video/mp4",
+    "record": "audio/silk",
+}
+
+
+async def _find_media_meta(msg_id: str, element_id: str) -> _MediaMeta:
+    """从存储的消息中找到对应的媒体消息段，得到本地路径、类型与消息时间"""
+    msg = await load_ob11_msg(msg_id)
+    if msg is None:
+        return _MediaMeta(None, None, None)
+
+    for seg in msg.message:
+        if seg.type not in _SEGMENT_MEDIA_TYPES:
+            continue
+        query = parse_qs(urlsplit(seg.data.get("url") or "").query)
+        if element_id not in query.get("elementId", ()):
+            continue
+
+        file = seg.data.get("file") or ""
+        path = (
+            Path(file.removeprefix("file://")) if file.startswith("file://") else None
+        )
+        media_type = None
+        if path is not None:
+            media_type = mimetypes.guess_type(path.name)[0]
+        return _MediaMeta(
+            media_type or _SEGMENT_MEDIA_TYPES[seg.type], path, msg.time or None
+        )
+
+    return _MediaMeta(None, None, msg.time or None)
+
+
+def _make_etag(*parts: object) -> str:
+    # 消息中媒体元素的内容不会改变，由参数即可确定
+    digest = hashlib.sha1("\0".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+class _Upstream:
+    """对 Red fetchRichMedia 的流式请求"""
+
+    def __init__(self, chunks: AsyncIterator[bytes], size: Optional[int], close):
+        self.chunks = chunks
+        self.size = size
+        self.close = close
+
+
+async def _open_upstream(bot: RedBot, data: Dict) -> _Upstream:
+    if httpx is None:
+        content = await bot.call_api("fetch_media", **data)
+
+        async def chunks():
+            chunk_size = conf.ob_pretender_media_chunk_size
+            for i in range(0, len(content), chunk_size):
+                yield content[i : i + chunk_size]
+
+        async def close():
+            pass
+
+        return _Upstream(chunks(), len(content), close)
+
+    api, method, platform_data = HANDLERS["fetch_media"](data)
+    request = get_http_client().build_request(
+        method,
+        str(bot.info.api_base / api),
+        headers={
+            "Authorization": f"Bearer {bot.info.token}",
+            "Content-Type": "application/json",
+        },
+        content=json.dumps(platform_data),
+    )
+    response = await get_http_client().send(request, stream=True)
+    try:
+        response.raise_for_status()
+    except Exception:
+        await response.aclose()
+        raise
+
+    size = response.headers.get("Content-Length")
+    return _Upstream(
+        response.aiter_bytes(conf.ob_pretender_media_chunk_size),
+        int(size) if size is not None and size.isdigit() else None,
+        response.aclose,
+    )
+
+
+async def _iter_file(
+    path: Path, start: int, end: Optional[int]
+) -> AsyncIterator[bytes]:
+    """分块读取文件的 [start, end] 字节，end 为 None 时直到末尾"""
+    chunk_size = conf.ob_pretender_media_chunk_size
+    f = await run_sync(open)(path, "rb")
+    try:
+        await run_sync(f.seek)(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await run_sync(f.read)(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+async def _noop():
+    pass
+
+
+async def _media_response(
+    request: Request,
+    headers: Dict[str, str],
+    media_type: Optional[str],
+    size: Optional[int],
+    body: Callable[[int, Optional[int]], AsyncIterator[bytes]],
+    close: Callable[[], Awaitable[None]] = _noop,
+) -> Response:
+    """
+    按 Range 与 If-Range 返回完整或部分内容，HEAD 请求只返回头部。
+
+    body(start, end) 产生 [start, end] 字节，end 为 None 时直到末尾；
+    不需要响应体时调用 close 释放资源。
+    """
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range != headers["ETag"]:
+        range_header = None
+
+    try:
+        byte_range = _parse_range(range_header, size)
+    except ValueError:
+        await close()
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers=headers,
+        )
+
+    if byte_range is None:
+        status_code = status.HTTP_200_OK
+        start, end = 0, None
+        if size is not None:
+            headers["Content-Length"] = str(size)
+    else:
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        await close()
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    return StreamingResponse(
+        body(start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+def _file_response(
+    request: Request, headers: Dict[str, str], media_type: Optional[str], path: Path
+) -> Awaitable[Response]:
+    return _media_response(
+        request,
+        headers,
+        media_type,
+        path.stat().st_size,
+        lambda start, end: _iter_file(path, start, end),
+    )
+
+
+@app.api_route("/ob_pretender/red/media", methods=["GET", "HEAD"])
 async def get_red_media(
-    response: Response,
+    request: Request,
     botId: str,
     msgId: str,
     chatType: ChatType,
@@ -25,23 +350,86 @@ async def get_red_media(
 ):
     bot = get_bot(botId)
     if bot is None or not isinstance(bot.adapter, OB11PretenderAdapter):
-        response.status_code = status.HTTP_404_NOT_FOUND
-        return
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
 
     bot = cast(OB11PretenderAdapter, bot.adapter).get_actual_bot(bot)
     if bot.type != RedAdapter.get_name():
-        response.status_code = status.HTTP_404_NOT_FOUND
-        return
-
-    async def fetch():
-        yield await bot.call_api(
-            "fetch_media",
-            msg_id=msgId,
-            chat_type=chatType,
-            target=target,
-            element_id=elementId,
-            thumb_size=thumbSize,
-            download_type=downloadType,
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    meta = await _find_media_meta(msgId, elementId)
+    headers = {
+        "ETag": _make_etag(msgId, elementId, thumbSize, downloadType),
+        "Accept-Ranges": "bytes",
+    }
+    if meta.time is not None:
+        headers["Last-Modified"] = formatdate(meta.time, usegmt=True)
+
+    if request.headers.get("If-None-Match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # 缩略图与原文件不同，只有原文件才能直接发送本地文件
+    local_file = meta.local_file() if thumbSize == 0 else None
+    if local_file is not None:
+        media_stats.local += 1
+        return await _file_response(request, headers, meta.media_type, local_file)
+
+    key = (msgId, elementId, thumbSize, downloadType)
+    cached = media_cache.lookup(key) if media_cache.enabled else None
+    if cached is not None:
+        media_type = _sniff_file(cached) or meta.media_type
+        return await _file_response(request, headers, media_type, cached)
+
+    if request.method == "HEAD":
+        # 不为 HEAD 请求获取媒体，也就不知道大小
+        response = Response(
+            status_code=status.HTTP_200_OK,
+            headers=headers,
+            media_type=meta.media_type,
         )
+        del response.headers["Content-Length"]
+        return response
+
+    data = {
+        "msg_id": msgId,
+        "chat_type": chatType,
+        "target": target,
+        "element_id": elementId,
+        "thumb_size": thumbSize,
+        "download_type": downloadType,
+    }
+
+    media_stats.upstream += 1
+    try:
+        upstream = await _open_upstream(bot, data)
+    except Exception as e:
+        media_stats.upstream_failed += 1
+        logger.opt(exception=e).warning(f"Failed to fetch media {msgId}/{elementId}")
+        return Response(status_code=status.HTTP_502_BAD_GATEWAY, headers=headers)
+
+    # 读取第一块以确定类型
+    head = b""
+    async for chunk in upstream.chunks:
+        head = chunk
+        break
+    media_type = (
+        _sniff_media_type(head) or meta.media_type or "application/octet-stream"
+    )
+
+    async def full() -> AsyncIterator[bytes]:
+        try:
+            if head:
+                yield head
+            async for chunk in upstream.chunks:
+                yield chunk
+        finally:
+            await upstream.close()
+
+    def body(start: int, end: Optional[int]) -> AsyncIterator[bytes]:
+        if start == 0 and (end is None or end + 1 == upstream.size):
+            # 完整的响应边发送边写入缓存；部分请求不写入缓存
+            return media_cache.tee(key, full()) if media_cache.enabled else full()
+        return _slice(full(), start, end)
 
-    return StreamingResponse(fetch())
+    return await _media_response(
+        request, headers, media_type, upstream.size, body, upstream.close
+    )
@@ -0,0 +1,44 @@
+import tempfile
+
+import pytest
+import nonebot
+
+# 被测模块在导入时读取 NoneBot 的配置，必须先初始化
+nonebot.init(localstore_data_dir=tempfile.mkdtemp())
+
+from nonebot_adapter_onebot_pretender.data import ob11_msg
+from nonebot_adapter_onebot_pretender.data.lru_cache import LRUCache
+from nonebot_adapter_onebot_pretender.data.write_queue import WriteBehindQueue
+from nonebot_adapter_onebot_pretender.data.backends import (
+    MsgStoreBackend,
+    create_msg_store_backend,
+)
+
+
+@pytest.fixture(params=["unqlite", "sqlite"])
+def msg_store(request, tmp_path):
+    store = create_msg_store_backend(request.param, tmp_path)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def ob11_msg_store(msg_store, monkeypatch) -> MsgStoreBackend:
+    """
+    让 ob11_msg 使用独立的存储、缓存与写入队列，
+    写入队列在每个测试的事件循环中重新创建
+    """
+    monkeypatch.setattr(ob11_msg, "msg_store", msg_store)
+    monkeypatch.setattr(ob11_msg, "_cache", LRUCache(1024, 1024 * 1024))
+    monkeypatch.setattr(
+        ob11_msg,
+        "_write_queue",
+        WriteBehindQueue(
+            ob11_msg._save_ob11_msgs,
+            batch_size=16,
+            flush_interval=0,
+            max_size=1024,
+            encode=ob11_msg._encode_ob11_msg_record,
+        ),
+    )
+    return msg_store
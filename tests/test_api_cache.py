@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from nonebot_adapter_onebot_pretender.v11.api_cache import ApiCache
+from nonebot_adapter_onebot_pretender.v11 import api_cache as module
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(module, "monotonic", clock)
+    return clock
+
+
+class Api:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [{"group_id": 1, "names": ["a"]}]
+
+
+def test_results_are_cached_until_ttl(clock):
+    async def main():
+        cache = ApiCache({}, 16)
+        api = Api()
+        assert await cache.call("get_group_list", "1", {}, 60, api) == [
+            {"group_id": 1, "names": ["a"]}
+        ]
+        clock.now += 59
+        await cache.call("get_group_list", "1", {}, 60, api)
+        assert api.calls == 1
+        clock.now += 1
+        await cache.call("get_group_list", "1", {}, 60, api)
+        assert api.calls == 2
+
+        await cache.call("get_group_list", "1", {}, 60, api, refresh=True)
+        assert api.calls == 3
+        stats = cache.stats["get_group_list"]
+        assert (stats.hits, stats.misses) == (1, 3)
+
+    asyncio.run(main())
+
+
+def test_keys_include_bot_and_arguments(clock):
+    async def main():
+        cache = ApiCache({}, 16)
+        api = Api()
+        await cache.call("get_group_info", "1", {"group_id": 1}, 60, api)
+        await cache.call("get_group_info", "1", {"group_id": 2}, 60, api)
+        await cache.call("get_group_info", "2", {"group_id": 1}, 60, api)
+        await cache.call("get_group_info", "1", {"group_id": 1}, 60, api)
+        assert api.calls == 3
+        # 参数不可哈希时不缓存
+        await cache.call("get_group_info", "1", {"group_id": [1]}, 60, api)
+        await cache.call("get_group_info", "1", {"group_id": [1]}, 60, api)
+        assert api.calls == 5
+
+    asyncio.run(main())
+
+
+def test_concurrent_calls_share_one_request(clock):
+    async def main():
+        cache = ApiCache({}, 16)
+        api = Api()
+        results = await asyncio.gather(
+            *(cache.call("get_friend_list", "1", {}, 60, api) for _ in range(3))
+        )
+        assert api.calls == 1
+        assert cache.stats["get_friend_list"].coalesced == 2
+        # 每个调用方得到各自的副本
+        results[0][0]["names"].append("b")
+        assert results[1][0]["names"] == ["a"]
+        cached = await cache.call("get_friend_list", "1", {}, 60, api)
+        assert cached[0]["names"] == ["a"]
+
+    asyncio.run(main())
+
+
+def test_failures_are_not_cached(clock):
+    async def main():
+        cache = ApiCache({}, 16)
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("api failed")
+
+        results = await asyncio.gather(
+            cache.call("get_friend_list", "1", {}, 60, fail),
+            cache.call("get_friend_list", "1", {}, 60, fail),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(cache) == 0
+
+    asyncio.run(main())
+
+
+def test_ttl_overrides(clock):
+    async def main():
+        cache = ApiCache({"get_friend_list": 0, "get_group_list": 10}, 16)
+        api = Api()
+        await cache.call("get_friend_list", "1", {}, 60, api)
+        await cache.call("get_friend_list", "1", {}, 60, api)
+        assert api.calls == 2
+
+        await cache.call("get_group_list", "1", {}, 60, api)
+        clock.now += 10
+        await cache.call("get_group_list", "1", {}, 60, api)
+        assert api.calls == 4
+
+    asyncio.run(main())
+
+
+def test_invalidate(clock):
+    async def main():
+        cache = ApiCache({}, 16)
+        api = Api()
+        for name in ("get_friend_list", "get_group_list"):
+            for self_id in ("1", "2"):
+                await cache.call(name, self_id, {}, 60, api)
+        cache.invalidate("get_group_list", "1")
+        assert len(cache) == 3
+        cache.invalidate(self_id="2")
+        assert len(cache) == 1
+        cache.invalidate()
+        assert len(cache) == 0
+
+    asyncio.run(main())
+
+
+def test_entry_limit(clock):
+    async def main():
+        cache = ApiCache({}, 2)
+        api = Api()
+        for group_id in range(3):
+            await cache.call("get_group_info", "1", {"group_id": group_id}, 60, api)
+        assert len(cache) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+import json
+
+import pytest
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.data.codec import (
+    FLAG_ZLIB,
+    decode_binary,
+    encode_binary,
+    is_binary_record,
+)
+from nonebot_adapter_onebot_pretender.data.ob11_msg import (
+    OB11MsgModel,
+    OB11MsgRecord,
+    dump_ob11_msg,
+    make_ob11_msg,
+    decode_ob11_msg,
+    encode_ob11_msg,
+    as_ob11_msg_model,
+)
+
+MESSAGES = [
+    OB11MsgModel(
+        message_id=1,
+        message_type="group",
+        group_id=None,
+        sender=Sender(user_id=1),
+        message=Message("a[CQ:image,file=x]"),
+        forward=[{"a": None, "b": {"c": [1, 2.5, True]}}],
+        foo=None,
+        bar={"x": None},
+    ),
+    OB11MsgModel(
+        message_id=2,
+        group=True,
+        group_id=5,
+        real_id=2,
+        message_type="group",
+        sender=Sender(user_id=1, nickname="昵称", card="", role="admin", level="9"),
+        time=1700000000,
+        message=MessageSegment.at(3)
+        + "你好 🌟"
+        + MessageSegment.face(1)
+        + MessageSegment.reply(-7)
+        + MessageSegment("unknown_type", {"unknown_key": 2**70, "f": 0.1}),
+        raw_message="hi",
+    ),
+    OB11MsgModel(
+        message_id=3,
+        message_type="private",
+        group_id=None,
+        peer_id=9,
+        sender=Sender(user_id=1, nickname="n"),
+        time=9,
+        message=Message(),
+        raw_message="",
+    ),
+]
+
+
+def legacy_dump(msg: OB11MsgModel):
+    """get_msg 等 API 原本返回的格式"""
+    return json.loads(msg.json(exclude_none=True, exclude={"peer_id"}))
+
+
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_binary_round_trip(msg):
+    value = encode_binary(msg)
+    assert is_binary_record(value)
+    decoded = make_ob11_msg(**decode_binary(value))
+    assert as_ob11_msg_model(decoded) == msg
+    assert dump_ob11_msg(decoded) == legacy_dump(msg)
+
+
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_json_round_trip(msg):
+    value = msg.json().encode()
+    assert not is_binary_record(value)
+    decoded = decode_ob11_msg(value)
+    assert as_ob11_msg_model(decoded) == OB11MsgModel.parse_raw(value)
+    assert type(decoded.sender) is Sender
+    assert isinstance(decoded.message, Message)
+    assert dump_ob11_msg(decoded) == legacy_dump(msg)
+
+
+@pytest.mark.parametrize("encoding", ["binary", "json"])
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_encode_follows_store_encoding(msg, encoding, monkeypatch):
+    monkeypatch.setattr(conf, "ob_pretender_store_encoding", encoding)
+    value = encode_ob11_msg(msg)
+    assert is_binary_record(value) == (encoding == "binary")
+    assert dump_ob11_msg(decode_ob11_msg(value)) == legacy_dump(msg)
+
+
+def test_record_round_trip():
+    msg = make_ob11_msg(
+        message_id=4,
+        message_type="group",
+        group_id=5,
+        sender=Sender.construct(user_id=1),
+        message=Message("hi"),
+        raw_message="hi",
+    )
+    assert isinstance(msg, OB11MsgRecord)
+    assert dump_ob11_msg(decode_ob11_msg(encode_binary(msg))) == dump_ob11_msg(msg)
+
+
+def test_binary_format_is_stable():
+    # 版本 2 的记录，字段列表改变时必须增加 VERSION
+    value = bytes.fromhex(
+        "b10200020203020a0202000002c801021201016e00000000000000000102686901010101"
+        "010268690000"
+    )
+    msg = make_ob11_msg(
+        message_id=1,
+        group=True,
+        group_id=5,
+        real_id=1,
+        message_type="group",
+        sender=Sender(user_id=9, nickname="n"),
+        time=100,
+        message=Message("hi"),
+        raw_message="hi",
+    )
+    assert encode_binary(msg) == value
+    assert dump_ob11_msg(make_ob11_msg(**decode_binary(value))) == dump_ob11_msg(msg)
+
+
+def test_unknown_sender_fields_round_trip():
+    sender = Sender.construct(user_id=1, nickname="n", badge="x")
+    msg = MESSAGES[2].copy(update={"sender": sender})
+    decoded = decode_binary(encode_binary(msg))["sender"]
+    assert decoded.badge == "x"
+    assert decoded.nickname == "n"
+
+
+def test_large_body_is_compressed():
+    msg = MESSAGES[1].copy(update={"raw_message": "重复" * 2000})
+    value = encode_binary(msg, compress_threshold=1024)
+    assert value[2] & FLAG_ZLIB
+    assert len(value) < len(msg.raw_message.encode())
+    assert decode_binary(value)["raw_message"] == msg.raw_message
+
+    assert not encode_binary(msg, compress_threshold=-1)[2] & FLAG_ZLIB
+
+
+def test_unsupported_version():
+    value = bytearray(encode_binary(MESSAGES[0]))
+    value[1] = 99
+    with pytest.raises(ValueError, match="unsupported record version"):
+        decode_binary(bytes(value))
+
+
+def test_dump_returns_copies():
+    msg = MESSAGES[0]
+    dumped = dump_ob11_msg(msg)
+    dumped["message"][0]["data"]["text"] = "X"
+    dumped["forward"][0]["b"]["c"].append(3)
+    assert dump_ob11_msg(msg) == legacy_dump(msg)
+
+
+def test_malformed_json_is_validated():
+    msg = decode_ob11_msg(
+        b'{"message_id": "12", "message_type": "group", "group_id": 1,'
+        b' "message": "hi[CQ:face,id=1]"}'
+    )
+    assert isinstance(msg, OB11MsgModel)
+    assert msg.message_id == 12
+    assert msg.message == Message("hi") + MessageSegment.face(1)
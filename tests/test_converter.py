@@ -0,0 +1,93 @@
+from typing import Optional
+
+from nonebot.adapters.red import Message as RedMsg
+from nonebot.adapters.red import MessageSegment as RedMS
+from nonebot.adapters.onebot.v11 import Message as OB11Msg
+from nonebot.adapters.onebot.v11 import MessageSegment as OB11MS
+
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender
+from nonebot_adapter_onebot_pretender.v11.converter import (
+    SegmentConverterRegistry,
+    outgoing_segment_converter,
+)
+
+
+def upper(pretender, m: OB11MS) -> OB11MS:
+    return OB11MS.text(m.data["text"].upper())
+
+
+def test_registry_dispatches_by_type():
+    registry = SegmentConverterRegistry()
+    registry.register("text", upper)
+
+    @registry.register("face")
+    def face(pretender, m: OB11MS) -> Optional[OB11MS]:
+        return None
+
+    assert "text" in registry
+    assert registry.converters == {"text": upper, "face": face}
+
+    message = OB11Msg([OB11MS.text("a"), OB11MS.face(1), OB11MS.at(2)])
+    result = registry.convert_many(None, message)
+    assert [m for m, _ in result] == list(message)
+    assert [seg for _, seg in result] == [OB11MS.text("A"), None, None]
+    assert registry.convert(None, OB11MS.text("b")) == OB11MS.text("B")
+
+    # 没有转换函数或转换函数返回 None 都计为无法转换
+    assert registry.unsupported == {"face": 1, "at": 1}
+    assert registry.stats["text"].count == 2
+    assert registry.stats["face"].count == 1
+    assert registry.stats["text"].elapsed == 0
+
+
+def test_registry_override_and_timing():
+    registry = SegmentConverterRegistry(timing=True)
+    registry.register("text", upper)
+    registry.convert(None, OB11MS.text("a"))
+
+    # 覆盖注册保留之前的统计
+    registry.register("text", lambda pretender, m: OB11MS.text("x"))
+    assert registry.convert(None, OB11MS.text("a")) == OB11MS.text("x")
+    assert registry.stats["text"].count == 2
+    assert registry.stats["text"].elapsed > 0
+    assert registry.stats["text"].average == registry.stats["text"].elapsed / 2
+
+    registry.unregister("text")
+    assert "text" not in registry
+    assert registry.convert(None, OB11MS.text("a")) is None
+
+
+def test_builtin_red_converters():
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+    msg = pretender.convert_outgoing_msg(
+        OB11Msg([OB11MS.text("hi"), OB11MS.at("all"), OB11MS.face(5)])
+    )
+    assert [seg.type for seg in msg] == ["text", "at_all", "face"]
+
+    msg = pretender.convert_incoming_msg(
+        None, RedMsg([RedMS.text("hi"), RedMS.at("9"), RedMS.face(5)])
+    )
+    assert msg == OB11Msg(
+        [
+            OB11MS.text("hi"),
+            OB11MS("at", {"qq": "9", "name": None}),
+            OB11MS("face", {"id": "5"}),
+        ]
+    )
+
+
+def test_subclass_extends_inherited_converters():
+    class PokePretender(RedOB11Pretender):
+        @outgoing_segment_converter("poke")
+        def _convert_outgoing_poke(self, m: OB11MS) -> RedMS:
+            return RedMS.text(f"poke {m.data['id']}")
+
+    assert "poke" in PokePretender.outgoing_converters
+    assert "poke" not in RedOB11Pretender.outgoing_converters
+    # 继承父类的转换函数，注册表与父类相互独立
+    assert "text" in PokePretender.outgoing_converters
+    assert PokePretender.outgoing_converters is not RedOB11Pretender.outgoing_converters
+
+    pretender = PokePretender.__new__(PokePretender)
+    msg = pretender.convert_outgoing_msg(OB11Msg(OB11MS("poke", {"id": "1"})))
+    assert msg == RedMsg(RedMS.text("poke 1"))
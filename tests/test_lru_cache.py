@@ -0,0 +1,53 @@
+from nonebot_adapter_onebot_pretender.data.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache: LRUCache[str, int] = LRUCache(max_size=2, max_memory=1024)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+def test_evicts_by_memory():
+    cache: LRUCache[str, bytes] = LRUCache(max_size=10, max_memory=10, sizeof=len)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.memory == 8
+    cache.put("c", b"1234")
+
+    assert "a" not in cache
+    assert len(cache) == 2
+    assert cache.memory == 8
+
+
+def test_oversized_value_is_not_cached():
+    cache: LRUCache[str, bytes] = LRUCache(max_size=10, max_memory=10, sizeof=len)
+    cache.put("a", b"1")
+    cache.put("a", b"x" * 11)
+
+    assert "a" not in cache
+    assert cache.memory == 0
+
+
+def test_replace_updates_memory():
+    cache: LRUCache[str, bytes] = LRUCache(max_size=10, max_memory=10, sizeof=len)
+    cache.put("a", b"1234")
+    cache.put("a", b"12")
+    assert cache.memory == 2
+    assert cache.pop("a") == b"12"
+    assert cache.memory == 0
+    assert cache.pop("a") is None
+
+
+def test_disabled():
+    cache: LRUCache[str, int] = LRUCache(max_size=0, max_memory=1024)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats.misses == 1
+    assert cache.stats.hit_rate == 0.0
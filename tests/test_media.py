@@ -0,0 +1,50 @@
+import base64
+
+import pytest
+
+from nonebot_adapter_onebot_pretender.v11.impl.red import media
+from nonebot_adapter_onebot_pretender.v11.impl.red.media import (
+    file_digest,
+    iter_base64_decode,
+    decode_base64_media,
+)
+
+DATA = bytes(range(256)) * 50
+
+
+@pytest.fixture(name="small_chunks")
+def _small_chunks(monkeypatch):
+    monkeypatch.setattr(media, "_CHUNK_SIZE", 16)
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 100, len(DATA)])
+def test_iter_base64_decode(small_chunks, size):
+    encoded = base64.b64encode(DATA[:size]).decode()
+    assert b"".join(iter_base64_decode(encoded)) == DATA[:size]
+
+
+def test_iter_base64_decode_ignores_line_breaks(small_chunks):
+    encoded = base64.encodebytes(DATA).decode()
+    assert "\n" in encoded
+    assert b"".join(iter_base64_decode(encoded)) == DATA
+
+
+def test_iter_base64_decode_without_padding(small_chunks):
+    encoded = base64.b64encode(DATA[:100]).decode().rstrip("=")
+    assert b"".join(iter_base64_decode(encoded)) == DATA[:100]
+
+
+def test_small_media_is_decoded_in_memory():
+    data = "base64://" + base64.b64encode(b"small").decode()
+    assert decode_base64_media(data, 1024) == (b"small", None)
+    assert decode_base64_media(data, -1) == (b"small", None)
+
+
+def test_large_media_is_spooled(small_chunks):
+    data = "base64://" + base64.b64encode(DATA).decode()
+    path, digest = decode_base64_media(data, 1024)
+    try:
+        assert path.read_bytes() == DATA
+        assert digest == file_digest(path)
+    finally:
+        path.unlink()
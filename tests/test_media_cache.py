@@ -0,0 +1,178 @@
+import os
+import asyncio
+
+import pytest
+
+from nonebot_adapter_onebot_pretender.data.media_cache import MediaCache
+
+
+def chunks(*parts: bytes, delay: float = 0):
+    async def fill():
+        for part in parts:
+            if delay:
+                await asyncio.sleep(delay)
+            yield part
+
+    return fill
+
+
+def test_fill_and_hit(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        path = await cache.get_or_fill(("k",), chunks(b"ab", b"cd"))
+        assert path.read_bytes() == b"abcd"
+        assert cache.total_bytes == 4
+
+        assert await cache.get_or_fill(("k",), chunks(b"other")) == path
+        assert cache.get(("k",)) == path
+        assert cache.stats.hits == 1
+        assert cache.stats.misses == 1
+
+    asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_fill(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        calls = []
+
+        def fill():
+            calls.append(1)
+            return chunks(b"ab", b"cd", delay=0.01)()
+
+        paths = await asyncio.gather(
+            *(cache.get_or_fill(("k",), fill) for _ in range(5))
+        )
+        assert len(set(paths)) == 1
+        assert len(calls) == 1
+        assert cache.stats.coalesced == 4
+
+    asyncio.run(main())
+
+
+def test_fill_outlives_cancelled_requester(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        fill = chunks(b"ab", b"cd", b"ef", delay=0.02)
+        first = asyncio.create_task(cache.get_or_fill(("k",), fill))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_or_fill(("k",), fill))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        path = await second
+        assert path.read_bytes() == b"abcdef"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # 没有请求等待时填充也会完成
+        third = asyncio.create_task(cache.get_or_fill(("j",), fill))
+        await asyncio.sleep(0.01)
+        third.cancel()
+        await asyncio.sleep(0.1)
+        assert cache.get(("j",)).read_bytes() == b"abcdef"
+
+    asyncio.run(main())
+
+
+def test_failed_fill(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+
+        async def fail():
+            yield b"partial"
+            raise RuntimeError("upstream failed")
+
+        with pytest.raises(RuntimeError, match="upstream failed"):
+            await cache.get_or_fill(("k",), fail)
+        assert cache.stats.fill_failed == 1
+        assert cache.get(("k",)) is None
+        # 不留下临时文件
+        assert os.listdir(tmp_path) == []
+
+        path = await cache.get_or_fill(("k",), chunks(b"ok"))
+        assert path.read_bytes() == b"ok"
+
+    asyncio.run(main())
+
+
+def test_evicts_least_recently_used(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 10)
+        a = await cache.get_or_fill(("a",), chunks(b"1234"))
+        await cache.get_or_fill(("b",), chunks(b"1234"))
+        assert cache.get(("a",)) == a
+        await cache.get_or_fill(("c",), chunks(b"1234"))
+
+        assert cache.get(("b",)) is None
+        assert cache.get(("a",)) is not None
+        assert cache.total_bytes == 8
+        assert cache.stats.evictions == 1
+        assert len(os.listdir(tmp_path)) == 2
+
+        # 超出限制的单个文件仍然保留
+        big = await cache.get_or_fill(("d",), chunks(b"x" * 20))
+        assert big.exists()
+        assert len(cache) == 1
+
+    asyncio.run(main())
+
+
+def test_load_restores_index(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        path = await cache.get_or_fill(("k",), chunks(b"abcd"))
+        (tmp_path / "leftover.tmp").write_bytes(b"partial")
+
+        # 创建时不扫描目录
+        reloaded = MediaCache(tmp_path, 1024)
+        assert (tmp_path / "leftover.tmp").exists()
+        await reloaded.load()
+        assert not (tmp_path / "leftover.tmp").exists()
+        assert reloaded.get(("k",)) == path
+        assert reloaded.total_bytes == 4
+
+    asyncio.run(main())
+
+
+def test_externally_deleted_file(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        path = await cache.get_or_fill(("k",), chunks(b"abcd"))
+        path.unlink()
+        assert cache.get(("k",)) is None
+        assert cache.total_bytes == 0
+
+    asyncio.run(main())
+
+
+def test_tee_caches_complete_streams(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        tee = cache.tee(("k",), chunks(b"ab", b"cd")())
+        received = []
+        async for chunk in tee:
+            received.append(chunk)
+            # 数据读完之前不在缓存中
+            assert cache.get(("k",)) is None
+        assert received == [b"ab", b"cd"]
+        assert cache.get(("k",)).read_bytes() == b"abcd"
+
+    asyncio.run(main())
+
+
+def test_tee_discards_interrupted_streams(tmp_path):
+    async def main():
+        cache = MediaCache(tmp_path, 1024)
+        tee = cache.tee(("k",), chunks(b"ab", b"cd")())
+        assert await tee.__anext__() == b"ab"
+
+        # 同一个键正在写入时只转发
+        other = [x async for x in cache.tee(("k",), chunks(b"xy")())]
+        assert other == [b"xy"]
+
+        await tee.aclose()
+        assert cache.get(("k",)) is None
+        assert os.listdir(tmp_path) == []
+
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+from nonebot.adapters.red.api.model import Member
+
+from nonebot_adapter_onebot_pretender.v11.impl.red import member_cache as module
+from nonebot_adapter_onebot_pretender.v11.impl.red.member_cache import (
+    GroupMemberCache,
+    member_role,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    self_id = "1"
+
+
+def member(uin: int, role: int = 2) -> Member:
+    return Member.construct(uid="", qid="", uin=str(uin), nick=f"n{uin}", role=role)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(module, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    fetches = []
+
+    async def iter_group_members(bot, group_id):
+        fetches.append(group_id)
+        await asyncio.sleep(0.01)
+        for uin, role in ((10, 4), (11, 3), (12, 2)):
+            yield member(uin, role)
+
+    monkeypatch.setattr(module, "iter_group_members", iter_group_members)
+    return fetches
+
+
+def test_member_role():
+    assert member_role(4) == "owner"
+    assert member_role(3) == "admin"
+    assert member_role(2) == "member"
+    assert member_role(None) == "member"
+
+
+def test_get_is_cached_until_ttl(clock, fetches):
+    async def main():
+        cache = GroupMemberCache(max_groups=8, ttl=60)
+        members = await cache.get(FakeBot(), 5)
+        assert sorted(members) == [10, 11, 12]
+        assert member_role(cache.peek_member("1", 5, 10).role) == "owner"
+
+        clock.now += 59
+        assert await cache.get(FakeBot(), 5) is members
+        clock.now += 1
+        assert cache.peek("1", 5) is None
+        await cache.get(FakeBot(), 5)
+        assert fetches == [5, 5]
+        assert cache.stats.expired == 1
+
+        await cache.get(FakeBot(), 5, refresh=True)
+        assert fetches == [5, 5, 5]
+
+    asyncio.run(main())
+
+
+def test_concurrent_gets_share_one_fetch(clock, fetches):
+    async def main():
+        cache = GroupMemberCache(max_groups=8, ttl=60)
+        results = await asyncio.gather(*(cache.get(FakeBot(), 5) for _ in range(3)))
+        assert all(r is results[0] for r in results)
+        assert fetches == [5]
+        assert cache.stats.coalesced == 2
+
+    asyncio.run(main())
+
+
+def test_group_limit(clock, fetches):
+    async def main():
+        cache = GroupMemberCache(max_groups=2, ttl=60)
+        for group_id in (1, 2, 3):
+            await cache.get(FakeBot(), group_id)
+        assert len(cache) == 2
+        assert cache.peek("1", 1) is None
+
+    asyncio.run(main())
+
+
+def test_prefetch(clock, fetches):
+    async def main():
+        cache = GroupMemberCache(max_groups=8, ttl=60)
+        cache.prefetch(FakeBot(), 5)
+        cache.prefetch(FakeBot(), 5)
+        assert cache.peek("1", 5) is None
+        await asyncio.sleep(0.05)
+        assert cache.peek("1", 5) is not None
+        assert fetches == [5]
+
+    asyncio.run(main())
+
+
+def test_prefetch_is_throttled(clock, monkeypatch):
+    fetches = []
+
+    async def iter_group_members(bot, group_id):
+        fetches.append(group_id)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("red failed")
+        yield
+
+    monkeypatch.setattr(module, "iter_group_members", iter_group_members)
+    monkeypatch.setattr(module, "_MAX_PREFETCHES", 2)
+
+    async def main():
+        cache = GroupMemberCache(max_groups=8, ttl=60)
+        for group_id in (1, 2, 3):
+            cache.prefetch(FakeBot(), group_id)
+        # 同时预取的群数量有上限
+        assert cache.stats.prefetch_skipped == 1
+        await asyncio.sleep(0.05)
+        assert fetches == [1, 2]
+
+        # 失败的群在 ttl 内不再预取
+        cache.prefetch(FakeBot(), 1)
+        await asyncio.sleep(0.05)
+        assert fetches == [1, 2]
+        assert cache.stats.prefetch_skipped == 2
+
+        clock.now += 60
+        cache.prefetch(FakeBot(), 1)
+        await asyncio.sleep(0.05)
+        assert fetches == [1, 2, 1]
+
+    asyncio.run(main())
+
+
+def test_update_member(clock, fetches):
+    async def main():
+        cache = GroupMemberCache(max_groups=8, ttl=60)
+        # 未缓存的群忽略
+        cache.update_member("1", 5, 13)
+        assert cache.peek("1", 5) is None
+
+        members = await cache.get(FakeBot(), 5)
+        old = members[12]
+        cache.update_member("1", 5, 12, role=3, shutUpTime=100)
+        cache.update_member("1", 5, 13)
+
+        assert member_role(cache.peek_member("1", 5, 12).role) == "admin"
+        assert cache.peek_member("1", 5, 12).shutUpTime == 100
+        # 之前返回的成员对象不被修改
+        assert old.role == 2
+        assert sorted(members) == [10, 11, 12]
+        assert cache.peek_member("1", 5, 13).uin == "13"
+        assert fetches == [5]
+
+        cache.invalidate("1", 5)
+        assert cache.peek("1", 5) is None
+
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from yarl import URL
+from nonebot.adapters.onebot.v11 import ActionFailed, NetworkError
+
+from nonebot_adapter_onebot_pretender.v11.impl.red import members
+from nonebot_adapter_onebot_pretender.v11.impl.red.members import iter_json_array
+
+VALUES = [{"uin": "1", "nick": "名字"}, [1, 2], "s,]", 12345, -1.5, True, None]
+
+
+def parse(data: bytes, chunk_size: int):
+    async def chunks():
+        for i in range(0, len(data), chunk_size):
+            yield data[i : i + chunk_size]
+
+    async def main():
+        return [value async for value in iter_json_array(chunks())]
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 16])
+def test_iter_json_array(chunk_size):
+    data = json.dumps(VALUES, ensure_ascii=False, indent=1).encode()
+    assert parse(data, chunk_size) == VALUES
+
+
+def test_empty_array():
+    assert parse(b" [ ] ", 1) == []
+
+
+def test_number_split_across_chunks():
+    assert parse(b"[12345,678]", 3) == [12345, 678]
+
+
+@pytest.mark.parametrize(
+    ("data", "error"),
+    [
+        (b"{}", "expect JSON array"),
+        (b"[1, 2", "unexpected end of JSON array"),
+        (b'[{"a": 1', "Expecting"),
+    ],
+)
+def test_invalid_array(data, error):
+    with pytest.raises(ValueError, match=error):
+        parse(data, 2)
+
+
+class FakeBot:
+    info = SimpleNamespace(api_base=URL("http://red.test/api"), token="t")
+
+
+def iter_members(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(members, "get_http_client", lambda: client)
+
+    async def main():
+        try:
+            return [m async for m in members._iter_members_stream(FakeBot(), 5, 10)]
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+def test_stream_members(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        detail = {
+            "uid": "u1",
+            "qid": "",
+            "uin": "1",
+            "nick": "n",
+            "remark": "",
+            "cardType": 0,
+            "cardName": "",
+            "role": 4,
+            "avatarPath": "",
+            "shutUpTime": 0,
+            "isDelete": False,
+        }
+        return httpx.Response(200, json=[{"detail": detail}])
+
+    result = iter_members(monkeypatch, handler)
+    assert [m.uin for m in result] == ["1"]
+    assert requests[0].headers["Authorization"] == "Bearer t"
+    assert json.loads(requests[0].content) == {"group": 5, "size": 10}
+
+
+@pytest.mark.parametrize(
+    ("handler", "error"),
+    [
+        (lambda request: httpx.Response(401), NetworkError),
+        (lambda request: httpx.Response(200, content=b"{}"), ActionFailed),
+        (lambda request: httpx.Response(200, json=[{}]), ActionFailed),
+    ],
+)
+def test_stream_members_errors(monkeypatch, handler, error):
+    with pytest.raises(error):
+        iter_members(monkeypatch, handler)
+
+
+def test_stream_members_network_error(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("refused", request=request)
+
+    with pytest.raises(NetworkError, match="refused"):
+        iter_members(monkeypatch, handler)
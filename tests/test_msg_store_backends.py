@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+
+from nonebot_adapter_onebot_pretender.data.backends import (
+    MsgRecord,
+    create_msg_store_backend,
+)
+
+
+def test_get_put_delete(msg_store):
+    async def main():
+        assert await msg_store.get("1") is None
+        await msg_store.put(MsgRecord("1", 100, b"a"))
+        await msg_store.put_many([MsgRecord("2", 101, b"b"), MsgRecord("3", 102, b"c")])
+        assert await msg_store.get("1") == b"a"
+        assert await msg_store.get_many(["1", "3", "4"]) == {"1": b"a", "3": b"c"}
+        assert await msg_store.count() == 3
+
+        # 覆盖写入不改变条数
+        await msg_store.put(MsgRecord("1", 100, b"a2"))
+        assert await msg_store.get("1") == b"a2"
+        assert await msg_store.count() == 3
+
+        await msg_store.delete(["1", "4"])
+        assert await msg_store.get("1") is None
+        assert await msg_store.count() == 2
+
+    asyncio.run(main())
+
+
+def test_scan_time_range(msg_store):
+    async def main():
+        await msg_store.put_many(
+            [MsgRecord(str(i), 100 + i // 2, b"%d" % i) for i in range(10)]
+        )
+
+        def ids(records):
+            return [r.message_id for r in records]
+
+        assert ids(await msg_store.scan(limit=3)) == ["0", "1", "2"]
+        assert ids(await msg_store.scan(limit=3, reverse=True)) == ["9", "8", "7"]
+        assert ids(await msg_store.scan(101, 103)) == ["2", "3", "4", "5"]
+        assert ids(await msg_store.scan(103, reverse=True, limit=2)) == ["9", "8"]
+        assert ids(await msg_store.scan(200)) == []
+
+        # 删除的消息不再出现
+        await msg_store.delete(["3"])
+        assert ids(await msg_store.scan(101, 103)) == ["2", "4", "5"]
+
+    asyncio.run(main())
+
+
+def test_scan_by_conversation(msg_store):
+    async def main():
+        await msg_store.put_many(
+            [
+                MsgRecord("1", 100, b"g1", group_id=1),
+                MsgRecord("2", 100, b"g2", group_id=2),
+                MsgRecord("3", 101, b"u9", peer_id=9),
+                MsgRecord("4", 102, b"g1", group_id=1),
+                MsgRecord("5", 103, b"u8", peer_id=8),
+            ]
+        )
+        records = await msg_store.scan(group_id=1)
+        assert records == [
+            MsgRecord("1", 100, b"g1", 1, None),
+            MsgRecord("4", 102, b"g1", 1, None),
+        ]
+        records = await msg_store.scan(peer_id=9)
+        assert records == [MsgRecord("3", 101, b"u9", None, 9)]
+        assert await msg_store.scan(group_id=3) == []
+
+    asyncio.run(main())
+
+
+def test_scan_before(msg_store):
+    async def main():
+        # 同一秒内有多条消息，写入顺序与 message_id 的大小无关
+        ids = ["5", "3", "9", "1", "7", "2"]
+        times = [100, 101, 101, 101, 102, 103]
+        await msg_store.put_many(
+            [MsgRecord(i, t, i.encode(), group_id=1) for i, t in zip(ids, times)]
+        )
+
+        async def scan_before(before, limit=10):
+            records = await msg_store.scan(
+                group_id=1, before=before, limit=limit, reverse=True
+            )
+            return [r.message_id for r in records]
+
+        assert await scan_before((101, "9")) == ["9", "3", "5"]
+        assert await scan_before((101, "1"), limit=2) == ["1", "9"]
+        assert await scan_before((101, "3")) == ["3", "5"]
+        assert await scan_before((103, "2")) == ["2", "7", "1", "9", "3", "5"]
+        # 不在存储中的消息按时间截断
+        assert await scan_before((101, "404")) == ["1", "9", "3", "5"]
+        assert await scan_before((99, "404")) == []
+
+    asyncio.run(main())
+
+
+def test_scan_out_of_time_order_writes(msg_store):
+    async def main():
+        # 拉取的历史消息在更新的消息之后写入
+        await msg_store.put_many(
+            [MsgRecord("2", 200, b"2", group_id=1), MsgRecord("3", 300, b"3", 1)]
+        )
+        await msg_store.put_many([MsgRecord("4", 150, b"4", group_id=1)])
+        await msg_store.put_many(
+            [MsgRecord("6", 250, b"6", group_id=1), MsgRecord("5", 100, b"5", 1)]
+        )
+
+        async def ids(**kwargs):
+            return [r.message_id for r in await msg_store.scan(**kwargs)]
+
+        assert await ids(group_id=1) == ["5", "4", "2", "6", "3"]
+        assert await ids(group_id=1, limit=2, reverse=True) == ["3", "6"]
+        assert await ids(group_id=1, before=(250, "6"), reverse=True) == [
+            "6",
+            "2",
+            "4",
+            "5",
+        ]
+        assert await ids(group_id=1, before=(200, "2"), limit=2, reverse=True) == [
+            "2",
+            "4",
+        ]
+        assert await ids(start_time=150, end_time=260) == ["4", "2", "6"]
+        assert await ids(limit=2, reverse=True) == ["3", "6"]
+
+        # 过期清理同样从时间最早的消息开始
+        assert await msg_store.expire(None, 3, 100) == ["5", "4"]
+        assert await ids(group_id=1) == ["2", "6", "3"]
+        await msg_store.put_many([MsgRecord("7", 220, b"7", group_id=1)])
+        assert await ids(group_id=1, reverse=True) == ["3", "6", "7", "2"]
+
+    asyncio.run(main())
+
+
+def test_iterate_in_time_order(msg_store):
+    async def main():
+        await msg_store.put_many([MsgRecord(str(i), 200 - i, b"") for i in range(7)])
+        await msg_store.put_many([MsgRecord("7", 196, b"")])
+        await msg_store.delete(["2"])
+        batches = [batch async for batch in msg_store.iterate(batch_size=3)]
+        assert [r.message_id for batch in batches for r in batch] == [
+            "6",
+            "5",
+            "4",
+            "7",
+            "3",
+            "1",
+            "0",
+        ]
+
+    asyncio.run(main())
+
+
+def test_data_survives_reopen(msg_store, tmp_path, request):
+    backend = request.node.callspec.params["msg_store"]
+
+    async def main():
+        await msg_store.put_many([MsgRecord("1", 100, b"a", group_id=1)])
+        msg_store.close()
+
+        store = create_msg_store_backend(backend, tmp_path)
+        try:
+            assert await store.get("1") == b"a"
+            assert await store.count() == 1
+            assert len(await store.scan(group_id=1)) == 1
+        finally:
+            store.close()
+
+    asyncio.run(main())
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError, match="未知的消息存储后端"):
+        create_msg_store_backend("leveldb", tmp_path)
@@ -0,0 +1,255 @@
+import json
+import asyncio
+
+import pytest
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.data import ob11_msg
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender
+from nonebot_adapter_onebot_pretender.data.backends.unqlite import (
+    UnQLiteMsgStoreBackend,
+)
+from nonebot_adapter_onebot_pretender.data.ob11_msg import (
+    T_OB11Msg,
+    OB11MsgModel,
+    load_ob11_msg,
+    make_ob11_msg,
+    peek_ob11_msg,
+    save_ob11_msg,
+    load_ob11_msgs,
+    load_ob11_msg_history,
+)
+
+
+def private_msg(message_id: int, time: int = 0, peer_id: int = 9) -> T_OB11Msg:
+    return make_ob11_msg(
+        message_id=message_id,
+        real_id=message_id,
+        message_type="private",
+        peer_id=peer_id,
+        sender=Sender(user_id=peer_id),
+        time=time,
+        message=Message(f"msg {message_id}"),
+        raw_message=f"msg {message_id}",
+    )
+
+
+def group_msg(message_id: int, time: int = 0, group_id: int = 1) -> T_OB11Msg:
+    return make_ob11_msg(
+        group=True,
+        group_id=group_id,
+        message_id=message_id,
+        real_id=message_id,
+        message_type="group",
+        sender=Sender(user_id=10),
+        time=time,
+        message=Message(f"msg {message_id}"),
+        raw_message=f"msg {message_id}",
+    )
+
+
+def test_saved_message_is_cached(ob11_msg_store):
+    async def main():
+        msg = group_msg(1)
+        await save_ob11_msg("1", msg)
+        assert peek_ob11_msg("1") is msg
+        assert await load_ob11_msg("1") is msg
+        await ob11_msg.get_ob11_msg_write_queue().close()
+
+    asyncio.run(main())
+
+
+def test_load_fills_cache_from_store(ob11_msg_store):
+    async def main():
+        await save_ob11_msg("1", group_msg(1))
+        await save_ob11_msg("2", group_msg(2))
+        await ob11_msg.get_ob11_msg_write_queue().close()
+        cache = ob11_msg.get_ob11_msg_cache()
+        cache.clear()
+
+        assert peek_ob11_msg("1") is None
+        msg = await load_ob11_msg("1")
+        assert msg.message_id == 1
+        assert str(msg.message) == "msg 1"
+        assert peek_ob11_msg("1") is msg
+
+        msgs = await load_ob11_msgs(["1", "2", "3"])
+        assert set(msgs) == {"1", "2"}
+        assert msgs["1"] is msg
+        assert peek_ob11_msg("2") is msgs["2"]
+        assert await load_ob11_msg("3") is None
+
+    asyncio.run(main())
+
+
+def ids(messages):
+    return [msg.message_id for msg in messages]
+
+
+async def save_and_flush(messages):
+    for msg in messages:
+        await save_ob11_msg(str(msg.message_id), msg)
+    await ob11_msg.get_ob11_msg_write_queue().close()
+    ob11_msg.get_ob11_msg_cache().clear()
+
+
+def test_history_pages_within_same_second(ob11_msg_store):
+    async def main():
+        # 超过一页的消息在同一秒内
+        await save_and_flush([group_msg(i, 100) for i in range(1, 41)])
+        await save_and_flush([group_msg(i, 101) for i in range(41, 46)])
+
+        assert ids(await load_ob11_msg_history(group_id=1, count=7)) == list(
+            range(39, 46)
+        )
+
+        pages = []
+        before = None
+        while True:
+            page = await load_ob11_msg_history(group_id=1, before=before, count=10)
+            if before is not None:
+                # 每页包括 before 本身
+                assert page[-1].message_id == before.message_id
+                page = page[:-1]
+            if not page:
+                break
+            pages = page + pages
+            before = page[0]
+        assert ids(pages) == list(range(1, 46))
+
+    asyncio.run(main())
+
+
+def test_history_includes_pending_messages(ob11_msg_store):
+    async def main():
+        await save_and_flush([group_msg(i, 100 + i // 3) for i in range(1, 10)])
+        await save_ob11_msg("10", group_msg(10, 103))
+        await save_ob11_msg("11", group_msg(11, 104))
+        await save_ob11_msg("12", group_msg(12, 104, group_id=2))
+
+        assert ids(await load_ob11_msg_history(group_id=1, count=4)) == [8, 9, 10, 11]
+
+        before = await load_ob11_msg("10")
+        assert ids(await load_ob11_msg_history(group_id=1, before=before, count=3)) == [
+            8,
+            9,
+            10,
+        ]
+        # before 已写入存储时，同一秒内未写入的消息在其之后
+        before = await load_ob11_msg("9")
+        assert ids(await load_ob11_msg_history(group_id=1, before=before, count=3)) == [
+            7,
+            8,
+            9,
+        ]
+        assert ids(await load_ob11_msg_history(group_id=2, count=3)) == [12]
+        await ob11_msg.get_ob11_msg_write_queue().close()
+
+    asyncio.run(main())
+
+
+def test_private_history(ob11_msg_store):
+    async def main():
+        await save_and_flush(
+            [private_msg(1, 100), private_msg(2, 101, peer_id=8), group_msg(3, 102)]
+        )
+        await save_ob11_msg("4", private_msg(4, 103))
+
+        assert ids(await load_ob11_msg_history(peer_id=9, count=10)) == [1, 4]
+        assert ids(await load_ob11_msg_history(peer_id=8, count=10)) == [2]
+        assert await load_ob11_msg_history(peer_id=9, count=0) == []
+        await ob11_msg.get_ob11_msg_write_queue().close()
+
+    asyncio.run(main())
+
+
+def test_legacy_private_history(ob11_msg_store):
+    if not isinstance(ob11_msg_store, UnQLiteMsgStoreBackend):
+        pytest.skip("只有 UnQLite 存储有旧版本的记录")
+
+    async def main():
+        # 旧版本保存的私聊消息没有 peer_id
+        for i in (1, 2):
+            ob11_msg_store.db[f"ob11_msg_{i}"] = json.dumps(
+                {
+                    "message_id": i,
+                    "message_type": "private",
+                    "sender": {"user_id": 9},
+                    "time": i,
+                    "message": [],
+                    "raw_message": "",
+                }
+            )
+        await save_and_flush([private_msg(3, 3)])
+
+        assert ids(await load_ob11_msg_history(peer_id=9, count=10)) == [1, 2, 3]
+
+    asyncio.run(main())
+
+
+GET_MSG_MESSAGES = [
+    OB11MsgModel(
+        group=True,
+        group_id=5,
+        message_id=1,
+        real_id=1,
+        message_type="group",
+        sender=Sender(user_id=9, nickname="昵称", card="", role="admin"),
+        time=100,
+        message=MessageSegment.reply(7)
+        + MessageSegment("at", {"qq": "9", "name": None})
+        + " 你好"
+        + MessageSegment(
+            "image", {"file": "file:///a.png", "url": "http://x/?a=1&b=2"}
+        ),
+        raw_message=" 你好",
+        forward=[{"a": None}],
+        extra_field={"k": [1, None]},
+    ),
+    OB11MsgModel(
+        message_id=2,
+        message_type="private",
+        peer_id=9,
+        sender=Sender(user_id=9),
+        time=101,
+        message=Message(),
+        raw_message="",
+    ),
+]
+
+
+def legacy_get_msg(msg: OB11MsgModel) -> str:
+    """get_msg 原本的实现：序列化后再解析"""
+    return json.dumps(
+        json.loads(msg.json(exclude_none=True, exclude={"peer_id"})),
+        ensure_ascii=False,
+    )
+
+
+@pytest.mark.parametrize("encoding", ["binary", "json"])
+def test_get_msg_matches_legacy_output(ob11_msg_store, monkeypatch, encoding):
+    monkeypatch.setattr(conf, "ob_pretender_store_encoding", encoding)
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+
+    async def main():
+        for msg in GET_MSG_MESSAGES:
+            await save_ob11_msg(str(msg.message_id), msg)
+        cached = [
+            await pretender.get_msg(None, message_id=msg.message_id)
+            for msg in GET_MSG_MESSAGES
+        ]
+        await ob11_msg.get_ob11_msg_write_queue().close()
+        ob11_msg.get_ob11_msg_cache().clear()
+        stored = [
+            await pretender.get_msg(None, message_id=msg.message_id)
+            for msg in GET_MSG_MESSAGES
+        ]
+        return cached, stored
+
+    cached, stored = asyncio.run(main())
+    expected = [legacy_get_msg(msg) for msg in GET_MSG_MESSAGES]
+    # 与原来的结果逐字节相同，包括键的顺序
+    assert [json.dumps(r, ensure_ascii=False) for r in cached] == expected
+    assert [json.dumps(r, ensure_ascii=False) for r in stored] == expected
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from nonebot import message
+
+from nonebot_adapter_onebot_pretender import patch_handle_event as module
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def origin(bot, event):
+        calls.append(("origin", bot.self_id))
+
+    monkeypatch.setattr(message, "handle_event", origin)
+    monkeypatch.setattr(module, "_event_handler", [])
+    monkeypatch.setattr(module, "_event_routes", {})
+    module.init_patch_handle_event()
+    return calls
+
+
+def make_bot(adapter, self_id: str):
+    return SimpleNamespace(adapter=adapter, self_id=self_id)
+
+
+def test_routed_bot_skips_handlers(calls):
+    adapter, other_adapter = object(), object()
+
+    async def route(bot, event):
+        calls.append(("route", bot.self_id))
+
+    @module.patch_event_handle
+    async def handler(bot, event):
+        calls.append(("handler", bot.self_id))
+        return False
+
+    async def main():
+        module.add_event_route(adapter, "1", route)
+        await message.handle_event(make_bot(adapter, "1"), None)
+        # 其他 bot 与其他适配器下同 self_id 的 bot 不经过路由
+        await message.handle_event(make_bot(adapter, "2"), None)
+        await message.handle_event(make_bot(other_adapter, "1"), None)
+
+        module.remove_event_route(adapter, "1")
+        module.remove_event_route(adapter, "1")
+        await message.handle_event(make_bot(adapter, "1"), None)
+
+    asyncio.run(main())
+    assert calls == [
+        ("route", "1"),
+        ("handler", "2"),
+        ("origin", "2"),
+        ("handler", "1"),
+        ("origin", "1"),
+        ("handler", "1"),
+        ("origin", "1"),
+    ]
+
+
+def test_handler_can_consume_event(calls):
+    @module.patch_event_handle
+    async def first(bot, event):
+        calls.append(("first", bot.self_id))
+        return True
+
+    @module.patch_event_handle
+    async def second(bot, event):
+        calls.append(("second", bot.self_id))
+        return False
+
+    asyncio.run(message.handle_event(make_bot(object(), "1"), None))
+    assert calls == [("first", "1")]
@@ -0,0 +1,54 @@
+from nonebot import logger, get_driver
+from nonebot.adapters.red import event as red_event
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender
+from nonebot_adapter_onebot_pretender.v11.pretender import is_log_level_enabled
+
+
+def test_resolve_event_handler():
+    class CustomGroupMessageEvent(red_event.GroupMessageEvent):
+        pass
+
+    handler = RedOB11Pretender.resolve_event_handler(red_event.GroupMessageEvent)
+    assert handler is RedOB11Pretender.handle_group_message_event
+    assert RedOB11Pretender.resolve_event_handler(CustomGroupMessageEvent) is handler
+    assert CustomGroupMessageEvent in RedOB11Pretender._event_handler_cache
+    assert RedOB11Pretender.resolve_event_handler(red_event.Event) is None
+
+
+def test_log_level_follows_config(monkeypatch):
+    monkeypatch.setattr(get_driver().config, "log_level", "INFO")
+    assert is_log_level_enabled("INFO")
+    assert not is_log_level_enabled("DEBUG")
+
+    monkeypatch.setattr(get_driver().config, "log_level", 5)
+    assert is_log_level_enabled("TRACE")
+
+
+def test_log_level_follows_plugin_config(monkeypatch):
+    monkeypatch.setattr(get_driver().config, "log_level", "INFO")
+    monkeypatch.setattr(conf, "ob_pretender_log_level", "DEBUG")
+    records = []
+    handler_id = logger.add(records.append, level="DEBUG")
+    try:
+        assert is_log_level_enabled("DEBUG")
+        assert not is_log_level_enabled("TRACE")
+
+        built = []
+
+        def content():
+            built.append(1)
+            return "lazy content"
+
+        RedOB11Pretender.log("DEBUG", content)
+        RedOB11Pretender.log("TRACE", content)
+        assert built == [1]
+        assert "lazy content" in records[-1]
+    finally:
+        logger.remove(handler_id)
+
+
+def test_unknown_log_level_is_enabled(monkeypatch):
+    monkeypatch.setattr(get_driver().config, "log_level", "NO_SUCH_LEVEL")
+    assert is_log_level_enabled("DEBUG")
@@ -0,0 +1,342 @@
+import asyncio
+
+import pytest
+from nonebot import get_app
+from fastapi.testclient import TestClient
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.red import Adapter as RedAdapter
+from nonebot.adapters.onebot.v11 import Message, MessageSegment
+
+from nonebot_adapter_onebot_pretender.webapi import red
+from nonebot_adapter_onebot_pretender.data.media_cache import MediaCache
+from nonebot_adapter_onebot_pretender.data.ob11_msg import make_ob11_msg
+from nonebot_adapter_onebot_pretender.v11.adapter import Adapter as PretenderAdapter
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(32))
+MEDIA_URL = "http://localhost:8080/ob_pretender/red/media?msgId=1001&elementId={}"
+PARAMS = {
+    "botId": "42",
+    "msgId": "1001",
+    "chatType": 2,
+    "target": "5",
+    "elementId": "E1",
+}
+
+
+class FakeActualBot:
+    type = RedAdapter.get_name()
+
+
+class FakeAdapter(PretenderAdapter):
+    @classmethod
+    def get_pretender_type(cls):
+        raise NotImplementedError
+
+    def get_actual_bot(self, bot):
+        return FakeActualBot()
+
+
+class FakeBot:
+    adapter = FakeAdapter.__new__(FakeAdapter)
+
+
+class Upstream:
+    def __init__(self, content: bytes, chunk_size: int = 16, sized: bool = True):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.sized = sized
+        self.opened = 0
+        # 媒体所在的消息，None 表示消息不在存储中
+        self.msg = None
+        self.closed = 0
+
+    async def open(self, bot, data) -> red._Upstream:
+        self.opened += 1
+
+        async def chunks():
+            for i in range(0, len(self.content), self.chunk_size):
+                yield self.content[i : i + self.chunk_size]
+
+        async def close():
+            self.closed += 1
+
+        return red._Upstream(chunks(), len(self.content) if self.sized else None, close)
+
+
+def media_msg(file: str = "", element_id: str = "E1", time: int = 1700000000):
+    url = MEDIA_URL.format(element_id)
+    return make_ob11_msg(
+        message_id=1001,
+        message_type="group",
+        group_id=5,
+        sender=Sender(user_id=9),
+        time=time,
+        message=Message(MessageSegment("image", {"file": file, "url": url})),
+    )
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path) -> Upstream:
+    upstream = Upstream(PNG)
+    upstream.msg = media_msg()
+
+    async def load_ob11_msg(message_id):
+        return upstream.msg
+
+    monkeypatch.setattr(red, "get_bot", lambda bot_id: FakeBot())
+    monkeypatch.setattr(red, "_open_upstream", upstream.open)
+    monkeypatch.setattr(red, "load_ob11_msg", load_ob11_msg)
+    monkeypatch.setattr(red, "media_cache", MediaCache(tmp_path / "cache", 0))
+    return upstream
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(get_app())
+
+
+def get(client: TestClient, headers=None, method="GET", **params):
+    return client.request(
+        method,
+        "/ob_pretender/red/media",
+        params={**PARAMS, **params},
+        headers=headers or {},
+    )
+
+
+@pytest.mark.parametrize(
+    ("value", "size", "expected"),
+    [
+        (None, 10, None),
+        ("bytes=0-3", None, None),
+        ("bytes=0-3", 10, (0, 3)),
+        ("bytes=4-", 10, (4, 9)),
+        ("bytes=8-100", 10, (8, 9)),
+        ("bytes=-3", 10, (7, 9)),
+        ("bytes=-30", 10, (0, 9)),
+        ("bytes=0-1,4-5", 10, None),
+        ("items=0-1", 10, None),
+        ("bytes=a-b", 10, None),
+    ],
+)
+def test_parse_range(value, size, expected):
+    assert red._parse_range(value, size) == expected
+
+
+@pytest.mark.parametrize("value", ["bytes=10-", "bytes=5-4"])
+def test_parse_unsatisfiable_range(value):
+    with pytest.raises(ValueError, match="bytes="):
+        red._parse_range(value, 10)
+
+
+def test_slice_across_chunks():
+    async def main():
+        async def chunks():
+            for i in range(0, 20, 3):
+                yield bytes(range(i, min(i + 3, 20)))
+
+        return b"".join([x async for x in red._slice(chunks(), 4, 13)])
+
+    assert asyncio.run(main()) == bytes(range(4, 14))
+
+
+def test_get_full(client, upstream):
+    resp = get(client)
+    assert resp.status_code == 200
+    assert resp.content == PNG
+    assert resp.headers["Content-Type"] == "image/png"
+    assert resp.headers["Content-Length"] == str(len(PNG))
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert resp.headers["ETag"] == red._make_etag("1001", "E1", 0, 2)
+    assert resp.headers["Last-Modified"] == "Tue, 14 Nov 2023 22:13:20 GMT"
+    assert upstream.closed == 1
+
+
+def test_get_range(client, upstream):
+    resp = get(client, {"Range": "bytes=10-35"})
+    assert resp.status_code == 206
+    assert resp.content == PNG[10:36]
+    assert resp.headers["Content-Range"] == f"bytes 10-35/{len(PNG)}"
+    assert resp.headers["Content-Length"] == "26"
+
+    resp = get(client, {"Range": "bytes=-4"})
+    assert resp.status_code == 206
+    assert resp.content == PNG[-4:]
+    assert upstream.closed == 2
+
+
+def test_unsatisfiable_range(client, upstream):
+    resp = get(client, {"Range": f"bytes={len(PNG)}-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{len(PNG)}"
+    assert upstream.closed == 1
+
+
+def test_range_without_size_is_ignored(client, upstream):
+    upstream.sized = False
+    resp = get(client, {"Range": "bytes=0-3"})
+    assert resp.status_code == 200
+    assert resp.content == PNG
+    assert "Content-Length" not in resp.headers
+
+
+def test_if_range(client, upstream):
+    etag = red._make_etag("1001", "E1", 0, 2)
+    resp = get(client, {"Range": "bytes=0-3", "If-Range": etag})
+    assert resp.status_code == 206
+
+    resp = get(client, {"Range": "bytes=0-3", "If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.content == PNG
+
+
+def test_if_none_match(client, upstream):
+    etag = get(client).headers["ETag"]
+    resp = get(client, {"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert upstream.opened == 1
+
+    # 不同的缩略图尺寸是不同的资源
+    assert get(client, thumbSize=198).headers["ETag"] != etag
+
+
+def test_head_does_not_fetch(client, upstream):
+    resp = get(client, method="HEAD")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"] == "image/jpeg"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert "Content-Length" not in resp.headers
+    assert upstream.opened == 0
+
+
+def test_unknown_message(client, upstream):
+    upstream.msg = None
+    resp = get(client)
+    assert resp.status_code == 200
+    assert resp.content == PNG
+    assert "Last-Modified" not in resp.headers
+
+
+def test_find_media_meta_matches_element_id(monkeypatch):
+    msg = media_msg()
+    msg.message = Message(
+        [
+            MessageSegment(
+                "image", {"file": "file:///a.png", "url": MEDIA_URL.format("E10")}
+            ),
+            MessageSegment(
+                "image", {"file": "file:///b.gif", "url": MEDIA_URL.format("E1")}
+            ),
+        ]
+    )
+
+    async def load_ob11_msg(message_id):
+        return msg
+
+    monkeypatch.setattr(red, "load_ob11_msg", load_ob11_msg)
+
+    meta = asyncio.run(red._find_media_meta("1001", "E1"))
+    assert str(meta.path) == "/b.gif"
+    assert meta.media_type == "image/gif"
+
+    meta = asyncio.run(red._find_media_meta("1001", "E"))
+    assert meta.path is None
+    assert meta.time == msg.time
+
+
+def test_local_file(client, upstream, tmp_path):
+    path = tmp_path / "image.gif"
+    path.write_bytes(b"GIF89a" + bytes(range(64)))
+    upstream.msg = media_msg(file=f"file://{path}")
+
+    resp = get(client)
+    assert resp.status_code == 200
+    assert resp.content == path.read_bytes()
+    assert resp.headers["Content-Type"] == "image/gif"
+    assert resp.headers["ETag"] == red._make_etag("1001", "E1", 0, 2)
+
+    resp = get(client, {"Range": "bytes=6-9"})
+    assert resp.status_code == 206
+    assert resp.content == bytes(range(4))
+    assert upstream.opened == 0
+
+    # 缩略图与原文件不同，需要从 Red 获取
+    resp = get(client, thumbSize=198)
+    assert resp.content == PNG
+    assert upstream.opened == 1
+
+
+def test_missing_local_file_falls_back(client, upstream, tmp_path):
+    upstream.msg = media_msg(file=f"file://{tmp_path / 'missing.png'}")
+    resp = get(client)
+    assert resp.status_code == 200
+    assert resp.content == PNG
+    assert upstream.opened == 1
+
+
+def test_media_cache(client, upstream, monkeypatch, tmp_path):
+    monkeypatch.setattr(red, "media_cache", MediaCache(tmp_path / "cache", 1 << 20))
+
+    resp = get(client)
+    assert resp.status_code == 200
+    assert resp.content == PNG
+    assert resp.headers["Content-Type"] == "image/png"
+
+    resp = get(client, {"Range": "bytes=10-19"})
+    assert resp.status_code == 206
+    assert resp.content == PNG[10:20]
+    resp = get(client, method="HEAD")
+    assert resp.headers["Content-Length"] == str(len(PNG))
+    assert upstream.opened == 1
+
+
+def test_local_file_head_and_ranges(client, upstream, tmp_path):
+    path = tmp_path / "image.gif"
+    path.write_bytes(b"GIF89a" + bytes(range(64)))
+    upstream.msg = media_msg(file=f"file://{path}")
+
+    resp = get(client, method="HEAD")
+    assert resp.status_code == 200
+    assert resp.content == b""
+    assert resp.headers["Content-Length"] == "70"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+
+    resp = get(client, {"Range": "bytes=60-"}, method="HEAD")
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == "bytes 60-69/70"
+    assert resp.headers["Content-Length"] == "10"
+
+    resp = get(client, {"Range": "bytes=70-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == "bytes */70"
+
+    resp = get(client, {"Range": "bytes=0-3", "If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.content == path.read_bytes()
+    assert upstream.opened == 0
+
+
+def test_media_cache_is_filled_by_full_responses_only(
+    client, upstream, monkeypatch, tmp_path
+):
+    cache = MediaCache(tmp_path / "cache", 1 << 20)
+    monkeypatch.setattr(red, "media_cache", cache)
+
+    # 部分请求直接转发，不写入缓存
+    resp = get(client, {"Range": "bytes=0-9"})
+    assert resp.status_code == 206
+    assert resp.content == PNG[:10]
+    assert len(cache) == 0
+
+    # 完整的响应边转发边写入缓存
+    resp = get(client)
+    assert resp.content == PNG
+    assert len(cache) == 1
+    assert upstream.opened == 2
+
+    resp = get(client, {"Range": "bytes=-4"})
+    assert resp.content == PNG[-4:]
+    assert upstream.opened == 2
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
@@ -0,0 +1,236 @@
+import asyncio
+
+import pytest
+from nonebot.adapters.red import Message as RedMsg
+from nonebot.adapters.red.api.model import ChatType
+from nonebot.adapters.onebot.v11 import ActionFailed
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.red import MessageSegment as RedMS
+from nonebot.adapters.onebot.v11 import Message as OB11Msg
+from nonebot.adapters.onebot.v11 import MessageSegment as OB11MS
+
+from nonebot_adapter_onebot_pretender.v11.impl import red
+from nonebot_adapter_onebot_pretender.data import ob11_msg
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender
+from nonebot_adapter_onebot_pretender.v11.send_scheduler import SendScheduler
+from nonebot_adapter_onebot_pretender.data.ob11_msg import make_ob11_msg, save_ob11_msg
+
+
+def converted_counts(*seg_types: str):
+    stats = RedOB11Pretender.incoming_converters.stats
+    return [stats[seg_type].count for seg_type in seg_types]
+
+
+def convert(message: RedMsg, original_message: RedMsg):
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+    before = converted_counts("text", "at", "reply")
+    msg, ori_msg = pretender.convert_incoming_msgs(None, message, original_message)
+    after = converted_counts("text", "at", "reply")
+    return msg, ori_msg, [b - a for a, b in zip(before, after)]
+
+
+def test_same_message_is_converted_once():
+    red_msg = RedMsg([RedMS.at("9"), RedMS.text("hi")])
+    msg, ori_msg, counts = convert(red_msg, RedMsg(red_msg))
+    assert counts == [1, 1, 0]
+    assert msg == ori_msg
+    assert msg is not ori_msg
+
+
+def test_shared_segments_are_converted_once():
+    original = RedMsg([RedMS.reply("1", "5", "9"), RedMS.at("9"), RedMS.text("hi")])
+    msg, ori_msg, counts = convert(RedMsg(RedMS.text("hi")), original)
+    assert counts == [1, 1, 1]
+    assert msg == OB11Msg("hi")
+    assert [seg.type for seg in ori_msg] == ["reply", "at", "text"]
+    assert ori_msg.extract_plain_text() == "hi"
+
+
+def test_modified_segments_are_converted_again():
+    original = RedMsg([RedMS.at("9"), RedMS.text(" hi"), RedMS.text("!")])
+    # Red 去掉 @ 之后的空白，message 中的第一个文本与 original_message 不同
+    msg, ori_msg, counts = convert(
+        RedMsg([RedMS.text("hi"), RedMS.text("!")]), original
+    )
+    assert counts == [3, 1, 0]
+    assert msg == OB11Msg([OB11MS.text("hi"), OB11MS.text("!")])
+    assert ori_msg[1] == OB11MS.text(" hi")
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch) -> SendScheduler:
+    # 调度器的任务绑定在创建它的事件循环上，每个测试使用新的调度器
+    scheduler = SendScheduler(
+        rate=0,
+        burst=1,
+        target_rate=0,
+        target_burst=1,
+        concurrency=0,
+        queue_size=0,
+        overflow="wait",
+    )
+    monkeypatch.setattr(red, "send_scheduler", scheduler)
+    return scheduler
+
+
+class BroadcastBot:
+    self_id = "42"
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    async def call_api(self, api: str, **data):
+        assert api == "send_message"
+        target = int(data["target"])
+        self.sent.append((data["chat_type"], target))
+        await asyncio.sleep(0)
+        if target in self.failing:
+            raise ActionFailed(msg="发送失败")
+        return {
+            "msgId": str(1000 + target),
+            "msgTime": "100",
+            "sendNickName": "bot",
+            "sendMemberName": "",
+        }
+
+
+@pytest.fixture
+def broadcast(monkeypatch, ob11_msg_store):
+    monkeypatch.setattr(
+        red.MessageModel,
+        "parse_obj",
+        classmethod(lambda cls, obj: cls.construct(**obj)),
+    )
+
+    def broadcast(bot: BroadcastBot, **data):
+        pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+
+        async def main():
+            try:
+                return await pretender.send_broadcast_msg(bot, **data)
+            finally:
+                await ob11_msg.get_ob11_msg_write_queue().close()
+
+        return asyncio.run(main())
+
+    return broadcast
+
+
+def test_broadcast_converts_once_and_fans_out(broadcast):
+    stats = RedOB11Pretender.outgoing_converters.stats["text"]
+    count = stats.count
+    bot = BroadcastBot()
+    results = broadcast(bot, message="hi", group_ids=[1, 2], user_ids=[3])
+
+    assert stats.count - count == 1
+    assert sorted(bot.sent) == [
+        (ChatType.FRIEND, 3),
+        (ChatType.GROUP, 1),
+        (ChatType.GROUP, 2),
+    ]
+    assert results == [
+        {"message_type": "group", "group_id": 1, "status": "ok", "message_id": 1001},
+        {"message_type": "group", "group_id": 2, "status": "ok", "message_id": 1002},
+        {"message_type": "private", "user_id": 3, "status": "ok", "message_id": 1003},
+    ]
+    stored = ob11_msg.peek_ob11_msg("1003")
+    assert stored.peer_id == 3
+    assert stored.message == OB11Msg("hi")
+    assert ob11_msg.peek_ob11_msg("1002").group_id == 2
+
+
+def test_broadcast_partial_failure(broadcast):
+    bot = BroadcastBot(failing=[2])
+    results = broadcast(bot, message=OB11Msg("hi"), group_ids=[1, 2, 3])
+
+    assert [r["status"] for r in results] == ["ok", "failed", "ok"]
+    assert results[1] == {
+        "message_type": "group",
+        "group_id": 2,
+        "status": "failed",
+        "message_id": None,
+        "msg": str(ActionFailed(msg="发送失败")),
+    }
+    assert ob11_msg.peek_ob11_msg("1002") is None
+    assert ob11_msg.peek_ob11_msg("1003") is not None
+
+
+def test_broadcast_without_targets(broadcast):
+    with pytest.raises(ValueError, match="请传入正确的参数"):
+        broadcast(BroadcastBot(), message="hi")
+
+
+class ForwardBot:
+    self_id = "42"
+
+    def __init__(self):
+        self.forwards = []
+
+    async def send_fake_forward(self, nodes, chat_type, target):
+        self.forwards.append((nodes, chat_type, target))
+
+
+def stored_msg(message_id: int, text: str):
+    return make_ob11_msg(
+        group=True,
+        group_id=5,
+        message_id=message_id,
+        real_id=message_id,
+        message_type="group",
+        sender=Sender(user_id=9, nickname="n"),
+        time=100 + message_id,
+        message=OB11Msg(text),
+        raw_message=text,
+    )
+
+
+def test_forward_nodes_are_loaded_in_one_batch(ob11_msg_store, monkeypatch):
+    get_many_calls = []
+    get_many = ob11_msg_store.get_many
+
+    async def counting_get_many(message_ids):
+        get_many_calls.append(list(message_ids))
+        return await get_many(message_ids)
+
+    monkeypatch.setattr(ob11_msg_store, "get_many", counting_get_many)
+    stats = RedOB11Pretender.outgoing_converters.stats["text"]
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+    bot = ForwardBot()
+
+    async def main():
+        await save_ob11_msg("1", stored_msg(1, "same"))
+        await save_ob11_msg("2", stored_msg(2, "same"))
+        await save_ob11_msg("3", stored_msg(3, "other"))
+        await ob11_msg.get_ob11_msg_write_queue().close()
+        ob11_msg.get_ob11_msg_cache().clear()
+
+        count = stats.count
+        await pretender._send_forward_msg(
+            bot,
+            chat_type=ChatType.GROUP,
+            target=5,
+            messages=[
+                {"type": "node", "data": {"id": 1}},
+                OB11MS.node(2),
+                {"type": "node", "data": {"id": "3"}},
+                {"type": "node", "data": {"id": 1}},
+                {"type": "node", "data": {"id": 404}},
+                {"type": "node", "data": {"user_id": 7, "content": "custom"}},
+                {"type": "text", "data": {"text": "ignored"}},
+            ],
+        )
+        return stats.count - count
+
+    converted = asyncio.run(main())
+
+    assert get_many_calls == [["1", "2", "3", "404"]]
+    # "same" 只转换一次，各个节点共用转换结果
+    assert converted == 3
+    [(nodes, chat_type, target)] = bot.forwards
+    assert (chat_type, target) == (ChatType.GROUP, 5)
+    assert [node.uin for node in nodes] == ["9", "9", "9", "9", "7"]
+    assert [node.time for node in nodes[:4]] == [101, 102, 103, 101]
+    assert nodes[0].message is nodes[1].message
+    assert nodes[4].name == "7"
+    assert nodes[4].message == RedMsg(RedMS.text("custom"))
@@ -0,0 +1,228 @@
+import asyncio
+
+import pytest
+from nonebot.adapters.onebot.v11 import Message
+from nonebot.adapters.red.api.model import ChatType
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.onebot.v11 import event as ob11_event
+
+from nonebot_adapter_onebot_pretender.data import ob11_msg
+from nonebot_adapter_onebot_pretender.v11.impl.red import reply as module
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender
+from nonebot_adapter_onebot_pretender.trusted_model import construct_trusted
+from nonebot_adapter_onebot_pretender.v11.impl.red.reply import ReplyResolver
+from nonebot_adapter_onebot_pretender.data.ob11_msg import make_ob11_msg, save_ob11_msg
+
+
+class FakeBot:
+    self_id = "42"
+
+
+def group_msg(message_id: int, time: int = 100):
+    return make_ob11_msg(
+        group=True,
+        group_id=5,
+        message_id=message_id,
+        real_id=message_id,
+        message_type="group",
+        sender=Sender(user_id=9),
+        time=time,
+        message=Message(f"msg {message_id}"),
+        raw_message=f"msg {message_id}",
+    )
+
+
+class History:
+    """按 message_id 从新到旧返回 offset 及之前的 count 条消息"""
+
+    def __init__(self, message_ids):
+        self.message_ids = sorted(message_ids)
+        self.calls = []
+        self.error = None
+
+    async def __call__(self, bot, chat_type, peer, offset, count):
+        self.calls.append((chat_type, peer, offset))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        ids = [i for i in self.message_ids if i <= int(offset)][-count:]
+        return [group_msg(i) for i in ids]
+
+
+def resolve(resolver: ReplyResolver, message_id):
+    return resolver.resolve(FakeBot(), ChatType.GROUP, "5", str(message_id))
+
+
+def test_memory_hit(ob11_msg_store):
+    async def main():
+        resolver = ReplyResolver(History([]), 20)
+        msg = group_msg(1)
+        await save_ob11_msg("1", msg)
+        future = resolve(resolver, 1)
+        assert future.done()
+        assert future.result() is msg
+        assert resolver.stats.memory_hits == 1
+        await ob11_msg.get_ob11_msg_write_queue().close()
+
+    asyncio.run(main())
+
+
+def test_store_hit(ob11_msg_store):
+    async def main():
+        history = History([])
+        resolver = ReplyResolver(history, 20)
+        await save_ob11_msg("1", group_msg(1))
+        await ob11_msg.get_ob11_msg_write_queue().close()
+        ob11_msg.get_ob11_msg_cache().clear()
+
+        future = resolve(resolver, 1)
+        assert not future.done()
+        assert resolve(resolver, 1) is future
+        assert (await future).message_id == 1
+        assert resolver.stats.store_hits == 1
+        assert resolver.stats.coalesced == 1
+        assert history.calls == []
+
+    asyncio.run(main())
+
+
+def test_history_fetches_are_batched(ob11_msg_store):
+    async def main():
+        history = History(range(1, 31))
+        resolver = ReplyResolver(history, 10)
+        futures = [resolve(resolver, i) for i in (3, 25, 28, 40)]
+        results = await asyncio.gather(*futures)
+
+        assert [msg.message_id for msg in results[:3]] == [3, 25, 28]
+        assert results[3] is None
+        # 从最新的目标往前拉取：以 40 拉取的 21~30 覆盖 25 与 28，3 另外拉取
+        assert [offset for _, _, offset in history.calls] == ["40", "3"]
+        assert resolver.stats.history_hits == 3
+        assert resolver.stats.misses == 1
+        assert resolver.stats.history_fetches == 2
+
+        # 不同会话分别拉取
+        history.calls.clear()
+        await asyncio.gather(
+            resolve(resolver, 4),
+            resolver.resolve(FakeBot(), ChatType.FRIEND, "9", "5"),
+        )
+        assert sorted(peer for _, peer, _ in history.calls) == ["5", "9"]
+
+    asyncio.run(main())
+
+
+def test_history_failure(ob11_msg_store):
+    async def main():
+        history = History([1])
+        history.error = RuntimeError("red failed")
+        resolver = ReplyResolver(history, 10)
+        futures = [resolve(resolver, 1), resolve(resolver, 2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="red failed"):
+                await future
+
+        history.error = None
+        assert (await resolve(resolver, 1)).message_id == 1
+
+    asyncio.run(main())
+
+
+def message_event(message_id: int) -> ob11_event.GroupMessageEvent:
+    return construct_trusted(
+        ob11_event.GroupMessageEvent,
+        time=100,
+        self_id=42,
+        post_type="message",
+        sub_type="normal",
+        user_id=9,
+        message_id=message_id,
+        font=0,
+        sender=Sender(user_id=9),
+        message_type="group",
+        group_id=5,
+        to_me=False,
+        reply=None,
+        anonymous=None,
+        message=Message("hi"),
+        original_message=Message("hi"),
+        raw_message="hi",
+    )
+
+
+@pytest.fixture
+def pretender() -> RedOB11Pretender:
+    return RedOB11Pretender.__new__(RedOB11Pretender)
+
+
+def test_resolved_reply_is_set(pretender):
+    async def main():
+        stored = group_msg(7)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(stored)
+        event = message_event(1)
+        pretender._set_reply(event, future)
+        assert event.reply.message_id == 7
+        assert event.reply.message == Message("msg 7")
+        assert await pretender.get_reply(event) is event.reply
+
+        # 回复的消息是存储的消息的副本
+        event.reply.message.append("!")
+        assert stored.message == Message("msg 7")
+
+    asyncio.run(main())
+
+
+def test_late_reply_does_not_mutate_event(pretender):
+    async def main():
+        future = asyncio.get_running_loop().create_future()
+        event = message_event(2)
+        pretender._set_reply(event, future)
+        assert event.reply is None
+
+        waiter = asyncio.create_task(pretender.get_reply(event))
+        await asyncio.sleep(0)
+        future.set_result(group_msg(7))
+        assert (await waiter).message_id == 7
+        assert event.reply is None
+        # 解析完成后调用也能取得结果
+        assert (await pretender.get_reply(event)).message_id == 7
+
+    asyncio.run(main())
+
+
+def test_unresolved_reply(pretender):
+    async def main():
+        loop = asyncio.get_running_loop()
+        failed = loop.create_future()
+        event = message_event(3)
+        pretender._set_reply(event, failed)
+        failed.set_exception(RuntimeError("red failed"))
+        assert await pretender.get_reply(event) is None
+
+        missing = loop.create_future()
+        missing.set_result(None)
+        event = message_event(4)
+        pretender._set_reply(event, missing)
+        assert event.reply is None
+        assert await pretender.get_reply(event) is None
+
+        assert await pretender.get_reply(message_event(5)) is None
+
+    asyncio.run(main())
+
+
+def test_batch_window(monkeypatch, ob11_msg_store):
+    monkeypatch.setattr(module, "_BATCH_WINDOW", 0.05)
+
+    async def main():
+        history = History([1, 2])
+        resolver = ReplyResolver(history, 10)
+        first = resolve(resolver, 1)
+        await asyncio.sleep(0.01)
+        # 窗口内的后续请求合并到同一次拉取
+        second = resolve(resolver, 2)
+        await asyncio.gather(first, second)
+        assert len(history.calls) == 1
+
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+import json
+import asyncio
+from time import time
+
+import pytest
+from unqlite import UnQLite
+
+from nonebot_adapter_onebot_pretender.data import retention
+from nonebot_adapter_onebot_pretender.data.backends import MsgRecord
+from nonebot_adapter_onebot_pretender.data.lru_cache import LRUCache
+from nonebot_adapter_onebot_pretender.data.backends import unqlite as unqlite_backend
+from nonebot_adapter_onebot_pretender.data.backends.unqlite import (
+    UnQLiteMsgStoreBackend,
+)
+
+
+def records(ids, msg_time: int = 100, group_id: int = 1):
+    return [MsgRecord(str(i), msg_time, b"v%d" % i, group_id) for i in ids]
+
+
+def test_expire_by_count(msg_store):
+    async def main():
+        await msg_store.put_many(records(range(10)))
+        expired = await msg_store.expire(None, 7, 100)
+        assert expired == ["0", "1", "2"]
+        assert await msg_store.count() == 7
+        assert await msg_store.get("2") is None
+        assert await msg_store.get("3") == b"v3"
+
+    asyncio.run(main())
+
+
+def test_expire_by_age(msg_store):
+    async def main():
+        now = int(time())
+        await msg_store.put_many(records(range(3), msg_time=now - 1000))
+        await msg_store.put_many(records(range(3, 5), msg_time=now))
+        assert await msg_store.expire(500, None, 100) == ["0", "1", "2"]
+        assert await msg_store.expire(500, None, 100) == []
+        assert await msg_store.count() == 2
+
+    asyncio.run(main())
+
+
+def test_expire_respects_limit(msg_store):
+    async def main():
+        await msg_store.put_many(records(range(10)))
+        assert await msg_store.expire(None, 0, 4) == ["0", "1", "2", "3"]
+        assert await msg_store.expire(None, 0, 4) == ["4", "5", "6", "7"]
+        assert await msg_store.count() == 2
+
+    asyncio.run(main())
+
+
+def test_expire_counts_only_live_messages(msg_store):
+    async def main():
+        await msg_store.put_many(records(range(10)))
+        await msg_store.delete(["0", "1", "2", "5"])
+        assert await msg_store.count() == 6
+        # 已删除的消息不计入保留条数
+        assert await msg_store.expire(None, 5, 100) == ["3"]
+        assert await msg_store.count() == 5
+
+        await msg_store.put_many(records([3]))
+        assert await msg_store.count() == 6
+
+    asyncio.run(main())
+
+
+def test_expire_ob11_msgs_evicts_cache(msg_store, monkeypatch):
+    cache = LRUCache(16, 1024)
+    monkeypatch.setattr(retention, "msg_store", msg_store)
+    monkeypatch.setattr(retention, "get_ob11_msg_cache", lambda: cache)
+
+    async def main():
+        await msg_store.put_many(records(range(5)))
+        cache.put("0", "cached")
+        cache.put("4", "cached")
+        assert await retention.expire_ob11_msgs(max_count=2, batch_size=2) == 3
+        assert "0" not in cache
+        assert "4" in cache
+        assert await retention.expire_ob11_msgs() == 0
+
+    asyncio.run(main())
+
+
+def test_compact_keeps_messages(msg_store):
+    async def main():
+        await msg_store.put_many(records(range(100)))
+        await msg_store.delete([str(i) for i in range(50)])
+        report = await msg_store.compact()
+        assert report.records > 0
+        assert await msg_store.count() == 50
+        assert await msg_store.get("99") == b"v99"
+        scanned = await msg_store.scan(group_id=1, limit=1000)
+        assert [r.message_id for r in scanned] == [str(i) for i in range(50, 100)]
+
+    asyncio.run(main())
+
+
+def legacy_value(message_id: int, msg_time: int, **fields) -> bytes:
+    return json.dumps({"message_id": message_id, "time": msg_time, **fields}).encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 3])
+def test_backfill_legacy_unqlite_messages(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(unqlite_backend, "_BACKFILL_CHUNK_SIZE", chunk_size)
+    path = tmp_path / "legacy.db"
+    db = UnQLite(str(path))
+    for i, msg_time in [(1, 30), (2, 10), (3, 20), (4, 20)]:
+        db[f"ob11_msg_{i}"] = legacy_value(
+            i, msg_time, message_type="group", group_id=5
+        )
+    db["ob11_msg_5"] = legacy_value(
+        5, 15, message_type="private", sender={"user_id": 9}
+    )
+    db["unrelated"] = b"x"
+    db.close()
+
+    async def main():
+        store = UnQLiteMsgStoreBackend(path)
+        try:
+            # 启动时补全，之后的读写不再需要等待
+            await store.prepare()
+            assert store._backfilled
+            assert store._live_counted
+            await store.put_many([MsgRecord("6", 40, b"new", 5)])
+            scanned = await store.scan(limit=100)
+            assert [r.message_id for r in scanned] == ["2", "5", "3", "4", "1", "6"]
+            assert [r.message_id for r in await store.scan(group_id=5)] == [
+                "2",
+                "3",
+                "4",
+                "1",
+                "6",
+            ]
+            # 旧版本的私聊消息没有 peer_id，按发送者建立索引
+            assert [r.message_id for r in await store.scan(peer_id=9)] == ["5"]
+            assert await store.count() == 6
+
+            assert await store.expire(None, 4, 100) == ["2", "5"]
+            assert await store.count() == 4
+        finally:
+            store.close()
+
+        # 补全只进行一次
+        store = UnQLiteMsgStoreBackend(path)
+        try:
+            scanned = await store.scan(limit=100)
+            assert [r.message_id for r in scanned] == ["3", "4", "1", "6"]
+        finally:
+            store.close()
+
+    asyncio.run(main())
@@ -0,0 +1,270 @@
+import asyncio
+
+import pytest
+from nonebot.adapters.onebot.v11 import ActionFailed
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.v11 import send_scheduler as module
+from nonebot_adapter_onebot_pretender.v11.send_scheduler import (
+    TokenBucket,
+    SendScheduler,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(module, "monotonic", clock)
+    return clock
+
+
+def make_scheduler(**kwargs) -> SendScheduler:
+    options = {
+        "rate": 0,
+        "burst": 1,
+        "target_rate": 0,
+        "target_burst": 1,
+        "concurrency": 0,
+        "queue_size": 0,
+        "overflow": "wait",
+    }
+    options.update(kwargs)
+    return SendScheduler(**options)
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        assert bucket.delay(clock.now) == 0
+        bucket.take(clock.now)
+    assert bucket.delay(clock.now) == pytest.approx(0.5)
+    assert not bucket.full(clock.now)
+
+    clock.now += 0.5
+    assert bucket.delay(clock.now) == 0
+    bucket.take(clock.now)
+    # 令牌数不超过 burst
+    clock.now += 100
+    assert bucket.full(clock.now)
+    assert bucket.tokens == 3
+
+
+def test_unlimited_token_bucket(clock):
+    bucket = TokenBucket(rate=0, burst=1)
+    for _ in range(10):
+        bucket.take(clock.now)
+    assert bucket.delay(clock.now) == 0
+    assert bucket.full(clock.now)
+
+
+def test_defaults_are_unlimited():
+    assert conf.ob_pretender_send_rate == 0
+    assert conf.ob_pretender_send_target_rate == 0
+    assert conf.ob_pretender_send_concurrency == 0
+    assert conf.ob_pretender_send_queue_size == 0
+
+
+class Recorder:
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.sent = []
+        self.active = 0
+        self.peak = 0
+
+    def job(self, target, value):
+        async def send():
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                await asyncio.sleep(self.delay)
+                self.sent.append((target, value))
+                return value
+            finally:
+                self.active -= 1
+
+        return send
+
+
+def test_targets_are_sent_in_order_and_concurrently():
+    async def main():
+        scheduler = make_scheduler()
+        recorder = Recorder()
+        results = await asyncio.gather(
+            *(
+                scheduler.submit("1", target, recorder.job(target, i))
+                for target in range(4)
+                for i in range(3)
+            )
+        )
+        assert results == [i for _ in range(4) for i in range(3)]
+        for target in range(4):
+            assert [i for t, i in recorder.sent if t == target] == [0, 1, 2]
+        # 同一目标逐条发送，不同目标同时发送
+        assert recorder.peak == 4
+        assert scheduler.stats["interactive"].sent == 12
+
+    asyncio.run(main())
+
+
+def test_concurrency_limit():
+    async def main():
+        scheduler = make_scheduler(concurrency=2)
+        recorder = Recorder()
+        await asyncio.gather(
+            *(scheduler.submit("1", t, recorder.job(t, 0)) for t in range(6))
+        )
+        assert recorder.peak == 2
+
+    asyncio.run(main())
+
+
+def test_target_rate_limit():
+    async def main():
+        scheduler = make_scheduler(target_rate=20, target_burst=1)
+        recorder = Recorder(delay=0)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(
+            *(scheduler.submit("1", "a", recorder.job("a", i)) for i in range(3))
+        )
+        # 第一条使用突发令牌，之后每条间隔 1/20 秒
+        assert loop.time() - start >= 0.09
+
+        start = loop.time()
+        await asyncio.gather(
+            *(scheduler.submit("1", t, recorder.job(t, 0)) for t in "bcd")
+        )
+        assert loop.time() - start < 0.05
+
+    asyncio.run(main())
+
+
+def test_interactive_before_bulk():
+    async def main():
+        scheduler = make_scheduler(concurrency=1)
+        recorder = Recorder()
+        blocker = asyncio.create_task(
+            scheduler.submit("1", "x", recorder.job("x", "first"))
+        )
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(
+                scheduler.submit("1", "b", recorder.job("b", "bulk"), "bulk")
+            ),
+            asyncio.create_task(scheduler.submit("1", "i", recorder.job("i", "hi"))),
+        ]
+        await asyncio.gather(blocker, *tasks)
+        assert [v for _, v in recorder.sent] == ["first", "hi", "bulk"]
+
+    asyncio.run(main())
+
+
+def test_unknown_priority():
+    async def main():
+        with pytest.raises(ValueError, match="未知的发送优先级"):
+            await make_scheduler().submit("1", "a", Recorder().job("a", 0), "urgent")
+
+    asyncio.run(main())
+
+
+def test_overflow_reject():
+    async def main():
+        scheduler = make_scheduler(concurrency=1, queue_size=1, overflow="reject")
+        recorder = Recorder()
+        discarded = []
+        first = asyncio.create_task(scheduler.submit("1", "a", recorder.job("a", 1)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(scheduler.submit("1", "a", recorder.job("a", 2)))
+        await asyncio.sleep(0)
+        with pytest.raises(ActionFailed):
+            await scheduler.submit(
+                "1", "a", recorder.job("a", 3), discard=lambda: discarded.append(3)
+            )
+        assert await asyncio.gather(first, second) == [1, 2]
+        assert discarded == [3]
+        assert scheduler.stats["interactive"].rejected == 1
+
+    asyncio.run(main())
+
+
+def test_overflow_drop_oldest():
+    async def main():
+        scheduler = make_scheduler(concurrency=1, queue_size=1, overflow="drop_oldest")
+        recorder = Recorder()
+        discarded = []
+        first = asyncio.create_task(scheduler.submit("1", "a", recorder.job("a", 1)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(
+            scheduler.submit(
+                "1", "a", recorder.job("a", 2), discard=lambda: discarded.append(2)
+            )
+        )
+        await asyncio.sleep(0)
+        third = asyncio.create_task(scheduler.submit("1", "a", recorder.job("a", 3)))
+        results = await asyncio.gather(first, second, third, return_exceptions=True)
+
+        assert results[0] == 1
+        assert isinstance(results[1], ActionFailed)
+        assert results[2] == 3
+        assert discarded == [2]
+        assert scheduler.stats["interactive"].dropped == 1
+
+    asyncio.run(main())
+
+
+def test_overflow_wait():
+    async def main():
+        scheduler = make_scheduler(concurrency=1, queue_size=1, overflow="wait")
+        recorder = Recorder()
+        results = await asyncio.gather(
+            *(scheduler.submit("1", "a", recorder.job("a", i)) for i in range(4))
+        )
+        assert results == [0, 1, 2, 3]
+        assert scheduler.queued() == {"interactive": 0, "bulk": 0}
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_is_skipped():
+    async def main():
+        scheduler = make_scheduler(concurrency=1)
+        recorder = Recorder()
+        discarded = []
+        first = asyncio.create_task(scheduler.submit("1", "a", recorder.job("a", 1)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(
+            scheduler.submit(
+                "1", "a", recorder.job("a", 2), discard=lambda: discarded.append(2)
+            )
+        )
+        await asyncio.sleep(0)
+        second.cancel()
+        assert await first == 1
+        await asyncio.sleep(0.02)
+        assert recorder.sent == [("a", 1)]
+        assert discarded == [2]
+
+    asyncio.run(main())
+
+
+def test_failed_send_is_raised():
+    async def main():
+        scheduler = make_scheduler()
+
+        async def fail():
+            raise RuntimeError("send failed")
+
+        with pytest.raises(RuntimeError, match="send failed"):
+            await scheduler.submit("1", "a", fail)
+        assert scheduler.stats["interactive"].failed == 1
+        assert await scheduler.submit("1", "a", Recorder().job("a", 1)) == 1
+
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from nonebot.adapters.onebot.v11 import Message
+from nonebot.adapters.red import Message as RedMsg
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.red import MessageSegment as RedMS
+from nonebot.adapters.onebot.v11 import event as ob11_event
+
+from nonebot_adapter_onebot_pretender.config import conf
+from nonebot_adapter_onebot_pretender.data import ob11_msg
+from nonebot_adapter_onebot_pretender.v11.impl.red import RedOB11Pretender
+from nonebot_adapter_onebot_pretender.trusted_model import construct_trusted
+
+
+@pytest.fixture(params=[False, True], ids=["fast", "strict"])
+def strict(request, monkeypatch) -> bool:
+    monkeypatch.setattr(conf, "ob_pretender_strict_validation", request.param)
+    return request.param
+
+
+def test_construct_trusted_skips_validation(strict):
+    sender = construct_trusted(Sender, user_id="9")
+    # 只有严格模式会校验并转换字段类型
+    assert sender.user_id == (9 if strict else "9")
+
+
+def test_strict_validation_rejects_wrong_fields(monkeypatch):
+    monkeypatch.setattr(conf, "ob_pretender_strict_validation", True)
+    with pytest.raises(ValueError, match="user_id"):
+        construct_trusted(Sender, user_id="not a number")
+
+
+async def make_event(pretender: RedOB11Pretender) -> ob11_event.PrivateMessageEvent:
+    red_event = SimpleNamespace(
+        msgId="7",
+        message=RedMsg(RedMS.text("hi")),
+        original_message=RedMsg(
+            [RedMS.reply("1", "5", "9"), RedMS.at("1"), RedMS.text("hi")]
+        ),
+    )
+    return await pretender._make_message_event(
+        None,
+        red_event,
+        ob11_event.PrivateMessageEvent,
+        {
+            "message_id": 7,
+            "message_type": "private",
+            "sender": construct_trusted(Sender, user_id=9),
+            "time": 100,
+            "peer_id": 9,
+        },
+        {
+            "time": 100,
+            "self_id": 42,
+            "post_type": "message",
+            "sub_type": "friend",
+            "user_id": 9,
+            "message_id": 7,
+            "font": 0,
+            "sender": construct_trusted(Sender, user_id=9),
+            "message_type": "private",
+            "to_me": False,
+            "reply": None,
+        },
+    )
+
+
+def test_message_event_is_the_same_in_both_modes(strict, ob11_msg_store):
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+
+    async def main():
+        event = await make_event(pretender)
+        await ob11_msg.get_ob11_msg_write_queue().close()
+        return event
+
+    event = asyncio.run(main())
+
+    assert event.message == Message("hi")
+    # 与校验时 MessageEvent.check_message 的结果一致：original_message 是 message 的副本
+    assert event.original_message == Message("hi")
+    assert event.original_message is not event.message
+    assert event.raw_message == "hi"
+    assert event.to_me is False
+    assert event.reply is None
+    assert ob11_msg.peek_ob11_msg("7").message == Message("hi")
+
+
+def test_event_message_is_not_shared_with_store(ob11_msg_store):
+    pretender = RedOB11Pretender.__new__(RedOB11Pretender)
+
+    async def main():
+        event = await make_event(pretender)
+        # handler 原地修改事件的消息
+        event.message.append("!")
+        event.message[0].data["text"] = "changed"
+        cached = ob11_msg.peek_ob11_msg("7")
+        await ob11_msg.get_ob11_msg_write_queue().close()
+        ob11_msg.get_ob11_msg_cache().clear()
+        return cached, await ob11_msg.load_ob11_msg("7")
+
+    cached, stored = asyncio.run(main())
+    assert cached.message == Message("hi")
+    assert stored.message == Message("hi")
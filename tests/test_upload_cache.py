@@ -0,0 +1,225 @@
+import asyncio
+
+import pytest
+from nonebot.adapters.red import Message as RedMsg
+from nonebot.adapters.red.api.model import UploadResponse
+from nonebot.adapters.red.message import MediaMessageSegment
+
+from nonebot_adapter_onebot_pretender.v11.impl.red import upload_cache as module
+from nonebot_adapter_onebot_pretender.v11.impl.red.upload_cache import (
+    UploadCache,
+    CachedMediaMessageSegment,
+    send_with_media,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(module, "monotonic", clock)
+    return clock
+
+
+def response(path: str) -> UploadResponse:
+    return UploadResponse.construct(md5="", fileSize=1, filePath=path, ntFilePath=path)
+
+
+def test_entries_expire(clock):
+    cache = UploadCache(max_size=8, ttl=60)
+    cache.put(("1", "image", "d"), response("a"))
+    clock.now += 59
+    assert cache.get(("1", "image", "d")).filePath == "a"
+    clock.now += 1
+    assert cache.get(("1", "image", "d")) is None
+    assert cache.stats.expired == 1
+
+
+def test_size_limit(clock):
+    cache = UploadCache(max_size=2, ttl=60)
+    for digest in "abc":
+        cache.put(("1", "image", digest), response(digest))
+    assert len(cache) == 2
+    assert cache.get(("1", "image", "a")) is None
+
+
+def test_upload_is_shared_and_cached(clock):
+    async def main():
+        cache = UploadCache(max_size=8, ttl=60)
+        calls = []
+
+        async def do_upload():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return response("a")
+
+        key = ("1", "image", "d")
+        results = await asyncio.gather(
+            *(cache.upload(key, do_upload) for _ in range(3))
+        )
+        assert [hit for _, hit in results] == [False] * 3
+        assert len(calls) == 1
+        assert cache.stats.coalesced == 2
+
+        resp, hit = await cache.upload(key, do_upload)
+        assert hit
+        assert resp.filePath == "a"
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_failed_upload_is_not_cached(clock):
+    async def main():
+        cache = UploadCache(max_size=8, ttl=60)
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upload failed")
+
+        key = ("1", "image", "d")
+        results = await asyncio.gather(
+            cache.upload(key, fail), cache.upload(key, fail), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(cache) == 0
+
+    asyncio.run(main())
+
+
+class FakeBot:
+    self_id = "1"
+
+
+@pytest.fixture
+def uploads(monkeypatch, clock):
+    cache = UploadCache(max_size=8, ttl=60)
+    monkeypatch.setattr(module, "upload_cache", cache)
+    calls = []
+
+    async def upload(self, bot):
+        calls.append(self.data["file"])
+        return response(f"path{len(calls)}")
+
+    monkeypatch.setattr(MediaMessageSegment, "upload", upload)
+    return calls
+
+
+def test_same_content_is_uploaded_once(uploads):
+    async def main():
+        first = CachedMediaMessageSegment("image", {"file": b"png"})
+        second = CachedMediaMessageSegment("image", {"file": b"png"})
+        voice = CachedMediaMessageSegment("voice", {"file": b"png"})
+
+        assert (await first.upload(FakeBot())).filePath == "path1"
+        assert (await second.upload(FakeBot())).filePath == "path1"
+        assert second.cache_hit
+        # 不同类型的媒体分别上传
+        assert (await voice.upload(FakeBot())).filePath == "path2"
+        assert uploads == [b"png", b"png"]
+
+    asyncio.run(main())
+
+
+def test_file_upload_uses_file_digest(uploads, tmp_path, monkeypatch):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"png")
+    file_uploads = []
+
+    async def upload_file(self, bot, file):
+        file_uploads.append(file)
+        return response("file")
+
+    monkeypatch.setattr(CachedMediaMessageSegment, "_upload_file", upload_file)
+
+    async def main():
+        seg = CachedMediaMessageSegment("image", {"file": path})
+        assert (await seg.upload(FakeBot())).filePath == "file"
+        # 内容相同的 bytes 命中以文件上传的结果
+        seg = CachedMediaMessageSegment("image", {"file": b"png"})
+        assert (await seg.upload(FakeBot())).filePath == "file"
+        assert file_uploads == [path]
+        assert uploads == []
+
+    asyncio.run(main())
+
+
+def test_base64_is_decoded_on_upload(uploads, monkeypatch):
+    monkeypatch.setattr(module.conf, "ob_pretender_base64_spool_threshold", 4)
+    file_uploads = []
+
+    async def upload_file(self, bot, file):
+        file_uploads.append(file.read_bytes())
+        return response("file")
+
+    monkeypatch.setattr(CachedMediaMessageSegment, "_upload_file", upload_file)
+
+    async def main():
+        small = CachedMediaMessageSegment("image", {"file": "base64://cG5n"})
+        await small.upload(FakeBot())
+        assert uploads == [b"png"]
+        assert not small.spooled
+
+        # 超过阈值时解码到临时文件，发送结束后删除
+        large = CachedMediaMessageSegment("image", {"file": "base64://bGFyZ2U="})
+        await large.upload(FakeBot())
+        path = large.data["file"]
+        assert file_uploads == [b"large"]
+        assert large.spooled
+        large.release()
+        assert not path.exists()
+
+    asyncio.run(main())
+
+
+def test_send_retries_with_fresh_upload(uploads, tmp_path):
+    async def main():
+        await CachedMediaMessageSegment("image", {"file": b"old"}).upload(FakeBot())
+
+        message = RedMsg(
+            [
+                CachedMediaMessageSegment("image", {"file": b"old"}),
+                CachedMediaMessageSegment("image", {"file": b"new"}),
+            ]
+        )
+        spooled = tmp_path / "spooled.media"
+        spooled.write_bytes(b"tmp")
+        seg = CachedMediaMessageSegment("image", {"file": spooled})
+        seg.spooled = True
+        sent = []
+
+        async def send():
+            for s in message:
+                await s.upload(FakeBot())
+            sent.append([s.cache_hit for s in message])
+            if len(sent) == 1:
+                raise RuntimeError("file expired")
+            return "ok"
+
+        assert await send_with_media(send, message, RedMsg([seg])) == "ok"
+        # 第一次使用了缓存的上传结果，失败后作废该条目并重新上传
+        assert sent == [[True, False], [False, True]]
+        assert uploads == [b"old", b"new", b"old"]
+        # 发送结束后删除临时文件
+        assert not spooled.exists()
+
+    asyncio.run(main())
+
+
+def test_send_failure_without_cache_hit_is_raised(uploads):
+    async def main():
+        async def send():
+            raise RuntimeError("send failed")
+
+        message = RedMsg([CachedMediaMessageSegment("image", {"file": b"png"})])
+        with pytest.raises(RuntimeError, match="send failed"):
+            await send_with_media(send, message)
+
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from nonebot_adapter_onebot_pretender.data import write_queue
+from nonebot_adapter_onebot_pretender.data.write_queue import WriteBehindQueue
+
+
+class FlakyStore:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.data: Dict[str, int] = {}
+        self.batches: List[List[Tuple[str, int]]] = []
+
+    async def commit(self, batch: List[Tuple[str, int]]):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("commit failed")
+        self.batches.append(list(batch))
+        self.data.update(batch)
+
+
+def make_queue(store: FlakyStore, **kwargs) -> WriteBehindQueue[str, int]:
+    kwargs.setdefault("batch_size", 4)
+    kwargs.setdefault("flush_interval", 0.01)
+    kwargs.setdefault("max_size", 16)
+    return WriteBehindQueue(store.commit, **kwargs)
+
+
+def test_batches_and_pending():
+    async def main():
+        store = FlakyStore()
+        queue = make_queue(store)
+        await queue.put_many([(str(i), i) for i in range(10)])
+        assert queue.get_pending("3") == 3
+        await queue.close()
+
+        assert store.data == {str(i): i for i in range(10)}
+        assert [len(b) for b in store.batches] == [4, 4, 2]
+        assert queue.get_pending("3") is None
+        assert queue.stats.committed == 10
+
+    asyncio.run(main())
+
+
+def test_flush_interval():
+    async def main():
+        store = FlakyStore()
+        queue = make_queue(store, batch_size=100)
+        await queue.put("a", 1)
+        await asyncio.sleep(0.1)
+        assert store.data == {"a": 1}
+        await queue.close()
+
+    asyncio.run(main())
+
+
+def test_failed_batch_is_retried(monkeypatch):
+    monkeypatch.setattr(write_queue, "_RETRY_INITIAL_DELAY", 0.01)
+
+    async def main():
+        store = FlakyStore(failures=2)
+        queue = make_queue(store)
+        await queue.put("a", 1)
+        await queue.put("b", 2)
+        await asyncio.sleep(0.02)
+        # 写入失败期间仍可从 pending 读到
+        assert queue.get_pending("a") == 1
+        await queue.close()
+
+        assert store.data == {"a": 1, "b": 2}
+        assert queue.stats.failed == 4
+        assert queue.stats.retries == 2
+        assert queue.stats.unsaved == 0
+        assert queue.get_pending("a") is None
+
+    asyncio.run(main())
+
+
+def test_unsaved_records_stay_pending(monkeypatch):
+    monkeypatch.setattr(write_queue, "_RETRY_INITIAL_DELAY", 0.01)
+
+    async def main():
+        store = FlakyStore(failures=100)
+        queue = make_queue(store)
+        await queue.put("a", 1)
+        await queue.close()
+
+        assert store.data == {}
+        assert queue.stats.unsaved == 1
+        assert queue.get_pending("a") == 1
+
+        # 重新启动的写者可以写入之后的记录
+        store.failures = 0
+        await queue.put("b", 2)
+        await queue.close()
+        assert store.data == {"b": 2}
+
+    asyncio.run(main())
+
+
+def test_newer_value_is_not_dropped_from_pending():
+    async def main():
+        gates = [asyncio.Event(), asyncio.Event()]
+        committed = []
+
+        async def commit(batch):
+            await gates[len(committed)].wait()
+            committed.extend(batch)
+
+        queue = WriteBehindQueue(commit, batch_size=1, flush_interval=0, max_size=8)
+        await queue.put("a", 1)
+        await asyncio.sleep(0)
+        await queue.put("a", 2)
+        gates[0].set()
+        await asyncio.sleep(0.01)
+        # 旧值写入完成时不能把更新的值从 pending 中移除
+        assert committed == [("a", 1)]
+        assert queue.get_pending("a") == 2
+
+        gates[1].set()
+        await queue.close()
+        assert committed == [("a", 1), ("a", 2)]
+        assert queue.get_pending("a") is None
+
+    asyncio.run(main())
+
+
+def test_unencodable_record_is_rejected():
+    async def main():
+        store = FlakyStore()
+
+        def encode(key: str, value: int) -> int:
+            if value < 0:
+                raise ValueError("negative")
+            return value * 10
+
+        queue = make_queue(store, encode=encode)
+        await queue.put_many([("a", 1), ("bad", -1), ("b", 2)])
+        # 无法编码的记录不入队，也不会阻塞之后的写入
+        assert queue.get_pending("bad") is None
+        assert queue.get_pending("a") == 1
+        await queue.close()
+
+        assert store.data == {"a": 10, "b": 20}
+        assert queue.stats.rejected == 1
+        assert queue.stats.enqueued == 2
+
+    asyncio.run(main())
+
+
+def test_batch_is_dropped_after_max_retries(monkeypatch):
+    monkeypatch.setattr(write_queue, "_RETRY_INITIAL_DELAY", 0.001)
+    monkeypatch.setattr(write_queue, "_MAX_RETRIES", 2)
+
+    async def main():
+        store = FlakyStore(failures=3)
+        queue = make_queue(store, batch_size=1, max_size=1)
+        await queue.put("a", 1)
+        # 写者没有停滞，之后的记录仍能写入
+        await queue.put("b", 2)
+        await queue.put("c", 3)
+        await queue.close()
+
+        assert store.data == {"b": 2, "c": 3}
+        assert queue.stats.dropped == 1
+        assert queue.stats.retries == 2
+        assert queue.get_pending("a") is None
+
+    asyncio.run(main())